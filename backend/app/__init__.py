@@ -1,38 +1,36 @@
 # --- START OF FILE app/__init__.py ---
+import time
 import logging
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from app.utils.common import check_timestamp, verify_jwt
+from app.utils.common import check_replay, verify_jwt
+from app.utils.compression import compress_response
+from app.utils.serialization import FastJSONProvider
+from app.utils.metrics import METRICS_ENABLED, registry, prune_stale_snapshots, start_request_timers, stop_request_timers, timed
+from app.utils.profiling import PROFILING_ENABLED, start_profiling, finish_profiling
+from app.utils.query_budget import query_budget, init_query_budget
+from app.utils.logging_utils import setup_queue_logging, LOG_LEVEL
 
 def setup_logging():
-    """配置全局日志"""
+    """
+    配置全局日志：请求线程只把日志放入队列，由后台线程统一格式化 (JSON) 并写入控制台与轮转文件；
+    缓存命中、查库等高频 INFO 日志按类别采样 (见 app/utils/logging_utils.py)
+    """
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
+    logger.setLevel(LOG_LEVEL)
 
     # 如果已经有处理器，避免重复添加
     if logger.handlers:
         return
 
-    # 控制台处理器
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-
-    # 文件处理器 (只记录 Warning 以上级别，防止日志文件爆炸)
-    file_handler = logging.FileHandler('app.log', mode='a', encoding='utf-8')
-    file_handler.setLevel(logging.WARNING)
-
-    # [结构化日志] 格式优化
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    console_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
-
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    setup_queue_logging(logger)
 
 
 def create_app():
     app = Flask(__name__)
     CORS(app)  # 允许跨域
+    # JSON 序列化：orjson，统一处理 Decimal / date / datetime (与 Redis 缓存使用同一编码)
+    app.json = FastJSONProvider(app)
     # 设置文件大小限制，配合 Nginx
     app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024
 
@@ -48,6 +46,7 @@ def create_app():
     from app.api.appointment import appointment_bp
     from app.api.stats import stats_bp
     from app.api.multimodal import multimodal_bp
+    from app.api.metrics import metrics_bp
 
     # 统一添加前缀，或者在各蓝图中定义
     app.register_blueprint(auth_bp)  # /api/login
@@ -58,6 +57,25 @@ def create_app():
     app.register_blueprint(appointment_bp)  # /api/appointments
     app.register_blueprint(stats_bp) # /api/stats
     app.register_blueprint(multimodal_bp)  # /api/multimodal
+    app.register_blueprint(metrics_bp)  # /metrics (Prometheus，仅管理员)
+
+    if METRICS_ENABLED:
+        prune_stale_snapshots()
+
+        # 最先注册：before_request 最先执行、after_request 最后执行 (Flask 逆序调用)，
+        # 统计的耗时覆盖鉴权、视图与压缩
+        @app.before_request
+        def start_metrics():
+            request.start_time = time.perf_counter()
+            start_request_timers()
+
+        @app.after_request
+        def record_metrics(response):
+            duration = time.perf_counter() - request.start_time
+            registry.observe(request.endpoint or 'unmatched', request.method, response.status_code,
+                             duration, stop_request_timers())
+            registry.flush_if_due()
+            return response
 
     @app.before_request
     def before_request():
@@ -65,8 +83,13 @@ def create_app():
         if request.method == 'OPTIONS':
             return
 
-        # 1. 时间戳防重放校验
-        error = check_timestamp()
+        # metrics.get_metrics: 由 Prometheus 抓取，在视图内单独鉴权 (抓取令牌或管理员 JWT)
+        if request.endpoint == 'metrics.get_metrics':
+            return
+
+        # 1. 防重放校验 (?_t= 时间戳，或 X-Request-Time 签名请求头)
+        with timed('auth'):
+            error = check_replay()
         if error:
             return error
 
@@ -82,7 +105,8 @@ def create_app():
             return
 
         # 3. JWT 身份校验
-        result = verify_jwt()
+        with timed('auth'):
+            result = verify_jwt()
 
         if isinstance(result, dict):
             # 校验通过，挂载用户信息
@@ -91,9 +115,31 @@ def create_app():
             # 校验失败，返回 Response (401)
             return result
 
+    if PROFILING_ENABLED:
+        # 管理员按需剖析 (X-Profile: 1)：在鉴权之后开始；after_request 注册在压缩之前，
+        # 因此在压缩之后才结束，剖析范围覆盖视图与响应压缩
+        @app.before_request
+        def start_profile():
+            if request.method != 'OPTIONS':
+                start_profiling()
+
+        @app.after_request
+        def finish_profile(response):
+            return finish_profiling(response)
+
+    @app.after_request
+    def after_request(response):
+        # 按 Accept-Encoding 压缩较大的 JSON 响应 (gzip，安装 brotli 时优先 br)
+        # 前置 Nginx 不会重复压缩已带 Content-Encoding 的响应
+        return compress_response(response)
+
     @app.route('/')
+    @query_budget(0)
     def index():
         return "MedData Hub API is running..."
 
+    # 查询预算检查 (QUERY_BUDGET_MODE=warn/fail)：放在所有路由注册之后，以便校验每个端点都声明了预算
+    init_query_budget(app)
+
     return app
 # --- END OF FILE app/__init__.py ---
\ No newline at end of file
@@ -1,18 +1,49 @@
 # --- START OF FILE app/api/appointment.py ---
 from flask import Blueprint, request, jsonify
-from app.utils.db import get_db_connection
-from app.utils.redis_client import redis_client
+from app.utils.db import get_db_connection, run_in_transaction, register_statement, query_one
+from app.utils.redis_client import redis_client, get_cached_json, cache_json
+from app.utils.common import json_body_response
+from app.utils.flow_stats import bump_flow
 import logging
 from collections import defaultdict
 import datetime
-import json
+from app.utils.serialization import dumps, loads
+from app.utils.query_budget import query_budget
 
 appointment_bp = Blueprint('appointment', __name__)
 logger = logging.getLogger(__name__)
 
+# 挂号状态：completed / cancelled 为终态，不允许再次流转
+APPOINTMENT_STATUSES = ('pending', 'completed', 'cancelled')
+FINAL_STATUSES = ('completed', 'cancelled')
+BATCH_MAX_UPDATES = 500
+
+# 挂号前校验 (服务端预处理语句)
+# 锁定患者行：同一患者的并发挂号在此排队，随后的 "待就诊挂号数" 检查与插入之间不会被插队
+# (计数查询是事务内第一次一致性读，快照在拿到锁之后建立，能看到前一个挂号事务已提交的插入)
+PATIENT_ACTIVE_STMT = register_statement(
+    "patient_active", "SELECT 1 FROM patients WHERE id = %s AND deleted_at IS NULL FOR UPDATE"
+)
+PENDING_APPOINTMENT_STMT = register_statement(
+    "pending_appointment_count",
+    "SELECT COUNT(*) FROM appointments WHERE patient_id = %s AND department_id = %s AND status = 'pending'"
+)
+
+
+# --- 辅助函数：清除统计缓存 ---
+def clear_appointment_stats_cache():
+    """收集所有 appt:stats:* 键后一次性删除，避免逐键往返"""
+    try:
+        keys = list(redis_client.scan_iter("appt:stats:*", count=500))
+        if keys:
+            redis_client.delete(*keys)
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to clear appointment stats cache: {e}")
+
 
 # 获取预约数据
 @appointment_bp.route('/api/appointments', methods=['GET'])
+@query_budget(2)
 def get_appointments():
     conn = None
     cursor = None
@@ -24,11 +55,11 @@ def get_appointments():
 
         # --- 1. 尝试查缓存 ---
         cache_key = f"appt:list:{role}:{date}:{doctor_id}:{patient_id}"
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
+        cached = get_cached_json(cache_key)
+        if cached:
             # [结构化日志] 明确标识缓存命中
             logger.info(f"[CACHE HIT] Appointments list for key: {cache_key}")
-            return jsonify(json.loads(cached_data))
+            return json_body_response(*cached)
 
         # --- 2. 查数据库 ---
         # [结构化日志] 明确标识缓存未命中，开始查库
@@ -39,8 +70,10 @@ def get_appointments():
 
         sql = """
             SELECT a.id AS appointment_id, a.patient_id, a.department_id, a.doctor_id, a.description, a.status, 
-                   a.create_time, d.name AS doctor_name, dept.name AS department_name
+                   a.create_time, d.name AS doctor_name, dept.name AS department_name,
+                   p.name AS patient_name, p.phone AS patient_phone, p.age AS patient_age
             FROM appointments a
+            JOIN patients p ON a.patient_id = p.id AND p.deleted_at IS NULL
             LEFT JOIN doctors d ON a.doctor_id = d.id
             LEFT JOIN departments dept ON a.department_id = dept.id
         """
@@ -69,23 +102,19 @@ def get_appointments():
         # 如果没有提供 role 和 doctor_id 参数，返回所有未完成挂号记录
         else:
             sql += " WHERE a.status = 'pending'"
+            cursor.execute(sql)
 
         rows = cursor.fetchall()
 
+        # 患者信息由 JOIN 一次取回 (原先逐行查询 patients，N+1)；患者不存在或已打删除标记的挂号不返回
         data = []
         for row in rows:
-            cursor.execute("SELECT name, phone, age FROM patients WHERE id = %s", (row['patient_id'],))
-            patient = cursor.fetchone()
-
-            if not patient:
-                continue
-
             data.append({
                 "id": row['appointment_id'],
                 "patientId": row['patient_id'],
-                "patientName": patient['name'],
-                "patientPhone": patient['phone'],
-                "age": patient['age'],
+                "patientName": row['patient_name'],
+                "patientPhone": row['patient_phone'],
+                "age": row['patient_age'],
                 "departmentId": row['department_id'],
                 "departmentName": row['department_name'],
                 "doctorId": row['doctor_id'] if row['doctor_id'] else None,
@@ -99,9 +128,7 @@ def get_appointments():
         logger.info(f"[DB RESULT] Fetched {len(data)} appointment records.")
 
         # --- 3. 写入缓存 ---
-        redis_client.set(cache_key, json.dumps(data, default=str), ex=15)
-
-        return jsonify(data)
+        return json_body_response(*cache_json(cache_key, data, ex=15))
 
     except Exception as e:
         logger.error(f"[ERROR] Fetching appointments failed: {str(e)}")
@@ -114,6 +141,7 @@ def get_appointments():
 
 # 根据年、月、日统计预约数据
 @appointment_bp.route('/api/appointments/statistics', methods=['GET'])
+@query_budget(1)
 def get_appointment_statistics():
     conn = None
     cursor = None
@@ -126,7 +154,7 @@ def get_appointment_statistics():
         cached_data = redis_client.get(cache_key)
         if cached_data:
             logger.info(f"[CACHE HIT] Appointment statistics for {date}")
-            return jsonify(json.loads(cached_data))
+            return jsonify(loads(cached_data))
 
         # --- 2. 查数据库 ---
         conn = get_db_connection()
@@ -191,7 +219,7 @@ def get_appointment_statistics():
         logger.info(f"[STATS RESULT] Hourly counts: {stats}")
 
         # --- 3. 写入缓存 ---
-        redis_client.set(cache_key, json.dumps(stats), ex=600)
+        redis_client.set(cache_key, dumps(stats), ex=600)
 
         return jsonify(stats)
 
@@ -206,33 +234,31 @@ def get_appointment_statistics():
 
 # 提交挂号
 @appointment_bp.route('/api/appointments', methods=['POST'])
+@query_budget(5)
 def create_appointment():
     data = request.json
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        patient_id = data.get('patientId')
-        dept_id = data.get('departmentId')
+    patient_id = data.get('patientId')
+    dept_id = data.get('departmentId')
 
-        # 只记录关键意图，不打印包含描述等敏感信息的完整 JSON
-        logger.info(f"[ACTION] New appointment request - Patient: {patient_id}, Dept: {dept_id}")
+    # 只记录关键意图，不打印包含描述等敏感信息的完整 JSON
+    logger.info(f"[ACTION] New appointment request - Patient: {patient_id}, Dept: {dept_id}")
 
+    # 事务体只包含数据库操作，遇到死锁/锁等待超时时可整体安全重放
+    # 返回 (错误响应, 分配的医生ID)
+    def _create(cursor):
         # 【高级查询】：合法性校验 - "有且仅有一个有效挂号"
         # 逻辑：查询该患者在该科室是否已经有一个状态为 'pending' 的挂号。如果 count > 0，则不允许再次挂号。
         if patient_id:
-            check_sql = """
-                SELECT COUNT(*) FROM appointments 
-                WHERE patient_id = %s AND department_id = %s AND status = 'pending'
-            """
-            cursor.execute(check_sql, (patient_id, dept_id))
-            (existing_count,) = cursor.fetchone()
+            # 已打删除标记的患者不可再挂号；同时锁定患者行，串行化该患者的并发挂号
+            if not query_one(conn, PATIENT_ACTIVE_STMT, (patient_id,)):
+                logger.warning(f"[BLOCK] Appointment blocked: Patient {patient_id} not found or being deleted")
+                return (jsonify({"success": False, "message": "患者不存在或已删除"}), 404), None
+
+            (existing_count,) = query_one(conn, PENDING_APPOINTMENT_STMT, (patient_id, dept_id))
 
             if existing_count > 0:
                 logger.warning(f"[BLOCK] Duplicate appointment blocked for Patient {patient_id}")
-                return jsonify({"success": False, "message": "您在该科室已有待就诊的挂号，请勿重复挂号"}), 400
+                return (jsonify({"success": False, "message": "您在该科室已有待就诊的挂号，请勿重复挂号"}), 400), None
 
         # 【高级查询】：分组与聚合
         # 逻辑：如果没有指定医生，自动分配给该科室当前 'pending' 挂号最少的医生
@@ -254,7 +280,7 @@ def create_appointment():
                 logger.info(f"[AUTO ASSIGN] Assigned Doctor {doctor_id} to appointment")
             else:
                 logger.warning(f"[BLOCK] No doctors available in Dept {dept_id}")
-                return jsonify({"success": False, "message": "该科室暂无医生排班"}), 400
+                return (jsonify({"success": False, "message": "该科室暂无医生排班"}), 400), None
 
         # 执行插入
         sql = """
@@ -263,34 +289,41 @@ def create_appointment():
         """
         cursor.execute(sql, (
             data.get('id'),
-            data.get('patientId'),
+            patient_id,
             dept_id,
             doctor_id,
             data.get('description', ''), 'pending',
             data.get('createTime')
         ))
 
-        conn.commit()
+        # 同一事务内维护桑基图 "挂号" 阶段计数
+        bump_flow(cursor, data.get('createTime'), dept_id, ('registered',))
+        return None, doctor_id
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        error, doctor_id = run_in_transaction(conn, _create, name='create_appointment', idempotent=True)
+        if error:
+            return error
 
         # 清除统计缓存
-        for key in redis_client.scan_iter("appt:stats:*"):
-            redis_client.delete(key)
+        clear_appointment_stats_cache()
 
         logger.info(f"[SUCCESS] Appointment created. ID: {data.get('id')}")
         return jsonify({"success": True, "message": f"挂号成功，已分配医生ID: {doctor_id}"})
 
     except Exception as e:
-        if conn: conn.rollback()
         logger.error(f"[ERROR] Create appointment failed: {str(e)}")
         return jsonify({"success": False, "message": str(e)}), 500
 
     finally:
-        if cursor: cursor.close()
         if conn: conn.close()
 
 
 # 更新挂号状态
 @appointment_bp.route('/api/appointments/<string:apt_id>', methods=['PUT'])
+@query_budget(1)
 def update_appointment_status(apt_id):
     data = request.json
     conn = None
@@ -310,8 +343,7 @@ def update_appointment_status(apt_id):
         conn.commit()
 
         # 清除统计缓存
-        for key in redis_client.scan_iter("appt:stats:*"):
-            redis_client.delete(key)
+        clear_appointment_stats_cache()
 
         return jsonify({"success": True, "message": "挂号状态已更新"})
 
@@ -324,4 +356,94 @@ def update_appointment_status(apt_id):
         if cursor: cursor.close()
         if conn: conn.close()
 
+
+# 批量更新挂号状态 (门诊结束时由医生/前台统一关闭)
+@appointment_bp.route('/api/appointments/batch', methods=['PUT'])
+@query_budget(2)
+def batch_update_appointment_status():
+    data = request.json or {}
+    updates = data.get('updates')
+
+    if not isinstance(updates, list) or not updates:
+        return jsonify({"success": False, "message": "updates 不能为空"}), 400
+    if len(updates) > BATCH_MAX_UPDATES:
+        return jsonify({"success": False, "message": f"单次最多更新 {BATCH_MAX_UPDATES} 条挂号"}), 400
+
+    # 请求体结构错误 (条目不是对象) 整体拒绝，只返回下标，不回显客户端内容
+    bad = [i for i, item in enumerate(updates) if not isinstance(item, dict)]
+    if bad:
+        return jsonify({"success": False, "message": f"updates 第 {bad[0]} 项不是对象"}), 400
+
+    logger.info(f"[ACTION] Batch update {len(updates)} appointment statuses")
+
+    # 参数校验：状态非法或 ID 重复的条目直接拒绝
+    requested = {}
+    invalid = []
+    for item in updates:
+        apt_id = item.get('id')
+        status = item.get('status')
+        if not apt_id or not isinstance(apt_id, str) or status not in APPOINTMENT_STATUSES or apt_id in requested:
+            invalid.append(apt_id)
+            continue
+        requested[apt_id] = status
+
+    # 事务体只包含数据库操作，遇到死锁/锁等待超时时可整体安全重放
+    # 返回 (已更新ID, 不存在ID, 已处于终态ID)
+    def _apply(cursor):
+        if not requested:
+            return [], [], []
+
+        ids = list(requested)
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(
+            f"SELECT id, status FROM appointments WHERE id IN ({placeholders}) ORDER BY id FOR UPDATE",
+            tuple(ids)
+        )
+        current = {row[0]: row[1] for row in cursor.fetchall()}
+
+        missing = [apt_id for apt_id in ids if apt_id not in current]
+        already_final = [apt_id for apt_id in ids if current.get(apt_id) in FINAL_STATUSES]
+        to_update = [apt_id for apt_id in ids if apt_id in current and current[apt_id] not in FINAL_STATUSES]
+
+        if to_update:
+            # 【高级查询】：单条 UPDATE ... CASE 完成整批状态流转
+            case_sql = " ".join(["WHEN %s THEN %s"] * len(to_update))
+            params = [v for apt_id in to_update for v in (apt_id, requested[apt_id])]
+            params += to_update
+            cursor.execute(
+                f"UPDATE appointments SET status = CASE id {case_sql} END "
+                f"WHERE id IN ({', '.join(['%s'] * len(to_update))})",
+                tuple(params)
+            )
+
+        return to_update, missing, already_final
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        updated, missing, already_final = run_in_transaction(
+            conn, _apply, name='batch_update_appointment_status', idempotent=True
+        )
+
+        # 整批只清除一次缓存
+        if updated:
+            clear_appointment_stats_cache()
+
+        logger.info(f"[SUCCESS] Batch status update. Updated: {len(updated)}, Missing: {len(missing)}, "
+                    f"Final: {len(already_final)}, Invalid: {len(invalid)}")
+        return jsonify({
+            "success": not (missing or already_final or invalid),
+            "updated": updated,
+            "missing": missing,
+            "alreadyFinal": already_final,
+            "invalid": invalid
+        })
+
+    except Exception as e:
+        logger.error(f"[ERROR] Batch status update failed: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+    finally:
+        if conn: conn.close()
+
 # --- END OF FILE app/api/appointment.py ---
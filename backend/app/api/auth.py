@@ -1,7 +1,9 @@
 # --- START OF FILE app/api/auth.py ---
 from flask import Blueprint, request, jsonify
-from app.utils.db import get_db_connection
-from app.utils.common import SECRET_KEY  # 导入 SECRET_KEY
+from app.utils.db import get_db_connection, register_statement, query_one
+from app.utils.common import SECRET_KEY, request_signing_key  # 导入 SECRET_KEY
+from app.utils.token_cache import token_cache, token_digest
+from app.utils.query_budget import query_budget
 import logging
 import jwt
 import datetime
@@ -10,8 +12,23 @@ import datetime
 auth_bp = Blueprint('auth', __name__)
 logger = logging.getLogger(__name__)
 
+# 医患登录查询 (服务端预处理语句)；删除中的患者不可登录
+LOGIN_STATEMENTS = {
+    'patient': register_statement(
+        "login_patient",
+        "SELECT id, name FROM patients WHERE id = %s AND password = %s AND deleted_at IS NULL",
+        dictionary=True
+    ),
+    'doctor': register_statement(
+        "login_doctor",
+        "SELECT id, name FROM doctors WHERE id = %s AND password = %s",
+        dictionary=True
+    ),
+}
+
 # 登录接口
 @auth_bp.route('/api/login', methods=['POST'])
+@query_budget(1)
 def login():
     data = request.json
     user_id = data.get('id')
@@ -19,7 +36,6 @@ def login():
     role = data.get('role')  # 'patient', 'doctor', 'admin'
 
     conn = None
-    cursor = None
 
     try:
         # 管理员登录（无需查库）
@@ -32,6 +48,7 @@ def login():
                 return jsonify({
                     "success": True,
                     "token": token,
+                    "signingKey": request_signing_key(token),
                     "user": {"id": "admin", "name": "系统管理员", "role": "admin"}
                 })
             else:
@@ -39,22 +56,14 @@ def login():
                 return jsonify({"success": False, "message": "管理员认证失败"}), 401
 
         # 医患登录（查询数据库）
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        table_name = ""
-        if role == 'patient':
-            table_name = "patients"
-        elif role == 'doctor':
-            table_name = "doctors"
-        else:
+        statement = LOGIN_STATEMENTS.get(role)
+        if statement is None:
             logger.warning("[SECURITY] Login blocked | Invalid role provided: %s", role)
             return jsonify({"success": False, "message": "无效的角色"}), 400
 
         # 从数据库获取用户数据
-        sql = f"SELECT id, name FROM {table_name} WHERE id = %s AND password = %s"
-        cursor.execute(sql, (user_id, password))
-        user = cursor.fetchone()
+        conn = get_db_connection()
+        user = query_one(conn, statement, (user_id, password))
 
         if user:
             logger.info("[AUTH] User login successful | User: %s | Role: %s", user_id, role)
@@ -63,6 +72,7 @@ def login():
             return jsonify({
                 "success": True,
                 "token": token,
+                "signingKey": request_signing_key(token),
                 "user": {
                     "id": user['id'],
                     "name": user['name'],
@@ -78,10 +88,20 @@ def login():
         return jsonify({"success": False, "message": "服务器内部错误"}), 500
 
     finally:
-        if cursor: cursor.close()
         if conn: conn.close()
 
 
+# 退出登录：吊销当前 Token (JWT 已在 before_request 中校验通过)
+@auth_bp.route('/api/logout', methods=['POST'])
+@query_budget(0)
+def logout():
+    token = request.headers.get('Authorization', '').split()[-1]
+    user = request.user_data
+    token_cache.revoke(token_digest(token), user.get('exp'))
+    logger.info("[AUTH] User logout | User: %s | Role: %s", user.get('user_id'), user.get('role'))
+    return jsonify({"success": True, "message": "已退出登录"})
+
+
 # 生成 JWT
 def generate_jwt(user_id, role):
     # 设置 JWT 过期时间（例如 1 小时）
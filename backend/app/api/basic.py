@@ -1,9 +1,12 @@
 # --- START OF FILE app/api/basic.py ---
 from flask import Blueprint, request, jsonify
 from app.utils.db import get_db_connection
-from app.utils.redis_client import redis_client
+from app.utils.redis_client import redis_client, fetch_many_cached, get_cached_json, cache_json
+from app.utils.common import parse_ids_param, cache_control, json_body_response
+from app.utils.row_mapper import RowMapper
 import logging
-import json
+from app.utils.serialization import dumps, loads
+from app.utils.query_budget import query_budget
 
 basic_bp = Blueprint('basic', __name__)
 logger = logging.getLogger(__name__)
@@ -32,18 +35,94 @@ def clear_basic_cache(type_):
         logger.error(f"[ERROR] Failed to clear {type_} cache: {e}")
 
 
-# 获取所有科室
+def clear_medicine_stock_cache(*medicine_ids):
+    """库存扣减后清除药品列表及这些药品的详情缓存 (basic:med:{id}，?ids= 批量查询同样读取)"""
+    try:
+        keys = ['basic:meds:list'] + [f"basic:med:{med_id}" for med_id in {m for m in medicine_ids if m}]
+        redis_client.delete(*keys)
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to clear medicine stock cache: {e}")
+
+
+# 科室 / 药品详情查询 (单个与批量共用)
+DEPARTMENT_DETAIL_SQL = """
+    SELECT d.id, d.name, d.location,
+           (SELECT COUNT(*) FROM doctors doc WHERE doc.department_id = d.id) AS doctor_count
+    FROM departments d
+"""
+MEDICINE_DETAIL_SQL = "SELECT id, name, price, stock, specification FROM medicines"
+
+
+def _department_detail(row):
+    return {
+        "id": row['id'],
+        "name": row['name'],
+        "location": row['location'],
+        "doctorCount": int(row['doctor_count'])
+    }
+
+
+def _medicine_detail(row):
+    return {
+        "id": row['id'],
+        "name": row['name'],
+        "price": row['price'],
+        "stock": row['stock'],
+        "specification": row['specification']
+    }
+
+
+# 药品列表的行映射 (字段名与列名相同)
+MEDICINE_LIST_MAPPER = RowMapper(
+    id="id",
+    name="name",
+    price="price",
+    stock="stock",
+    specification="specification",
+)
+
+
+def _load_details_by_ids(sql, id_column, ids, mapper, label):
+    """一条 IN 查询加载多个详情，返回 {id: data}"""
+    conn = None
+    cursor = None
+    try:
+        logger.info(f"[DB QUERY] Fetching {len(ids)} {label} details by ids")
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(f"{sql} WHERE {id_column} IN ({placeholders})", tuple(ids))
+        return {row['id']: mapper(row) for row in cursor.fetchall()}
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+# 获取所有科室 (支持 ?ids=a,b,c 批量获取科室详情)
 @basic_bp.route('/api/departments', methods=['GET'])
+@query_budget(1)
+@cache_control(max_age=60)
 def get_departments():
     conn = None
     cursor = None
     try:
+        # --- 0. 批量详情：MGET 命中缓存，未命中的一次 IN 查询后回填 ---
+        ids = parse_ids_param()
+        if ids:
+            data, hits = fetch_many_cached(
+                ids, lambda _id: f"basic:dept:{_id}",
+                lambda misses: _load_details_by_ids(DEPARTMENT_DETAIL_SQL, "d.id", misses, _department_detail, "department"),
+                ex=3600
+            )
+            logger.info(f"[BATCH] Department details: {len(ids)} requested, {hits} cache hits")
+            return jsonify(data)
+
         # --- 1. 查缓存 ---
         cache_key = 'basic:depts:list'
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
+        cached = get_cached_json(cache_key)
+        if cached:
             logger.info(f"[CACHE HIT] Departments list")
-            return jsonify(json.loads(cached_data))
+            return json_body_response(*cached)
 
         # --- 2. 查库 ---
         logger.info("[DB QUERY] Fetching all departments.")
@@ -56,9 +135,7 @@ def get_departments():
         logger.info(f"[DB RESULT] Fetched {len(result)} departments.")
 
         # --- 3. 写缓存 (1小时) ---
-        redis_client.set(cache_key, json.dumps(result), ex=3600)
-
-        return jsonify(result)
+        return json_body_response(*cache_json(cache_key, result, ex=3600))
     except Exception as e:
         logger.error(f"[ERROR] Fetching departments failed: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -69,6 +146,8 @@ def get_departments():
 
 # 查看科室详情
 @basic_bp.route('/api/departments/<string:department_id>', methods=['GET'])
+@query_budget(1)
+@cache_control(max_age=60)
 def get_department_detail(department_id):
     conn = None
     cursor = None
@@ -78,34 +157,23 @@ def get_department_detail(department_id):
         cached_data = redis_client.get(cache_key)
         if cached_data:
             logger.info(f"[CACHE HIT] Department detail: {department_id}")
-            return jsonify(json.loads(cached_data))
+            return jsonify(loads(cached_data))
 
         # --- 2. 查库 ---
         logger.info(f"[DB QUERY] Fetching department detail: {department_id}")
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        sql = """
-            SELECT d.id, d.name, d.location,
-                   (SELECT COUNT(*) FROM doctors doc WHERE doc.department_id = d.id) AS doctor_count
-            FROM departments d
-            WHERE d.id = %s
-        """
-        cursor.execute(sql, (department_id,))
+        cursor.execute(DEPARTMENT_DETAIL_SQL + " WHERE d.id = %s", (department_id,))
         row = cursor.fetchone()
         if not row:
             logger.warning(f"[BLOCK] Department {department_id} not found.")
             return jsonify({"success": False, "message": "科室不存在"}), 404
 
-        data = {
-            "id": row['id'],
-            "name": row['name'],
-            "location": row['location'],
-            "doctorCount": int(row['doctor_count'])
-        }
+        data = _department_detail(row)
 
         # --- 3. 写缓存 (1小时) ---
-        redis_client.set(cache_key, json.dumps(data), ex=3600)
+        redis_client.set(cache_key, dumps(data), ex=3600)
 
         return jsonify(data)
 
@@ -120,6 +188,7 @@ def get_department_detail(department_id):
 
 # 删除科室：必须医生为0才可删除
 @basic_bp.route('/api/departments/<string:department_id>', methods=['DELETE'])
+@query_budget(2)
 def delete_department(department_id):
     conn = None
     cursor = None
@@ -159,35 +228,42 @@ def delete_department(department_id):
         if conn: conn.close()
 
 
-# 获取所有药品
+# 获取所有药品 (支持 ?ids=a,b,c 批量获取药品详情)
 @basic_bp.route('/api/medicines', methods=['GET'])
+@query_budget(1)
+@cache_control(max_age=15)
 def get_medicines():
     conn = None
     cursor = None
     try:
+        # --- 0. 批量详情：MGET 命中缓存，未命中的一次 IN 查询后回填 ---
+        ids = parse_ids_param()
+        if ids:
+            data, hits = fetch_many_cached(
+                ids, lambda _id: f"basic:med:{_id}",
+                lambda misses: _load_details_by_ids(MEDICINE_DETAIL_SQL, "id", misses, _medicine_detail, "medicine"),
+                ex=300
+            )
+            logger.info(f"[BATCH] Medicine details: {len(ids)} requested, {hits} cache hits")
+            return jsonify(data)
+
         # --- 1. 查缓存 ---
         cache_key = 'basic:meds:list'
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
+        cached = get_cached_json(cache_key)
+        if cached:
             logger.info("[CACHE HIT] Medicines list")
-            return jsonify(json.loads(cached_data))
+            return json_body_response(*cached)
 
         # --- 2. 查库 ---
         logger.info("[DB QUERY] Fetching all medicines")
 
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id, name, price, stock, specification FROM medicines")
-        rows = cursor.fetchall()
-
-        # 确保 Decimal 类型转为 float 或 string，以便 JSON 序列化
-        for row in rows:
-            row['price'] = float(row['price'])
+        cursor = conn.cursor()
+        cursor.execute(MEDICINE_DETAIL_SQL)
+        data = MEDICINE_LIST_MAPPER.fetch_all(cursor)
 
         # --- 3. 写缓存 (5分钟) ---
-        redis_client.set(cache_key, json.dumps(rows), ex=300)
-
-        return jsonify(rows)
+        return json_body_response(*cache_json(cache_key, data, ex=300))
     except Exception as e:
         logger.error(f"[ERROR] Fetching medicines failed: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -198,6 +274,8 @@ def get_medicines():
 
 # 查看某个药品详情
 @basic_bp.route('/api/medicines/<string:medicine_id>', methods=['GET'])
+@query_budget(1)
+@cache_control(max_age=15)
 def get_medicine_detail(medicine_id):
     conn = None
     cursor = None
@@ -207,30 +285,22 @@ def get_medicine_detail(medicine_id):
         cached_data = redis_client.get(cache_key)
         if cached_data:
             logger.info(f"[CACHE HIT] Medicine detail: {medicine_id}")
-            return jsonify(json.loads(cached_data))
+            return jsonify(loads(cached_data))
 
         # --- 2. 查库 ---
         logger.info(f"[DB QUERY] Fetching medicine detail: {medicine_id}")
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        sql = "SELECT id, name, price, stock, specification FROM medicines WHERE id = %s"
-        cursor.execute(sql, (medicine_id,))
+        cursor.execute(MEDICINE_DETAIL_SQL + " WHERE id = %s", (medicine_id,))
         row = cursor.fetchone()
         if not row:
             return jsonify({"success": False, "message": "药品不存在"}), 404
 
-        row['price'] = float(row['price'])
-        data = {
-            "id": row['id'],
-            "name": row['name'],
-            "price": row['price'],
-            "stock": row['stock'],
-            "specification": row['specification']
-        }
+        data = _medicine_detail(row)
 
         # --- 3. 写缓存 (5分钟) ---
-        redis_client.set(cache_key, json.dumps(data), ex=300)
+        redis_client.set(cache_key, dumps(data), ex=300)
 
         return jsonify(data)
 
@@ -245,12 +315,13 @@ def get_medicine_detail(medicine_id):
 
 # 修改药品信息
 @basic_bp.route('/api/medicines/<string:medicine_id>', methods=['PUT'])
+@query_budget(1)
 def update_medicine_detail(medicine_id):
     data = request.json or {}
     conn = None
     cursor = None
     try:
-        logger.info(f"[ACTION] Updating medicine {medicine_id}: {data}")
+        logger.info(f"[ACTION] Updating medicine {medicine_id} (Fields: {sorted(data)})")
         conn = get_db_connection()
         cursor = conn.cursor()
 
@@ -296,6 +367,7 @@ def update_medicine_detail(medicine_id):
 
 # 删除药品：若有相关处方细则，则无法删除
 @basic_bp.route('/api/medicines/<string:medicine_id>', methods=['DELETE'])
+@query_budget(2)
 def delete_medicine(medicine_id):
     conn = None
     cursor = None
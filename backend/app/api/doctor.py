@@ -1,9 +1,12 @@
 # --- START OF FILE app/api/doctor.py ---
 from flask import Blueprint, request, jsonify
-from app.utils.db import get_db_connection
-from app.utils.redis_client import redis_client  # 直接导入 redis_client 实例
+from app.utils.db import get_db_connection, register_statement, query_one
+from app.utils.redis_client import redis_client, fetch_many_cached, get_cached_json, cache_json  # 直接导入 redis_client 实例
+from app.utils.common import parse_ids_param, json_body_response
+from app.utils.row_mapper import RowMapper
 import logging
-import json
+from app.utils.serialization import dumps, loads
+from app.utils.query_budget import query_budget
 
 doctor_bp = Blueprint('doctor', __name__)
 logger = logging.getLogger(__name__)
@@ -24,24 +27,86 @@ def clear_doctor_cache(doctor_id=None):
         logger.error(f"[ERROR] Failed to clear doctor cache: {e}")
 
 
-# 获取所有医生信息
+# 医生详情查询 (单个与批量共用)
+DOCTOR_DETAIL_SQL = """
+    SELECT d.id, d.name, d.title, d.specialty, d.phone, d.department_id,
+           dept.name AS department_name
+    FROM doctors d
+    LEFT JOIN departments dept ON d.department_id = dept.id
+"""
+
+
+# 单个医生详情 (服务端预处理语句)
+DOCTOR_DETAIL_STMT = register_statement("doctor_detail", DOCTOR_DETAIL_SQL + " WHERE d.id = %s", dictionary=True)
+
+
+def _doctor_detail(row):
+    return {
+        "id": row['id'],
+        "name": row['name'],
+        "title": row['title'],
+        "specialty": row['specialty'],
+        "phone": row['phone'],
+        "departmentId": row['department_id'],
+        "departmentName": row.get('department_name')
+    }
+
+
+# 医生列表的行映射 (列名 -> 前端字段)
+DOCTOR_LIST_MAPPER = RowMapper(
+    id="id",
+    name="name",
+    departmentId="department_id",
+    title="title",
+    specialty="specialty",
+    phone="phone",
+    pendingCount="pending_count",
+)
+
+
+def _load_doctor_details(ids):
+    """一条 IN 查询加载多个医生详情，返回 {id: data}"""
+    conn = None
+    cursor = None
+    try:
+        logger.info(f"[DB QUERY] Fetching {len(ids)} doctor details by ids")
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(DOCTOR_DETAIL_SQL + f" WHERE d.id IN ({placeholders})", tuple(ids))
+        return {row['id']: _doctor_detail(row) for row in cursor.fetchall()}
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+# 获取所有医生信息 (支持 ?ids=a,b,c 批量获取医生详情)
 @doctor_bp.route('/api/doctors', methods=['GET'])
+@query_budget(1)
 def get_doctors():
     conn = None
     cursor = None
     try:
+        # --- 0. 批量详情：MGET 命中缓存，未命中的一次 IN 查询后回填 ---
+        ids = parse_ids_param()
+        if ids:
+            data, hits = fetch_many_cached(ids, lambda _id: f"doctor:{_id}", _load_doctor_details, ex=3600)
+            logger.info(f"[BATCH] Doctor details: {len(ids)} requested, {hits} cache hits")
+            return jsonify(data)
+
         # --- 1. 查缓存 ---
+        # 命中时按 ETag 比对，未变化直接返回 304
         cache_key = "doctors:list"
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
+        cached = get_cached_json(cache_key)
+        if cached:
             logger.info("[CACHE HIT] Doctors list")
-            return jsonify(json.loads(cached_data))
+            return json_body_response(*cached)
 
         # --- 2. 查库 ---
         logger.info("[DB QUERY] Fetching all doctors with pending counts.")
 
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
 
         # 【高级查询】：相关子查询
         sql = """
@@ -53,26 +118,12 @@ def get_doctors():
         """
 
         cursor.execute(sql)
-        rows = cursor.fetchall()
-
-        data = []
-        for row in rows:
-            data.append({
-                "id": row['id'],
-                "name": row['name'],
-                "departmentId": row['department_id'],
-                "title": row['title'],
-                "specialty": row['specialty'],
-                "phone": row['phone'],
-                "pendingCount": row['pending_count']
-            })
+        data = DOCTOR_LIST_MAPPER.fetch_all(cursor)
 
         logger.info(f"[DB RESULT] Fetched {len(data)} doctors.")
 
         # --- 3. 写缓存 (10分钟 - pending_count 不需要秒级实时，但也别太久) ---
-        redis_client.set(cache_key, json.dumps(data), ex=600)
-
-        return jsonify(data)
+        return json_body_response(*cache_json(cache_key, data, ex=600))
 
     except Exception as e:
         logger.error(f"[ERROR] Fetching doctors failed: {str(e)}")
@@ -84,9 +135,9 @@ def get_doctors():
 
 # 查看某个医生详情
 @doctor_bp.route('/api/doctors/<string:doctor_id>', methods=['GET'])
+@query_budget(1)
 def get_doctor_detail(doctor_id):
     conn = None
-    cursor = None
     try:
         # 1. 尝试查询缓存
         cache_key = f"doctor:{doctor_id}"
@@ -95,7 +146,7 @@ def get_doctor_detail(doctor_id):
         if cached_data:
             try:
                 logger.info(f"[CACHE HIT] Doctor detail: {doctor_id}")
-                return jsonify(json.loads(cached_data)), 200
+                return jsonify(loads(cached_data)), 200
             except Exception as e:
                 logger.error(f"[ERROR] Redis data parse error: {e}")
                 redis_client.delete(cache_key)
@@ -104,35 +155,17 @@ def get_doctor_detail(doctor_id):
         logger.info(f"[DB QUERY] Fetching doctor detail: {doctor_id}")
 
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        sql = """
-            SELECT d.id, d.name, d.title, d.specialty, d.phone, d.department_id,
-                   dept.name AS department_name
-            FROM doctors d
-            LEFT JOIN departments dept ON d.department_id = dept.id
-            WHERE d.id = %s
-        """
-        cursor.execute(sql, (doctor_id,))
-        row = cursor.fetchone()
+        row = query_one(conn, DOCTOR_DETAIL_STMT, (doctor_id,))
 
         if not row:
             logger.warning(f"[BLOCK] Doctor {doctor_id} not found.")
             return jsonify({"success": False, "message": "医生不存在"}), 404
 
         # 构造返回数据
-        data = {
-            "id": row['id'],
-            "name": row['name'],
-            "title": row['title'],
-            "specialty": row['specialty'],
-            "phone": row['phone'],
-            "departmentId": row['department_id'],
-            "departmentName": row.get('department_name')
-        }
+        data = _doctor_detail(row)
 
         # 3. 写入缓存
-        redis_client.set(cache_key, json.dumps(data), ex=3600)
+        redis_client.set(cache_key, dumps(data), ex=3600)
 
         return jsonify(data), 200
 
@@ -141,17 +174,17 @@ def get_doctor_detail(doctor_id):
         return jsonify({"success": False, "message": str(e)}), 500
 
     finally:
-        if cursor: cursor.close()
         if conn: conn.close()
 
 # 修改医生信息
 @doctor_bp.route('/api/doctors/<string:doctor_id>', methods=['PUT'])
+@query_budget(2)
 def update_doctor_detail(doctor_id):
     data = request.json or {}
     conn = None
     cursor = None
     try:
-        logger.info(f"[ACTION] Updating doctor {doctor_id}: {data}")
+        logger.info(f"[ACTION] Updating doctor {doctor_id} (Fields: {sorted(data)})")
         conn = get_db_connection()
         cursor = conn.cursor()
 
@@ -210,6 +243,7 @@ def update_doctor_detail(doctor_id):
 
 # 删除医生：若有病历/挂号关联，则无法删除
 @doctor_bp.route('/api/doctors/<string:doctor_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_doctor(doctor_id):
     conn = None
     cursor = None
@@ -0,0 +1,127 @@
+# --- START OF FILE app/api/metrics.py ---
+import os
+import hmac
+import logging
+from flask import Blueprint, Response, request, jsonify
+from app.utils.common import verify_jwt, admin_required
+from app.utils.metrics import collect_snapshots, merge_snapshots, render_prometheus
+from app.utils.slow_query import SLOW_QUERY_MS, merge_slow_queries
+from app.utils.profiling import list_profiles, get_profile, get_profile_pstats
+from app.utils.query_budget import query_budget
+
+metrics_bp = Blueprint('metrics', __name__)
+logger = logging.getLogger(__name__)
+
+# Prometheus 抓取令牌：抓取端无法携带签名时间戳与 JWT，配置后可用 "Authorization: Bearer <METRICS_TOKEN>" 访问；
+# 未配置时只允许管理员 JWT。/metrics 只在后端端口上提供，Nginx 不转发 (只代理 /api/)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def _authorize():
+    """返回 None 表示放行，否则返回错误响应"""
+    auth_header = request.headers.get('Authorization', '')
+    parts = auth_header.split()
+    if METRICS_TOKEN and len(parts) == 2 and parts[0].lower() == 'bearer' \
+            and hmac.compare_digest(parts[1], METRICS_TOKEN):
+        return None
+
+    result = verify_jwt()
+    if not isinstance(result, dict):
+        return result
+    if result.get('role') != 'admin':
+        logger.warning(f"[AUTH] Blocked: /metrics requires admin (User: {result.get('user_id')})")
+        return jsonify({'message': 'Admin privilege required!'}), 403
+    return None
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+@query_budget(0)
+def get_metrics():
+    """Prometheus 文本格式的请求/数据库指标，聚合所有 gunicorn worker"""
+    error = _authorize()
+    if error:
+        return error
+
+    body = render_prometheus(merge_snapshots(collect_snapshots()))
+    response = Response(body, mimetype='text/plain')
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+SLOW_QUERY_SORT_KEYS = {'total': 'total_ms', 'max': 'max_ms', 'avg': 'avg_ms', 'count': 'count'}
+
+
+@metrics_bp.route('/api/admin/slow-queries', methods=['GET'])
+@query_budget(0)
+@admin_required
+def get_slow_queries():
+    """
+    慢查询排行 (合并所有 worker)：?sort=total|max|avg|count (默认 total)，?limit=20，
+    ?explain=1 时附带捕获到的 EXPLAIN FORMAT=JSON 执行计划
+    """
+    sort_key = SLOW_QUERY_SORT_KEYS.get(request.args.get('sort', 'total'))
+    if not sort_key:
+        return jsonify({"success": False, "message": f"sort 只能为 {'/'.join(SLOW_QUERY_SORT_KEYS)}"}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    with_explain = request.args.get('explain') == '1'
+
+    entries = merge_slow_queries(collect_snapshots())
+    entries.sort(key=lambda entry: entry[sort_key], reverse=True)
+
+    data = []
+    for entry in entries[:limit]:
+        item = {
+            "digest": entry['digest'],
+            "sql": entry['sql'],
+            "count": entry['count'],
+            "totalMs": round(entry['total_ms'], 1),
+            "avgMs": round(entry['avg_ms'], 1),
+            "maxMs": round(entry['max_ms'], 1),
+            "maxRows": entry['max_rows'],
+            "endpoints": entry['endpoints'],
+            "lastParams": entry['last_params'],
+            "lastSeen": entry['last_seen'],
+            "planFlags": entry['plan_flags'],
+        }
+        if with_explain:
+            item["explain"] = entry['explain']
+        data.append(item)
+
+    return jsonify({"success": True, "thresholdMs": SLOW_QUERY_MS, "total": len(entries), "data": data})
+
+
+@metrics_bp.route('/api/admin/profiles', methods=['GET'])
+@query_budget(0)
+@admin_required
+def get_profiles():
+    """最近的请求剖析记录 (管理员请求携带 X-Profile: 1 时生成)"""
+    try:
+        return jsonify({"success": True, "data": list_profiles()})
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to list profiles: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
+@metrics_bp.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@query_budget(0)
+@admin_required
+def get_profile_detail(profile_id):
+    """剖析报告 (调用树、热点函数、各阶段耗时)；?format=pstats 下载原始数据，可用 pstats / snakeviz 打开"""
+    try:
+        if request.args.get('format') == 'pstats':
+            raw = get_profile_pstats(profile_id)
+            if raw is None:
+                return jsonify({"success": False, "message": "剖析记录不存在或已过期"}), 404
+            response = Response(raw, mimetype='application/octet-stream')
+            response.headers['Content-Disposition'] = f'attachment; filename="{profile_id}.pstats"'
+            return response
+
+        body = get_profile(profile_id)
+        if body is None:
+            return jsonify({"success": False, "message": "剖析记录不存在或已过期"}), 404
+        return Response(body, mimetype='application/json')
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to load profile {profile_id}: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+# --- END OF FILE app/api/metrics.py ---
@@ -4,8 +4,12 @@ import logging
 from flask import Blueprint, request, jsonify, send_file
 from werkzeug.utils import secure_filename
 from app.utils.db import get_db_connection
-from app.utils.redis_client import redis_client  # 导入 Redis
-import json
+from app.utils.redis_client import redis_client, get_cached_json, cache_json  # 导入 Redis
+from app.api.patient import clear_patient_timeline_cache
+from app.utils.common import remove_data_file, json_body_response
+from app.utils.row_mapper import RowMapper
+from app.utils.serialization import iso_datetime
+from app.utils.query_budget import query_budget
 
 multimodal_bp = Blueprint('multimodal', __name__)
 logger = logging.getLogger(__name__)
@@ -14,6 +18,22 @@ logger = logging.getLogger(__name__)
 UPLOAD_ROOT = os.path.join(os.getcwd(), "uploaded_files")
 os.makedirs(UPLOAD_ROOT, exist_ok=True)
 
+# 列表接口的行映射 (列名 -> 前端字段)，fileUrl 给前端一个现成可用的文件 URL
+MULTIMODAL_LIST_MAPPER = RowMapper(
+    id="id",
+    patientId="patient_id",
+    recordId="record_id",
+    sourceTable="source_table",
+    sourcePk="source_pk",
+    modality="modality",
+    textContent="text_content",
+    filePath="file_path",
+    fileFormat="file_format",
+    description="description",
+    createdAt=("created_at", iso_datetime),
+    fileUrl=("id", lambda record_id: f"/api/multimodal/file/{record_id}"),
+)
+
 
 # --- 辅助函数：清除列表缓存 ---
 def clear_multimodal_list_cache():
@@ -28,6 +48,7 @@ def clear_multimodal_list_cache():
 
 # 获取多模态数据列表
 @multimodal_bp.route('/api/multimodal', methods=['GET'])
+@query_budget(1)
 def get_multimodal_list():
     conn = None
     cursor = None
@@ -37,16 +58,16 @@ def get_multimodal_list():
 
         # --- 1. 查缓存 ---
         cache_key = f"multimodal:list:{modality}:{patient_id}"
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
+        cached = get_cached_json(cache_key)
+        if cached:
             logger.info(f"[CACHE HIT] Multimodal list: {cache_key}")
-            return jsonify(json.loads(cached_data))
+            return json_body_response(*cached)
 
         # --- 2. 查库 ---
         logger.info(f"[DB QUERY] Fetching multimodal data (Modality: {modality}, Patient: {patient_id})")
 
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
 
         sql = """
             SELECT id, patient_id, record_id, source_table, source_pk,
@@ -65,32 +86,12 @@ def get_multimodal_list():
             params.append(patient_id)
 
         cursor.execute(sql, tuple(params))
-        rows = cursor.fetchall()
-
-        data = []
-        for row in rows:
-            data.append({
-                "id": row["id"],
-                "patientId": row["patient_id"],
-                "recordId": row["record_id"],
-                "sourceTable": row["source_table"],
-                "sourcePk": row["source_pk"],
-                "modality": row["modality"],
-                "textContent": row["text_content"],
-                "filePath": row["file_path"],     
-                "fileFormat": row["file_format"],
-                "description": row["description"],
-                "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-                # 给前端一个现成可用的文件 URL
-                "fileUrl": f"/api/multimodal/file/{row['id']}",
-            })
+        data = MULTIMODAL_LIST_MAPPER.fetch_all(cursor)
 
         logger.info(f"[DB RESULT] Fetched {len(data)} records.")
 
         # --- 3. 写缓存 (30秒) ---
-        redis_client.set(cache_key, json.dumps(data), ex=30)
-
-        return jsonify(data)
+        return json_body_response(*cache_json(cache_key, data, ex=30))
 
     except Exception as e:
         logger.error(f"[ERROR] Fetching multimodal list failed: {str(e)}")
@@ -103,6 +104,7 @@ def get_multimodal_list():
 
 # 创建多模态数据（支持 multipart/form-data 上传文件，也支持纯 JSON）
 @multimodal_bp.route('/api/multimodal', methods=['POST'])
+@query_budget(2)
 def create_multimodal():
     conn = None
     cursor = None
@@ -186,6 +188,13 @@ def create_multimodal():
 
         # 清除列表缓存
         clear_multimodal_list_cache()
+        if record_id:
+            owner_id = patient_id
+            if not owner_id:
+                cursor.execute("SELECT patient_id FROM medical_records WHERE id = %s", (record_id,))
+                owner = cursor.fetchone()
+                owner_id = owner[0] if owner else None
+            clear_patient_timeline_cache(owner_id)
 
         logger.info(f"[SUCCESS] Multimodal record {_id} created.")
         return jsonify(
@@ -213,6 +222,7 @@ def create_multimodal():
 
 # 删除多模态数据
 @multimodal_bp.route('/api/multimodal/<string:data_id>', methods=['DELETE'])
+@query_budget(2)
 def delete_multimodal(data_id):
     conn = None
     cursor = None
@@ -222,8 +232,13 @@ def delete_multimodal(data_id):
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        # 先查文件路径
-        cursor.execute("SELECT file_path FROM multimodal_data WHERE id = %s", (data_id,))
+        # 先查文件路径 (以及所属患者，用于清除时间线缓存)
+        cursor.execute("""
+            SELECT m.file_path, COALESCE(m.patient_id, r.patient_id) AS owner_id
+            FROM multimodal_data m
+            LEFT JOIN medical_records r ON m.record_id = r.id
+            WHERE m.id = %s
+        """, (data_id,))
         row = cursor.fetchone()
 
         if not row:
@@ -241,17 +256,11 @@ def delete_multimodal(data_id):
         conn.commit()
 
         # 尝试删文件
-        if file_path:
-            abs_path = file_path if os.path.isabs(file_path) else os.path.join(os.getcwd(), file_path)
-            if os.path.exists(abs_path):
-                try:
-                    os.remove(abs_path)
-                    logger.info(f"[FILE DELETE] Removed {abs_path}")
-                except Exception as fe:
-                    logger.warning(f"[FILE ERROR] Failed to delete file: {fe}")
+        remove_data_file(file_path)
 
         # 清除列表缓存
         clear_multimodal_list_cache()
+        clear_patient_timeline_cache(row["owner_id"])
 
         logger.info(f"[SUCCESS] Record {data_id} deleted.")
         return jsonify({"success": True, "message": "删除成功"}), 200
@@ -268,6 +277,7 @@ def delete_multimodal(data_id):
 
 # 按 id 获取具体文件内容
 @multimodal_bp.route('/api/multimodal/file/<string:data_id>', methods=['GET'])
+@query_budget(1)
 def get_multimodal_file(data_id):
     conn = None
     cursor = None
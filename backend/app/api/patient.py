@@ -1,15 +1,41 @@
 # --- START OF FILE app/api/patient.py ---
 from flask import Blueprint, request, jsonify
-from app.utils.db import get_db_connection
-from app.utils.redis_client import redis_client
+from app.utils.db import get_db_connection, run_in_transaction
+from app.utils.redis_client import redis_client, get_cached_json, cache_json
+from app.utils.flow_stats import subtract_record_flows, subtract_appointment_flows
 import logging
-import json
-from datetime import date
-from app.utils.common import format_date
+from mysql.connector import IntegrityError, errorcode
+from app.utils.serialization import dumps, loads, iso_datetime
+import threading
+import click
+from datetime import date, datetime
+from app.utils.common import remove_data_file, json_body_response
+from app.utils.row_mapper import RowMapper
+from app.utils.query_budget import query_budget
 
 patient_bp = Blueprint('patient', __name__)
 logger = logging.getLogger(__name__)
 
+# 患者列表的行映射 (列名 -> 前端字段)
+PATIENT_LIST_MAPPER = RowMapper(
+    id="id",
+    name="name",
+    gender="gender",
+    age="age",
+    phone="phone",
+    address="address",
+    createTime="create_time",
+    isVip=("is_vip", bool),
+)
+
+# 时间线分页：默认每页病历数与上限
+TIMELINE_DEFAULT_LIMIT = 20
+TIMELINE_MAX_LIMIT = 100
+
+# 删除患者：每个事务最多删除的行数，以及进度信息的保留时间 (秒)
+PURGE_CHUNK_SIZE = 200
+PURGE_PROGRESS_TTL = 86400
+
 
 # --- 辅助函数：清除缓存 ---
 def clear_patient_cache():
@@ -32,8 +58,20 @@ def clear_patient_cache():
         logger.error(f"[ERROR] Failed to clear patient cache: {e}")
 
 
+def clear_patient_timeline_cache(*patient_ids):
+    """病历 / 处方 / 多模态数据变更后，清除对应患者的时间线缓存 (patients:timeline:{id}:*)"""
+    try:
+        for patient_id in {pid for pid in patient_ids if pid}:
+            keys = list(redis_client.scan_iter(f"patients:timeline:{patient_id}:*"))
+            if keys:
+                redis_client.delete(*keys)
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to clear patient timeline cache: {e}")
+
+
 # 获取所有患者信息
 @patient_bp.route('/api/patients', methods=['GET'])
+@query_budget(1)
 def get_patients():
     conn = None
     cursor = None
@@ -45,20 +83,16 @@ def get_patients():
         # --- 1. 尝试从 Redis 获取缓存 ---
         cache_key = f"patients:list:{query}:{limit or 'all'}:{offset or 0}"
 
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            try:
-                logger.info(f"[CACHE HIT] Patient list for key: {cache_key}")
-                return jsonify(json.loads(cached_data))
-            except Exception as e:
-                logger.error(f"[ERROR] Redis json parse error: {e}")
-                redis_client.delete(cache_key)
+        cached = get_cached_json(cache_key)
+        if cached:
+            logger.info(f"[CACHE HIT] Patient list for key: {cache_key}")
+            return json_body_response(*cached)
 
         # --- 2. 缓存未命中，查数据库 ---
         logger.info(f"[DB QUERY] Fetching patients (Query: '{query}', Limit: {limit}, Offset: {offset})")
 
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
 
         # 【高级查询】：全称量词 / 关系除法 
         # 查找“去过所有科室”的患者(特别需要关注的病人)。
@@ -76,12 +110,13 @@ def get_patients():
                     ELSE 0 
                 END AS is_vip
             FROM patients p
+            WHERE p.deleted_at IS NULL
         """
 
         # 如果有 query 参数，添加过滤条件
         params = ()
         if query:
-            sql += " WHERE p.id = %s OR p.name LIKE %s"
+            sql += " AND (p.id = %s OR p.name LIKE %s)"
             params = (query, f"%{query}%")
 
         # 只有在提供 limit 和 offset 时才加上分页限制
@@ -90,28 +125,14 @@ def get_patients():
             params += (limit, offset)
 
         cursor.execute(sql, params)
-        rows = cursor.fetchall()
 
-        # 映射字段 create_time -> createTime 并格式化日期
-        data = []
-        for row in rows:
-            data.append({
-                "id": row['id'],
-                "name": row['name'],
-                "gender": row['gender'],
-                "age": row['age'],
-                "phone": row['phone'],
-                "address": row['address'],
-                "createTime": format_date(row['create_time']),
-                "isVip": bool(row['is_vip'])
-            })
+        # 映射字段 create_time -> createTime, is_vip -> isVip
+        data = PATIENT_LIST_MAPPER.fetch_all(cursor)
 
         logger.info(f"[DB RESULT] Fetched {len(data)} patients.")
 
         # --- 3. 写入 Redis 缓存 ---
-        redis_client.set(cache_key, json.dumps(data), ex=30)
-
-        return jsonify(data)
+        return json_body_response(*cache_json(cache_key, data, ex=30))
     except Exception as e:
         logger.error(f"[ERROR] Fetching patients failed: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -122,6 +143,7 @@ def get_patients():
 
 # 新增/注册患者
 @patient_bp.route('/api/patients', methods=['POST'])
+@query_budget(2)
 def create_patient():
     data = request.json
     conn = None
@@ -165,6 +187,15 @@ def create_patient():
         logger.info(f"[SUCCESS] Patient {p_id} registered.")
         return jsonify({"success": True, "message": "患者注册成功"})
 
+    except IntegrityError as e:
+        # 并发注册同一 ID：存在性检查都通过，后插入的一方由主键拦截
+        if conn: conn.rollback()
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            logger.warning(f"[BLOCK] Patient ID {data.get('id')} already exists (concurrent insert).")
+            return jsonify({"success": False, "message": "ID已存在，请勿重复注册"}), 400
+        logger.error(f"[ERROR] Creating patient failed: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
     except Exception as e:
         if conn: conn.rollback()
         logger.error(f"[ERROR] Creating patient failed: {str(e)}")
@@ -177,6 +208,7 @@ def create_patient():
 
 # 更新患者信息
 @patient_bp.route('/api/patients/<string:p_id>', methods=['PUT'])
+@query_budget(1)
 def update_patient(p_id):
     data = request.json
     logger.info(f"[ACTION] Updating patient info: {p_id}")
@@ -190,7 +222,7 @@ def update_patient(p_id):
         sql_patient = """
             UPDATE patients 
             SET name = %s, phone = %s, address = %s, age = %s
-            WHERE id = %s
+            WHERE id = %s AND deleted_at IS NULL
         """
         cursor.execute(sql_patient, (
             data.get('name'),
@@ -217,8 +249,9 @@ def update_patient(p_id):
         if conn: conn.close()
 
 
-# 删除患者
+# 删除患者：先打删除标记 (立即对所有查询隐藏)，再由后台任务分块级联删除
 @patient_bp.route('/api/patients/<string:patient_id>', methods=['DELETE'])
+@query_budget(2)
 def delete_patient(patient_id):
     conn = None
     cursor = None
@@ -227,32 +260,43 @@ def delete_patient(patient_id):
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # 开启事务，确保所有操作要么都成功，要么都失败
-        conn.start_transaction()
-
-        # 删除该患者的挂号记录
-        cursor.execute("DELETE FROM appointments WHERE patient_id = %s", (patient_id,))
-        deleted_appts = cursor.rowcount
-
-        # 删除该患者的病历记录 (这将通过级联删除自动删除相关的处方明细)
-        cursor.execute("DELETE FROM medical_records WHERE patient_id = %s", (patient_id,))
-        deleted_records = cursor.rowcount
-
-        # 删除患者本身
-        cursor.execute("DELETE FROM patients WHERE id = %s", (patient_id,))
+        # 单行更新，事务极短，不会阻塞并发挂号
+        cursor.execute(
+            "UPDATE patients SET deleted_at = NOW() WHERE id = %s AND deleted_at IS NULL",
+            (patient_id,)
+        )
         if cursor.rowcount == 0:
+            cursor.execute("SELECT 1 FROM patients WHERE id = %s", (patient_id,))
+            exists = cursor.fetchone()
             conn.rollback()
-            logger.warning(f"[BLOCK] Patient {patient_id} not found for deletion.")
-            return jsonify({"success": False, "message": "患者不存在或已删除。"}), 404
+            if not exists:
+                logger.warning(f"[BLOCK] Patient {patient_id} not found for deletion.")
+                return jsonify({"success": False, "message": "患者不存在或已删除。"}), 404
+
+            # 已在删除中的患者重复请求时直接返回当前进度，不再启动新的清理线程
+            # (中断的清理由 purge-deleted 命令续删)
+            progress = redis_client.hgetall(f"patients:deletion:{patient_id}") or {"status": "pending"}
+            logger.info(f"[SKIP] Patient {patient_id} already being deleted: {progress.get('status')}")
+            return jsonify({
+                "success": True,
+                "message": "患者正在删除中。",
+                "progress": progress,
+                "progressUrl": f"/api/patients/{patient_id}/deletion"
+            }), 202
 
         conn.commit()
-
-        logger.info(
-            f"[SUCCESS] Patient {patient_id} deleted (Cascaded: {deleted_appts} Appts, {deleted_records} Records).")
+        set_purge_progress(patient_id, status="pending")
 
         clear_patient_cache()
+        clear_patient_timeline_cache(patient_id)
 
-        return jsonify({"success": True, "message": "患者及其所有相关数据删除成功。"}), 200
+        start_patient_purge(patient_id)
+
+        return jsonify({
+            "success": True,
+            "message": "患者已删除，相关数据正在后台清理。",
+            "progressUrl": f"/api/patients/{patient_id}/deletion"
+        }), 202
 
     except Exception as e:
         if conn: conn.rollback()
@@ -263,8 +307,342 @@ def delete_patient(patient_id):
         if conn: conn.close()
 
 
+# 查询患者删除进度
+@patient_bp.route('/api/patients/<string:patient_id>/deletion', methods=['GET'])
+@query_budget(1)
+def get_patient_deletion(patient_id):
+    conn = None
+    cursor = None
+    try:
+        progress = redis_client.hgetall(f"patients:deletion:{patient_id}")
+        if progress:
+            return jsonify(progress)
+
+        # 进度已过期或尚未写入时，以数据库状态为准
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT deleted_at IS NOT NULL FROM patients WHERE id = %s", (patient_id,))
+        row = cursor.fetchone()
+        if not row:
+            return jsonify({"status": "done"})
+        if not row[0]:
+            return jsonify({"success": False, "message": "该患者未在删除中"}), 404
+        return jsonify({"status": "pending"})
+
+    except Exception as e:
+        logger.error(f"[ERROR] Fetching deletion progress for {patient_id} failed: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+# --- 分块级联删除 ---
+def set_purge_progress(patient_id, **fields):
+    try:
+        key = f"patients:deletion:{patient_id}"
+        redis_client.hset(key, mapping={**fields, "updatedAt": datetime.now().isoformat(timespec='seconds')})
+        redis_client.expire(key, PURGE_PROGRESS_TTL)
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to update deletion progress: {e}")
+
+
+def _purge_records_chunk(cursor, patient_id):
+    """删除一批病历 (处方明细级联删除) 及其关联的多模态数据，返回 (病历数, 多模态条数, 待删文件)"""
+    cursor.execute(
+        "SELECT id FROM medical_records WHERE patient_id = %s ORDER BY id LIMIT %s FOR UPDATE",
+        (patient_id, PURGE_CHUNK_SIZE)
+    )
+    record_ids = [row[0] for row in cursor.fetchall()]
+    if not record_ids:
+        return 0, 0, []
+
+    placeholders = ", ".join(["%s"] * len(record_ids))
+    subtract_record_flows(cursor, record_ids)
+
+    # 外键为 ON DELETE SET NULL，必须先显式删除多模态数据，否则会留下无主记录和文件
+    cursor.execute(
+        f"SELECT id, file_path FROM multimodal_data WHERE record_id IN ({placeholders})", tuple(record_ids)
+    )
+    media = cursor.fetchall()
+    if media:
+        cursor.execute(
+            f"DELETE FROM multimodal_data WHERE id IN ({', '.join(['%s'] * len(media))})",
+            tuple(row[0] for row in media)
+        )
+
+    cursor.execute(f"DELETE FROM medical_records WHERE id IN ({placeholders})", tuple(record_ids))
+    return len(record_ids), len(media), [row[1] for row in media if row[1]]
+
+
+def _purge_appointments_chunk(cursor, patient_id):
+    """删除一批挂号，返回删除条数"""
+    cursor.execute(
+        "SELECT id FROM appointments WHERE patient_id = %s ORDER BY id LIMIT %s FOR UPDATE",
+        (patient_id, PURGE_CHUNK_SIZE)
+    )
+    appt_ids = [row[0] for row in cursor.fetchall()]
+    if not appt_ids:
+        return 0
+
+    subtract_appointment_flows(cursor, appt_ids)
+    cursor.execute(
+        f"DELETE FROM appointments WHERE id IN ({', '.join(['%s'] * len(appt_ids))})", tuple(appt_ids)
+    )
+    return len(appt_ids)
+
+
+def _purge_media_chunk(cursor, patient_id):
+    """删除直接挂在患者名下 (未关联病历) 的多模态数据，返回 (条数, 待删文件)"""
+    cursor.execute(
+        "SELECT id, file_path FROM multimodal_data WHERE patient_id = %s ORDER BY id LIMIT %s FOR UPDATE",
+        (patient_id, PURGE_CHUNK_SIZE)
+    )
+    media = cursor.fetchall()
+    if not media:
+        return 0, []
+    cursor.execute(
+        f"DELETE FROM multimodal_data WHERE id IN ({', '.join(['%s'] * len(media))})",
+        tuple(row[0] for row in media)
+    )
+    return len(media), [row[1] for row in media if row[1]]
+
+
+def purge_patient(patient_id):
+    """
+    分块删除已打删除标记的患者及其全部数据，每个事务最多处理 PURGE_CHUNK_SIZE 行，
+    锁持有时间有界。文件在对应事务提交后再删除；中途失败可重新执行 (幂等)。
+    """
+    conn = None
+    totals = {"records": 0, "appointments": 0, "multimodal": 0, "files": 0}
+    try:
+        conn = get_db_connection()
+        set_purge_progress(patient_id, status="running", **totals)
+
+        phases = (
+            ("records", _purge_records_chunk),
+            ("appointments", _purge_appointments_chunk),
+            ("multimodal", _purge_media_chunk),
+        )
+        while True:
+            # 循环直到各阶段都无剩余数据 (并发写入的新数据会在下一轮被清理)
+            progressed = False
+            for phase, purge_chunk in phases:
+                while True:
+                    result = run_in_transaction(
+                        conn, lambda cur, fn=purge_chunk: fn(cur, patient_id),
+                        name=f'purge_patient_{phase}', idempotent=True
+                    )
+                    if phase == "records":
+                        deleted, media, files = result
+                        totals["multimodal"] += media
+                    elif phase == "appointments":
+                        deleted, files = result, []
+                    else:
+                        deleted, files = result
+
+                    if not deleted:
+                        break
+                    progressed = True
+                    totals[phase] += deleted
+                    totals["files"] += sum(1 for path in files if remove_data_file(path))
+                    set_purge_progress(patient_id, status="running", **totals)
+
+            if not progressed:
+                break
+
+        def _delete_patient_row(cursor):
+            cursor.execute("DELETE FROM patients WHERE id = %s AND deleted_at IS NOT NULL", (patient_id,))
+            return cursor.rowcount
+
+        run_in_transaction(conn, _delete_patient_row, name='purge_patient', idempotent=True)
+
+        set_purge_progress(patient_id, status="done", **totals)
+        clear_patient_timeline_cache(patient_id)
+        logger.info(
+            f"[SUCCESS] Patient {patient_id} purged (Records: {totals['records']}, "
+            f"Appts: {totals['appointments']}, Multimodal: {totals['multimodal']}, Files: {totals['files']}).")
+        return totals
+
+    except Exception as e:
+        set_purge_progress(patient_id, status="failed", error=str(e), **totals)
+        logger.error(f"[ERROR] Purging patient {patient_id} failed: {str(e)}")
+        raise
+    finally:
+        if conn: conn.close()
+
+
+def start_patient_purge(patient_id):
+    """在后台线程中执行分块删除；进程退出导致中断时可用 purge-deleted 命令续删"""
+    def _run():
+        try:
+            purge_patient(patient_id)
+        except Exception:
+            pass  # 已记录日志与进度
+
+    threading.Thread(target=_run, name=f"purge-{patient_id}", daemon=True).start()
+
+
+# 续删所有已打删除标记的患者 (flask --app run patient purge-deleted)
+@patient_bp.cli.command('purge-deleted')
+def purge_deleted_patients():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id FROM patients WHERE deleted_at IS NOT NULL ORDER BY deleted_at")
+        patient_ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    click.echo(f"Found {len(patient_ids)} patients pending deletion.")
+    for patient_id in patient_ids:
+        totals = purge_patient(patient_id)
+        click.echo(f"  - {patient_id}: {totals}")
+
+
+# 患者就诊时间线：病历 + 处方明细(含药品信息) + 关联的多模态数据
+# 按 (visit_date, id) 倒序游标分页，每页固定 3 条集合查询，避免前端逐条请求处方
+@patient_bp.route('/api/patients/<string:patient_id>/timeline', methods=['GET'])
+@query_budget(4)
+def get_patient_timeline(patient_id):
+    conn = None
+    cursor = None
+    try:
+        limit = min(max(request.args.get('limit', TIMELINE_DEFAULT_LIMIT, type=int), 1), TIMELINE_MAX_LIMIT)
+        before_date = request.args.get('before_date', '')
+        before_id = request.args.get('before_id', '')
+        # 游标是 (visit_date, id) 二元组，只给一半会跳过同一就诊日的剩余病历
+        if bool(before_date) != bool(before_id):
+            return jsonify({"success": False, "message": "before_date 与 before_id 必须同时提供"}), 400
+
+        # --- 1. 查缓存 (按患者分组，病历/多模态数据变更时整组清除) ---
+        cache_key = f"patients:timeline:{patient_id}:{limit}:{before_date}:{before_id}"
+        cached_data = redis_client.get(cache_key)
+        if cached_data:
+            logger.info(f"[CACHE HIT] Patient timeline: {cache_key}")
+            return jsonify(loads(cached_data))
+
+        # --- 2. 查库 ---
+        logger.info(f"[DB QUERY] Fetching timeline for patient {patient_id} (Before: {before_date or '-'} {before_id or '-'})")
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # 2.1 当前页病历 (多取一条用于判断是否还有下一页)
+        sql = """
+            SELECT r.id, p.name AS patient_name, r.doctor_id, d.name AS doctor_name, r.diagnosis,
+                   r.treatment_plan, r.visit_date, r.appointment_id
+            FROM medical_records r
+            JOIN patients p ON r.patient_id = p.id AND p.deleted_at IS NULL
+            LEFT JOIN doctors d ON r.doctor_id = d.id
+            WHERE r.patient_id = %s
+        """
+        params = [patient_id]
+        if before_date:
+            sql += " AND (r.visit_date < %s OR (r.visit_date = %s AND r.id < %s))"
+            params += [before_date, before_date, before_id]
+        sql += " ORDER BY r.visit_date DESC, r.id DESC LIMIT %s"
+        params.append(limit + 1)
+
+        cursor.execute(sql, tuple(params))
+        rows = cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        if not rows and not before_date:
+            cursor.execute("SELECT 1 FROM patients WHERE id = %s AND deleted_at IS NULL", (patient_id,))
+            if not cursor.fetchone():
+                return jsonify({"success": False, "message": "患者不存在"}), 404
+
+        records = []
+        by_id = {}
+        for row in rows:
+            record = {
+                "id": row['id'],
+                "patientId": patient_id,
+                "patientName": row['patient_name'],
+                "doctorId": row['doctor_id'],
+                "doctorName": row['doctor_name'],
+                "diagnosis": row['diagnosis'],
+                "treatmentPlan": row['treatment_plan'],
+                "visitDate": row['visit_date'],
+                "appointmentId": row['appointment_id'],
+                "details": [],
+                "multimodal": []
+            }
+            records.append(record)
+            by_id[row['id']] = record
+
+        if by_id:
+            placeholders = ", ".join(["%s"] * len(by_id))
+            record_ids = tuple(by_id)
+
+            # 2.2 本页全部处方明细，一次关联药品表
+            cursor.execute(f"""
+                SELECT pd.id, pd.record_id, pd.medicine_id, pd.dosage, pd.usage_info, pd.days,
+                       m.name AS medicine_name, m.price AS medicine_price, m.specification AS medicine_spec
+                FROM prescription_details pd
+                LEFT JOIN medicines m ON pd.medicine_id = m.id
+                WHERE pd.record_id IN ({placeholders})
+                ORDER BY pd.record_id, pd.id
+            """, record_ids)
+            for row in cursor.fetchall():
+                by_id[row['record_id']]["details"].append({
+                    "id": row['id'],
+                    "recordId": row['record_id'],
+                    "medicineId": row['medicine_id'],
+                    "dosage": row['dosage'],
+                    "usage": row['usage_info'],
+                    "days": row['days'],
+                    "medicineName": row['medicine_name'],
+                    "medicinePrice": row['medicine_price'],
+                    "medicineSpec": row['medicine_spec']
+                })
+
+            # 2.3 本页病历关联的多模态数据 (不返回大文本，正文通过文件接口按需获取)
+            cursor.execute(f"""
+                SELECT id, record_id, modality, file_format, description, created_at
+                FROM multimodal_data
+                WHERE record_id IN ({placeholders})
+                ORDER BY record_id, created_at
+            """, record_ids)
+            for row in cursor.fetchall():
+                by_id[row['record_id']]["multimodal"].append({
+                    "id": row['id'],
+                    "recordId": row['record_id'],
+                    "modality": row['modality'],
+                    "fileFormat": row['file_format'],
+                    "description": row['description'],
+                    "createdAt": iso_datetime(row['created_at']),
+                    "fileUrl": f"/api/multimodal/file/{row['id']}"
+                })
+
+        next_cursor = None
+        if has_more:
+            last = records[-1]
+            next_cursor = {"beforeDate": last["visitDate"], "beforeId": last["id"]}
+
+        data = {"patientId": patient_id, "records": records, "hasMore": has_more, "nextCursor": next_cursor}
+
+        logger.info(f"[DB RESULT] Timeline for patient {patient_id}: {len(records)} records.")
+
+        # --- 3. 写缓存 (60秒) ---
+        redis_client.set(cache_key, dumps(data), ex=60)
+
+        return jsonify(data)
+
+    except Exception as e:
+        logger.error(f"[ERROR] Fetching timeline for patient {patient_id} failed: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
 # 查询患者总数
 @patient_bp.route('/api/patients/count', methods=['GET'])
+@query_budget(1)
 def get_patient_count():
     try:
         # --- 1. 查缓存 ---
@@ -280,7 +658,7 @@ def get_patient_count():
         cursor = conn.cursor(dictionary=True)
 
         # SQL 查询患者总数
-        cursor.execute("SELECT COUNT(*) AS total FROM patients")
+        cursor.execute("SELECT COUNT(*) AS total FROM patients WHERE deleted_at IS NULL")
         result = cursor.fetchone()
 
         # 获取患者总数
@@ -300,6 +678,7 @@ def get_patient_count():
 
 # 患者性别比例统计
 @patient_bp.route('/api/patients/gender_ratio', methods=['GET'])
+@query_budget(1)
 def get_gender_ratio():
     try:
         # --- 1. 查缓存 ---
@@ -307,7 +686,7 @@ def get_gender_ratio():
         cached_data = redis_client.get(cache_key)
         if cached_data:
             logger.info("[CACHE HIT] Gender ratio statistics")
-            return jsonify(json.loads(cached_data))
+            return jsonify(loads(cached_data))
 
         # --- 2. 查库 ---
         logger.info("[DB QUERY] Calculating gender ratio")
@@ -318,6 +697,7 @@ def get_gender_ratio():
         cursor.execute("""
             SELECT gender, COUNT(*) AS count
             FROM patients
+            WHERE deleted_at IS NULL
             GROUP BY gender
         """)
         rows = cursor.fetchall()
@@ -334,7 +714,7 @@ def get_gender_ratio():
                     gender_ratio["other"] = row['count']
 
         # --- 3. 写缓存 ---
-        redis_client.set(cache_key, json.dumps(gender_ratio), ex=3600)
+        redis_client.set(cache_key, dumps(gender_ratio), ex=3600)
 
         return jsonify(gender_ratio)
 
@@ -348,6 +728,7 @@ def get_gender_ratio():
 
 # 患者年龄比例统计
 @patient_bp.route('/api/patients/age_ratio', methods=['GET'])
+@query_budget(1)
 def get_age_ratio():
     try:
         # --- 1. 查缓存 ---
@@ -355,7 +736,7 @@ def get_age_ratio():
         cached_data = redis_client.get(cache_key)
         if cached_data:
             logger.info("[CACHE HIT] Age ratio statistics")
-            return jsonify(json.loads(cached_data))
+            return jsonify(loads(cached_data))
 
         # --- 2. 查库 ---
         logger.info("[DB QUERY] Calculating age ratio")
@@ -374,6 +755,7 @@ def get_age_ratio():
                 END AS age_group,
                 COUNT(*) AS count
             FROM patients
+            WHERE deleted_at IS NULL
             GROUP BY age_group
         """)
         rows = cursor.fetchall()
@@ -384,7 +766,7 @@ def get_age_ratio():
                 age_ratio[row['age_group']] = row['count']
 
         # --- 3. 写缓存 ---
-        redis_client.set(cache_key, json.dumps(age_ratio), ex=3600)
+        redis_client.set(cache_key, dumps(age_ratio), ex=3600)
 
         return jsonify(age_ratio)
 
@@ -1,18 +1,133 @@
 # --- START OF FILE app/api/record.py ---
 from flask import Blueprint, request, jsonify
-from app.utils.db import get_db_connection
-from app.utils.redis_client import redis_client
+from app.utils.db import get_db_connection, run_in_transaction, register_statement, query_one
+from app.utils.redis_client import redis_client, get_cached_json, cache_json
+from app.utils.flow_stats import bump_flow, bump_flows, get_appointment_flow_key, add_record_flows
+from app.api.patient import clear_patient_timeline_cache
+from app.api.basic import clear_medicine_stock_cache
 import logging
-from app.utils.common import format_date
+from app.utils.common import json_body_response
+from app.utils.row_mapper import RowMapper
 from datetime import date
-import json
+from app.utils.serialization import dumps, loads
+from app.utils.query_budget import query_budget
+import click
 
 record_bp = Blueprint('record', __name__)
 logger = logging.getLogger(__name__)
 
+# 批量提交限制：单次请求条数上限，以及每个事务写入的病历条数
+BULK_MAX_ITEMS = 1000
+BULK_CHUNK_SIZE = 100
+
+# 已打删除标记的患者不可再写病历；共享锁使删除标记在本事务提交前无法落下
+RECORD_PATIENT_ACTIVE_STMT = register_statement(
+    "record_patient_active", "SELECT 1 FROM patients WHERE id = %s AND deleted_at IS NULL LOCK IN SHARE MODE"
+)
+
+# 列表接口的行映射 (列名 -> 前端字段)
+RECORD_MAPPER = RowMapper(
+    id="id",
+    patientId="patient_id",
+    patientName="patient_name",
+    doctorId="doctor_id",
+    doctorName="doctor_name",
+    diagnosis="diagnosis",
+    treatmentPlan="treatment_plan",
+    visitDate="visit_date",
+    appointmentId="appointment_id",
+)
+PRESCRIPTION_MAPPER = RowMapper(
+    id="id",
+    recordId="record_id",
+    medicineId="medicine_id",
+    dosage="dosage",
+    usage="usage_info",
+    days="days",
+)
+
+
+# --- 辅助函数：为病历匹配对应的挂号 ---
+def find_appointment_for_record(cursor, patient_id, doctor_id, visit_date):
+    """
+    按 患者 + 医生 + 就诊日期 查找对应的挂号 ID，找不到返回 None。
+    仅用于未显式传入 appointmentId 的旧客户端，查询走 appointments.patient_id 索引。
+    """
+    if not (patient_id and doctor_id and visit_date):
+        return None
+
+    cursor.execute("""
+        SELECT id FROM appointments
+        WHERE patient_id = %s AND doctor_id = %s AND LEFT(create_time, 10) = %s
+        ORDER BY (status = 'pending') DESC, create_time DESC
+        LIMIT 1
+    """, (patient_id, doctor_id, str(visit_date)))
+    res = cursor.fetchone()
+    return res[0] if res else None
+
+
+# --- 辅助函数：锁定药品库存行 ---
+def lock_medicines(cursor, med_ids):
+    """
+    按主键顺序对药品行加排他锁，返回 {药品ID: 当前库存}，不存在的药品不在结果中。
+    单条提交与批量提交都经由这里加锁：加锁顺序由 MySQL 的主键排序 (排序规则) 决定，
+    两条写路径顺序一致，并发时不会互相反序等待而死锁。
+    """
+    if not med_ids:
+        return {}
+    # 【高级查询】：按主键顺序加排他锁，保证与其他扣库存事务的加锁顺序一致
+    cursor.execute(
+        f"SELECT id, stock FROM medicines WHERE id IN ({_in_clause(med_ids)}) ORDER BY id FOR UPDATE",
+        tuple(med_ids)
+    )
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+# --- 辅助函数：批量扣减库存 ---
+def apply_deductions(cursor, deductions):
+    """
+    一条 UPDATE 扣减多种药品的库存 ({药品ID: 扣减量}，CASE 按药品取扣减量)，语句数与药品种数无关。
+    调用方须已经 lock_medicines 锁定这些行并校验库存；条件 stock >= 扣减量 与影响行数核对只是兜底
+    """
+    if not deductions:
+        return
+    med_ids = sorted(deductions)
+    amounts = tuple(v for med_id in med_ids for v in (med_id, deductions[med_id]))
+    case = "CASE id " + " ".join(["WHEN %s THEN %s"] * len(med_ids)) + " END"
+    cursor.execute(
+        f"UPDATE medicines SET stock = stock - {case} WHERE id IN ({_in_clause(med_ids)}) AND stock >= {case}",
+        amounts + tuple(med_ids) + amounts
+    )
+    changed = sum(1 for med_id in med_ids if deductions[med_id])
+    if cursor.rowcount < changed:
+        raise Exception("库存扣减失败：部分药品库存已变化")
+
+
+# --- 辅助函数：原子扣减库存 ---
+def deduct_stock(cursor, details_list):
+    """
+    按药品汇总处方天数，先经 lock_medicines 锁定库存行并校验，再由 apply_deductions 一条语句扣减。
+    库存不足或药品不存在时抛出异常，由调用方回滚。cursor 为调用方事务所在的游标。
+    """
+    need = {}
+    for detail in details_list:
+        med_id = detail.get('medicineId')
+        need[med_id] = need.get(med_id, 0) + int(detail.get('days') or 0)
+
+    stock = lock_medicines(cursor, list(need))
+    for med_id in sorted(need, key=str):
+        if med_id not in stock:
+            raise Exception(f"药品ID {med_id} 不存在")
+        if stock[med_id] < need[med_id]:
+            logger.warning(f"[BLOCK] Stock insufficient: Med {med_id} (Has: {stock[med_id]}, Need: {need[med_id]})")
+            raise Exception(f"药品ID {med_id} 库存不足，无法满足 {need[med_id]} 天的需求")
+
+    apply_deductions(cursor, need)
+
 
 # 获取所有（或某个患者）病历
 @record_bp.route('/api/records', methods=['GET'])
+@query_budget(1)
 def get_records():
     conn = None
     cursor = None
@@ -20,26 +135,27 @@ def get_records():
         patient_id = request.args.get('patient_id', '')
 
         # --- 1. 查缓存 (10秒短效缓存) ---
+        # 命中时直接返回序列化好的缓存体 (及其压缩变体)，按 ETag 比对可返回 304
         cache_key = f"records:list:{patient_id}"
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
+        cached = get_cached_json(cache_key)
+        if cached:
             logger.info(f"[CACHE HIT] Medical records: {cache_key}")
-            return jsonify(json.loads(cached_data))
+            return json_body_response(*cached)
 
         # --- 2. 查库 ---
         logger.info(f"[DB QUERY] Fetching medical records (Patient: {patient_id or 'ALL'})")
 
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
 
         # 基本查询 SQL，关联患者和医生
         sql = """
             SELECT 
                 r.id, r.patient_id, p.name AS patient_name, 
                 r.doctor_id, d.name AS doctor_name, 
-                r.diagnosis, r.treatment_plan, r.visit_date 
+                r.diagnosis, r.treatment_plan, r.visit_date, r.appointment_id 
             FROM medical_records r
-            LEFT JOIN patients p ON r.patient_id = p.id
+            JOIN patients p ON r.patient_id = p.id AND p.deleted_at IS NULL
             LEFT JOIN doctors d ON r.doctor_id = d.id
         """
 
@@ -50,28 +166,13 @@ def get_records():
         else:
             cursor.execute(sql)
 
-        rows = cursor.fetchall()
-
         # 映射为前端驼峰命名
-        data = []
-        for row in rows:
-            data.append({
-                "id": row['id'],
-                "patientId": row['patient_id'],
-                "patientName": row['patient_name'],
-                "doctorId": row['doctor_id'],
-                "doctorName": row['doctor_name'],
-                "diagnosis": row['diagnosis'],
-                "treatmentPlan": row['treatment_plan'],
-                "visitDate": format_date(row['visit_date'])
-            })
+        data = RECORD_MAPPER.fetch_all(cursor)
 
         logger.info(f"[DB RESULT] Fetched {len(data)} records.")
 
         # --- 3. 写缓存 (10秒) ---
-        redis_client.set(cache_key, json.dumps(data), ex=10)
-
-        return jsonify(data)
+        return json_body_response(*cache_json(cache_key, data, ex=10))
     except Exception as e:
         # 记录异常日志
         logger.error(f"[ERROR] Fetching records failed: {str(e)}")
@@ -83,6 +184,7 @@ def get_records():
 
 # 获取所有（或某个病历）处方细则
 @record_bp.route('/api/prescription_details', methods=['GET'])
+@query_budget(1)
 def get_prescription_details():
     conn = None
     cursor = None
@@ -94,13 +196,13 @@ def get_prescription_details():
         cached_data = redis_client.get(cache_key)
         if cached_data:
             logger.info(f"[CACHE HIT] Prescription details: {cache_key}")
-            return jsonify(json.loads(cached_data))
+            return jsonify(loads(cached_data))
 
         # --- 2. 查库 ---
         logger.info(f"[DB QUERY] Fetching prescription details (Record: {record_id or 'ALL'})")
 
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
 
         sql = """
             SELECT id, record_id, medicine_id, dosage, usage_info, days 
@@ -114,21 +216,10 @@ def get_prescription_details():
         else:
             cursor.execute(sql)
 
-        rows = cursor.fetchall()
-
-        data = []
-        for row in rows:
-            data.append({
-                "id": row['id'],
-                "recordId": row['record_id'],
-                "medicineId": row['medicine_id'],
-                "dosage": row['dosage'],
-                "usage": row['usage_info'],
-                "days": row['days']
-            })
+        data = PRESCRIPTION_MAPPER.fetch_all(cursor)
 
         # --- 3. 写缓存 (10秒) ---
-        redis_client.set(cache_key, json.dumps(data), ex=10)
+        redis_client.set(cache_key, dumps(data), ex=10)
 
         return jsonify(data)
 
@@ -143,25 +234,41 @@ def get_prescription_details():
 
 # 提交病历
 @record_bp.route('/api/records', methods=['POST'])
+@query_budget(8)  # 锁定药品行与扣减库存各一条语句，与药品种数无关
 def create_record():
     data = request.json
     record_data = data.get('record')
     details_list = data.get('details', [])
 
     logger.info(f"[ACTION] Creating record {record_data.get('id')} for Patient {record_data.get('patientId')}")
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        # 开启事务 
-        conn.start_transaction()
-        cursor = conn.cursor()
+
+    # 事务体只包含数据库操作，遇到死锁/锁等待超时时可整体安全重放
+    # 患者不存在或正在删除时返回拒绝响应，不写入任何数据
+    def _create(cursor):
+        patient_id = record_data.get('patientId')
+        if not query_one(conn, RECORD_PATIENT_ACTIVE_STMT, (patient_id,)):
+            logger.warning(f"[BLOCK] Record blocked: Patient {patient_id} not found or being deleted")
+            return jsonify({"success": False, "message": "患者不存在或已删除"}), 404
+
+        # 关联挂号：优先使用前端传入的 appointmentId，否则按 患者+医生+就诊日期 回查一次
+        appointment_id = record_data.get('appointmentId')
+        if not appointment_id:
+            appointment_id = find_appointment_for_record(
+                cursor,
+                record_data.get('patientId'),
+                record_data.get('doctorId'),
+                record_data.get('visitDate')
+            )
+
+        # 先扣减库存：按主键顺序锁定药品行 (与批量提交一致)，并且必须早于处方明细插入，
+        # 否则明细外键校验持有的共享锁会与随后的排他锁升级互相等待
+        deduct_stock(cursor, details_list)
 
         # 插入主表
         sql_record = """
             INSERT INTO medical_records 
-            (id, patient_id, doctor_id, diagnosis, treatment_plan, visit_date)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            (id, patient_id, doctor_id, diagnosis, treatment_plan, visit_date, appointment_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
         """
         cursor.execute(sql_record, (
             record_data.get('id'),
@@ -169,68 +276,341 @@ def create_record():
             record_data.get('doctorId'),
             record_data.get('diagnosis'),
             record_data.get('treatmentPlan'),
-            record_data.get('visitDate')
+            record_data.get('visitDate'),
+            appointment_id
         ))
 
-        # 循环插入子表
+        # 批量插入子表
         sql_detail = """
             INSERT INTO prescription_details 
             (id, record_id, medicine_id, dosage, usage_info, days)
             VALUES (%s, %s, %s, %s, %s, %s)
         """
+        if details_list:
+            cursor.executemany(sql_detail, [
+                (
+                    detail.get('id'),
+                    record_data.get('id'),
+                    detail.get('medicineId'),
+                    detail.get('dosage'),
+                    detail.get('usage'),
+                    detail.get('days')
+                )
+                for detail in details_list
+            ])
+
+        # 同一事务内维护桑基图 "确诊" / "开药" 阶段计数 (按所属挂号的日期和科室归类)
+        flow_date, flow_dept = get_appointment_flow_key(cursor, appointment_id)
+        bump_flow(cursor, flow_date, flow_dept, ('diagnosed', 'medicated') if details_list else ('diagnosed',))
+        return None
 
-        for detail in details_list:
-            # 【高级查询】：嵌套查询校验库存
-            # 如果请求的药在数据库中不存在或库存为0，则报错
-            cursor.execute("SELECT stock FROM medicines WHERE id = %s", (detail['medicineId'],))
-            res = cursor.fetchone()
-
-            if not res:
-                raise Exception(f"药品ID {detail['medicineId']} 不存在")
-
-            # 计算扣除的库存数量
-            stock = res[0]
-            days = detail.get('days')
-
-            if stock < days:
-                logger.warning(f"[BLOCK] Stock insufficient: Med {detail['medicineId']} (Has: {stock}, Need: {days})")
-                raise Exception(f"药品ID {detail['medicineId']} 库存不足，无法满足 {days} 天的需求")
-
-            # 更新库存：扣除天数数量
-            new_stock = stock - days
-            cursor.execute("UPDATE medicines SET stock = %s WHERE id = %s", (new_stock, detail['medicineId']))
-
-            cursor.execute(sql_detail, (
-                detail.get('id'),
-                record_data.get('id'),
-                detail.get('medicineId'),
-                detail.get('dosage'),
-                detail.get('usage'),
-                detail.get('days')
-            ))
-
-        # 提交事务
-        conn.commit()
+    conn = None
+    try:
+        conn = get_db_connection()
+        # 开启事务并提交 (死锁/锁等待超时自动重试)
+        blocked = run_in_transaction(conn, _create, name='create_record', idempotent=True)
+        if blocked:
+            return blocked
 
-        # 核心业务，清除药品列表缓存（因为库存变了）
-        redis_client.delete('basic:meds:list')
+        # 核心业务，清除药品列表及所涉药品的详情缓存（因为库存变了）
+        clear_medicine_stock_cache(*(detail.get('medicineId') for detail in details_list))
+        clear_patient_timeline_cache(record_data.get('patientId'))
 
         logger.info(f"[SUCCESS] Record {record_data.get('id')} created.")
         return jsonify({"success": True, "message": "病历提交成功"})
 
     except Exception as e:
-        # 发生任何错误，立即回滚
-        if conn: conn.rollback()
+        # 事务已由 run_in_transaction 回滚
         logger.error(f"[ERROR] Creating record failed: {str(e)}")
         return jsonify({"success": False, "message": "提交失败: " + str(e)}), 500
 
+    finally:
+        if conn: conn.close()
+
+
+# 批量提交病历 (设备同步一天的就诊数据)
+@record_bp.route('/api/records/bulk', methods=['POST'])
+@query_budget(60, max_repeats=10)  # 引用校验 7 条 + 每块 5 条 × 10 块 (整块失败逐条重试时会超出并告警)
+def bulk_create_records():
+    data = request.json or {}
+    items = data.get('items')
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "items 不能为空"}), 400
+    if len(items) > BULK_MAX_ITEMS:
+        return jsonify({"success": False, "message": f"单次最多提交 {BULK_MAX_ITEMS} 条病历"}), 400
+
+    logger.info(f"[ACTION] Bulk creating {len(items)} records")
+
+    # 非对象条目 / record 非对象的条目只记录下标，由结构校验报告为该条失败
+    results = [
+        {"index": i, "id": _bulk_item_id(item), "success": False, "message": None}
+        for i, item in enumerate(items)
+    ]
+
+    # --- 1. 结构校验 (含批内 ID 重复) ---
+    valid = []
+    seen_records, seen_details = set(), set()
+    for i, item in enumerate(items):
+        error = _validate_bulk_item(item, seen_records, seen_details)
+        if error:
+            results[i]["message"] = error
+        else:
+            valid.append(i)
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # --- 2. 集合查询校验引用 (每类实体一条 IN 查询) ---
+        refs = _load_bulk_refs(cursor, [items[i] for i in valid])
+        conn.commit()  # 结束只读快照，后续写事务读取最新数据
+
+        entries = []
+        for i in valid:
+            error, appt = _resolve_bulk_item(items[i], refs)
+            if error:
+                results[i]["message"] = error
+            else:
+                entries.append((i, items[i], appt))
+
+        # --- 3. 分块事务写入 ---
+        for start in range(0, len(entries), BULK_CHUNK_SIZE):
+            chunk = entries[start:start + BULK_CHUNK_SIZE]
+            try:
+                outcome = run_in_transaction(
+                    conn, lambda cur, chunk=chunk: _write_bulk_chunk(cur, chunk),
+                    name='bulk_create_records', idempotent=True
+                )
+            except Exception as e:
+                # 整块失败时逐条重试，定位出具体失败的条目
+                logger.warning(f"[BULK] Chunk at {start} failed ({str(e)}), falling back to per-item writes")
+                outcome = {}
+                for entry in chunk:
+                    try:
+                        outcome.update(run_in_transaction(
+                            conn, lambda cur, entry=entry: _write_bulk_chunk(cur, [entry]),
+                            name='bulk_create_records', idempotent=True
+                        ))
+                    except Exception as item_err:
+                        outcome[entry[0]] = (False, str(item_err))
+
+            for idx, (ok, message) in outcome.items():
+                results[idx]["success"] = ok
+                results[idx]["message"] = message
+
+    except Exception as e:
+        logger.error(f"[ERROR] Bulk creating records failed: {str(e)}")
+        return jsonify({"success": False, "message": "批量提交失败: " + str(e), "results": results}), 500
+
     finally:
         if cursor: cursor.close()
         if conn: conn.close()
 
+    succeeded = sum(1 for r in results if r["success"])
+
+    # 整批只清除一次药品缓存 (列表及所涉药品详情) 及涉及患者的时间线缓存
+    if succeeded:
+        clear_medicine_stock_cache(*(
+            detail['medicineId'] for r in results if r["success"] for detail in items[r["index"]].get('details') or []
+        ))
+        clear_patient_timeline_cache(*(
+            items[r["index"]]['record'].get('patientId') for r in results if r["success"]
+        ))
+
+    logger.info(f"[SUCCESS] Bulk records done. Succeeded: {succeeded}, Failed: {len(items) - succeeded}")
+    return jsonify({
+        "success": succeeded == len(items),
+        "total": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "results": results
+    })
+
+
+# --- 批量提交辅助函数 ---
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _bulk_item_id(item):
+    if isinstance(item, dict) and isinstance(item.get('record'), dict):
+        return item['record'].get('id')
+    return None
+
+
+def _validate_bulk_item(item, seen_records, seen_details):
+    """校验单条病历的结构，返回错误信息或 None"""
+    if not isinstance(item, dict) or not isinstance(item.get('record'), dict):
+        return "缺少 record 字段"
+
+    record = item['record']
+    for field in ('id', 'patientId', 'doctorId', 'diagnosis', 'treatmentPlan', 'visitDate'):
+        if not record.get(field):
+            return f"病历字段 {field} 缺失"
+    if record['id'] in seen_records:
+        return f"病历ID {record['id']} 在本批次中重复"
+
+    details = item.get('details') or []
+    if not isinstance(details, list):
+        return "details 必须为数组"
+    for detail in details:
+        if not isinstance(detail, dict) or not detail.get('id') or not detail.get('medicineId'):
+            return "处方明细缺少 id 或 medicineId"
+        if detail['id'] in seen_details:
+            return f"处方明细ID {detail['id']} 在本批次中重复"
+        try:
+            int(detail.get('days') or 0)
+        except (TypeError, ValueError):
+            return f"处方明细 {detail['id']} 的 days 不是整数"
+
+    seen_records.add(record['id'])
+    seen_details.update(detail['id'] for detail in details)
+    return None
+
+
+def _load_bulk_refs(cursor, items):
+    """用少量集合查询一次性加载整批引用的药品/患者/医生/挂号及已存在的 ID"""
+    records = [item['record'] for item in items]
+    details = [detail for item in items for detail in (item.get('details') or [])]
+
+    def existing(table, ids, extra=""):
+        ids = list(set(ids))
+        if not ids:
+            return set()
+        cursor.execute(f"SELECT id FROM {table} WHERE id IN ({_in_clause(ids)}){extra}", tuple(ids))
+        return {row[0] for row in cursor.fetchall()}
+
+    refs = {
+        "medicines": existing('medicines', [d['medicineId'] for d in details]),
+        "patients": existing('patients', [r['patientId'] for r in records], " AND deleted_at IS NULL"),
+        "doctors": existing('doctors', [r['doctorId'] for r in records]),
+        "records": existing('medical_records', [r['id'] for r in records]),
+        "details": existing('prescription_details', [d['id'] for d in details]),
+        "appointments": {},
+        "fallback": {},
+    }
+
+    # 显式传入的挂号：取 (日期, 科室) 用于桑基图计数
+    appt_ids = list({r['appointmentId'] for r in records if r.get('appointmentId')})
+    if appt_ids:
+        cursor.execute(
+            f"SELECT id, LEFT(create_time, 10), department_id FROM appointments WHERE id IN ({_in_clause(appt_ids)})",
+            tuple(appt_ids)
+        )
+        refs["appointments"] = {row[0]: (row[0], row[1], row[2]) for row in cursor.fetchall()}
+
+    # 未传 appointmentId 的病历：按 患者 + 医生 + 就诊日期 统一回查 (与 find_appointment_for_record 口径一致)
+    fallback_patients = list({r['patientId'] for r in records if not r.get('appointmentId')})
+    if fallback_patients:
+        cursor.execute(f"""
+            SELECT id, patient_id, doctor_id, LEFT(create_time, 10), department_id
+            FROM appointments
+            WHERE patient_id IN ({_in_clause(fallback_patients)})
+            ORDER BY (status = 'pending') DESC, create_time DESC
+        """, tuple(fallback_patients))
+        for appt_id, patient_id, doctor_id, day, dept_id in cursor.fetchall():
+            refs["fallback"].setdefault((patient_id, doctor_id, day), (appt_id, day, dept_id))
+
+    return refs
+
+
+def _resolve_bulk_item(item, refs):
+    """根据已加载的引用校验单条病历，返回 (错误信息, (挂号ID, 日期, 科室))"""
+    record = item['record']
+    if record['id'] in refs["records"]:
+        return f"病历ID {record['id']} 已存在", None
+    if record['patientId'] not in refs["patients"]:
+        return f"患者ID {record['patientId']} 不存在", None
+    if record['doctorId'] not in refs["doctors"]:
+        return f"医生ID {record['doctorId']} 不存在", None
+
+    for detail in item.get('details') or []:
+        if detail['medicineId'] not in refs["medicines"]:
+            return f"药品ID {detail['medicineId']} 不存在", None
+        if detail['id'] in refs["details"]:
+            return f"处方明细ID {detail['id']} 已存在", None
+
+    if record.get('appointmentId'):
+        appt = refs["appointments"].get(record['appointmentId'])
+        if not appt:
+            return f"挂号ID {record['appointmentId']} 不存在", None
+    else:
+        key = (record['patientId'], record['doctorId'], str(record['visitDate'])[:10])
+        appt = refs["fallback"].get(key, (None, None, None))
+
+    return None, appt
+
+
+def _write_bulk_chunk(cursor, chunk):
+    """
+    在一个事务内写入一块病历：按药品 ID 顺序锁定库存行，在内存中逐条分配库存，
+    再按药品汇总扣减，并用 executemany 批量写入病历与明细。
+    返回 {条目下标: (是否成功, 信息)}，库存不足的条目不写入。
+    """
+    med_ids = sorted({d['medicineId'] for _, item, _ in chunk for d in (item.get('details') or [])})
+    remaining = lock_medicines(cursor, med_ids)
+
+    outcome = {}
+    deductions = {}
+    record_rows = []
+    detail_rows = []
+    flow_deltas = {}
+
+    for idx, item, appt in chunk:
+        record = item['record']
+        details = item.get('details') or []
+
+        need = {}
+        for detail in details:
+            need[detail['medicineId']] = need.get(detail['medicineId'], 0) + int(detail.get('days') or 0)
+
+        short = next((m for m in sorted(need) if remaining.get(m, 0) < need[m]), None)
+        if short:
+            outcome[idx] = (False, f"药品ID {short} 库存不足，无法满足 {need[short]} 天的需求")
+            continue
+
+        for med_id, days in need.items():
+            remaining[med_id] -= days
+            deductions[med_id] = deductions.get(med_id, 0) + days
+
+        appt_id, day, dept_id = appt
+        record_rows.append((
+            record['id'], record['patientId'], record['doctorId'], record['diagnosis'],
+            record['treatmentPlan'], record['visitDate'], appt_id
+        ))
+        detail_rows.extend(
+            (d['id'], record['id'], d['medicineId'], d.get('dosage'), d.get('usage'), d.get('days'))
+            for d in details
+        )
+        for stage in (('diagnosed', 'medicated') if details else ('diagnosed',)):
+            flow_deltas[(day, dept_id, stage)] = flow_deltas.get((day, dept_id, stage), 0) + 1
+
+        outcome[idx] = (True, "病历提交成功")
+
+    apply_deductions(cursor, deductions)
+    if record_rows:
+        cursor.executemany("""
+            INSERT INTO medical_records
+            (id, patient_id, doctor_id, diagnosis, treatment_plan, visit_date, appointment_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, record_rows)
+    if detail_rows:
+        cursor.executemany("""
+            INSERT INTO prescription_details
+            (id, record_id, medicine_id, dosage, usage_info, days)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, detail_rows)
+
+    bump_flows(cursor, flow_deltas)
+    return outcome
+
 
 # 删除病历：级联删除处方明细
 @record_bp.route('/api/records/<string:record_id>', methods=['DELETE'])
+@query_budget(4)
 def delete_medical_record(record_id):
     conn = None
     cursor = None
@@ -239,13 +619,30 @@ def delete_medical_record(record_id):
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        # 先取出关联挂号及是否开药，用于扣减桑基图计数
+        cursor.execute("""
+            SELECT r.appointment_id,
+                   EXISTS (SELECT 1 FROM prescription_details pd WHERE pd.record_id = r.id) AS has_rx,
+                   r.patient_id
+            FROM medical_records r
+            WHERE r.id = %s
+        """, (record_id,))
+        row = cursor.fetchone()
+        if not row:
+            conn.rollback()
+            return jsonify({"success": False, "message": "病历不存在或已删除。"}), 404
+
         # 执行删除病历操作。相关的处方明细将自动被删除。
         cursor.execute("DELETE FROM medical_records WHERE id = %s", (record_id,))
         if cursor.rowcount == 0:
             conn.rollback()
             return jsonify({"success": False, "message": "病历不存在或已删除。"}), 404
 
+        flow_date, flow_dept = get_appointment_flow_key(cursor, row[0])
+        bump_flow(cursor, flow_date, flow_dept, ('diagnosed', 'medicated') if row[1] else ('diagnosed',), delta=-1)
+
         conn.commit()
+        clear_patient_timeline_cache(row[2])
         logger.info(f"[SUCCESS] Record {record_id} deleted.")
         return jsonify({"success": True, "message": "病历及其相关处方明细删除成功。"}), 200
 
@@ -257,4 +654,72 @@ def delete_medical_record(record_id):
         if cursor: cursor.close()
         if conn: conn.close()
 
+
+# 回填历史病历的 appointment_id (flask --app run record backfill-appointment-links)
+@record_bp.cli.command('backfill-appointment-links')
+@click.option('--batch-size', default=1000, show_default=True, help='每批处理的病历数量')
+def backfill_appointment_links(batch_size):
+    """按 患者 + 医生 + 就诊日期 为历史病历回填 appointment_id，并在同一事务内补加桑基图流转计数"""
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        last_id = ''
+        total_linked = 0
+        total_scanned = 0
+
+        while True:
+            # 按主键分批扫描未关联的病历，每批一个短事务，避免长时间持有锁
+            cursor.execute("""
+                SELECT r.id, MIN(a.id)
+                FROM medical_records r
+                LEFT JOIN appointments a ON a.patient_id = r.patient_id
+                    AND a.doctor_id = r.doctor_id
+                    AND LEFT(a.create_time, 10) = r.visit_date
+                WHERE r.appointment_id IS NULL AND r.id > %s
+                GROUP BY r.id
+                ORDER BY r.id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            last_id = rows[-1][0]
+            total_scanned += len(rows)
+
+            links = [(appt_id, rec_id) for rec_id, appt_id in rows if appt_id]
+            if links:
+                # 扫描读的是快照：锁定后只处理仍未关联的病历，避免与并发写入重复计数
+                cursor.execute(
+                    f"SELECT id FROM medical_records WHERE id IN ({_in_clause(links)}) "
+                    f"AND appointment_id IS NULL FOR UPDATE",
+                    tuple(rec_id for _, rec_id in links)
+                )
+                pending = {row[0] for row in cursor.fetchall()}
+                links = [(appt_id, rec_id) for appt_id, rec_id in links if rec_id in pending]
+            if links:
+                cursor.executemany(
+                    "UPDATE medical_records SET appointment_id = %s WHERE id = %s AND appointment_id IS NULL",
+                    links
+                )
+                # 未关联的病历不计入任何流转，关联后补加其 "确诊" / "开药" 计数
+                add_record_flows(cursor, [rec_id for _, rec_id in links])
+            conn.commit()
+            total_linked += len(links)
+
+            logger.info(f"[BACKFILL] Scanned {total_scanned} records, linked {total_linked} (last id: {last_id})")
+
+        click.echo(f"Backfill finished. Scanned: {total_scanned}, Linked: {total_linked}")
+
+    except Exception as e:
+        if conn: conn.rollback()
+        logger.error(f"[ERROR] Backfill appointment links failed: {str(e)}")
+        raise click.ClickException(str(e))
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
 # --- END OF FILE app/api/record.py ---
@@ -2,103 +2,116 @@
 from flask import Blueprint, request, jsonify
 from app.utils.db import get_db_connection
 from app.utils.redis_client import redis_client  # 导入 Redis
-from datetime import date, datetime
+from app.utils.flow_stats import rebuild_flow_counts
+from app.utils.common import cache_control
+from datetime import datetime
 import re
 import logging
-import json
+from app.utils.serialization import dumps, loads
+from app.utils.query_budget import query_budget
+import click
 
 stats_bp = Blueprint('stats', __name__)
 logger = logging.getLogger(__name__)
 
 
 @stats_bp.route('/api/stats/sankey', methods=['GET'])
+@query_budget(1)
+@cache_control(max_age=30)
 def get_patient_flow_sankey():
+    # 可选过滤条件：挂号日期区间 (YYYY-MM-DD，闭区间) 与科室
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    department_id = request.args.get('department_id', '')
+
+    try:
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
+    except ValueError:
+        logger.warning(f"[BLOCK] Invalid sankey date range: {start_date} ~ {end_date}")
+        return jsonify({"success": False, "message": "日期格式错误，应为 YYYY-MM-DD"}), 400
+
     conn = None
     cursor = None
     try:
         # --- 1. 查缓存 (1分钟) ---
-        cache_key = "stats:sankey"
+        cache_key = f"stats:sankey:{start_date}:{end_date}:{department_id}"
         cached_data = redis_client.get(cache_key)
         if cached_data:
-            logger.info(f"[CACHE HIT] Sankey diagram data")
-            return jsonify(json.loads(cached_data))
+            logger.info(f"[CACHE HIT] Sankey diagram data: {cache_key}")
+            return jsonify(loads(cached_data))
 
         # --- 2. 查库 ---
-        logger.info("[DB QUERY] Calculating Sankey diagram flow...")
+        logger.info(f"[DB QUERY] Calculating Sankey diagram flow (Range: {start_date or '*'} ~ {end_date or '*'}, Dept: {department_id or 'ALL'})")
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
+        # 读取增量维护的流转计数表 (按 日期/科室/阶段)，只需汇总少量计数行
+        conditions = []
+        params = []
+        if start_dt:
+            conditions.append("f.stat_date >= %s")
+            params.append(start_dt.date())
+        if end_dt:
+            conditions.append("f.stat_date <= %s")
+            params.append(end_dt.date())
+        if department_id:
+            conditions.append("f.department_id = %s")
+            params.append(department_id)
+        where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+        sql_flow = """
+            SELECT d.name AS dept_name, f.stage, SUM(f.count) AS value
+            FROM sankey_flow_counts f
+            JOIN departments d ON f.department_id = d.id
+            {}
+            GROUP BY d.name, f.stage
+        """.format(where_clause)
+        cursor.execute(sql_flow, tuple(params))
+
+        # 整理为 {科室: {阶段: 数量}}，保持科室出现顺序
+        flow_map = {}
+        for row in cursor.fetchall():
+            flow_map.setdefault(row['dept_name'], {})[row['stage']] = int(row['value'] or 0)
+        flows = [
+            {
+                "dept_name": name,
+                "registered": stages.get('registered', 0),
+                "diagnosed": stages.get('diagnosed', 0),
+                "medicated": stages.get('medicated', 0)
+            }
+            for name, stages in flow_map.items()
+        ]
+
         nodes = [{"name": "挂号总数"}]
         links = []
 
         # Step 1: 挂号 -> 科室
-        logger.info("[DB STEP] 1/4 Calculating Department Flow")
-        sql_dept_flow = """
-            SELECT d.name AS dept_name, COUNT(a.id) AS value
-            FROM appointments a
-            JOIN departments d ON a.department_id = d.id
-            GROUP BY d.name
-            HAVING value > 0
-        """
-        cursor.execute(sql_dept_flow)
-        dept_flows = cursor.fetchall()
-
-        # 动态添加科室节点和连线
-        for flow in dept_flows:
+        for flow in flows:
+            if flow['registered'] <= 0:
+                continue
             dept_node_name = f"科室: {flow['dept_name']}"
-
-            # 添加节点
-            if dept_node_name not in [n['name'] for n in nodes]:
-                nodes.append({"name": dept_node_name})
-
-            # 添加连线: 挂号总数 -> 具体科室
+            nodes.append({"name": dept_node_name})
             links.append({
                 "source": "挂号总数",
                 "target": dept_node_name,
-                "value": flow['value']
+                "value": flow['registered']
             })
 
         # Step 2: 科室 -> 确诊
-        logger.info("[DB STEP] 2/4 Calculating Diagnosis Flow")
-        sql_diag_flow = """
-            SELECT d.name AS dept_name, COUNT(r.id) AS value
-            FROM appointments a
-            JOIN departments d ON a.department_id = d.id
-            JOIN medical_records r ON a.patient_id = r.patient_id 
-                AND a.doctor_id = r.doctor_id 
-                AND DATE(a.create_time) = r.visit_date
-            GROUP BY d.name
-            HAVING value > 0
-        """
-        cursor.execute(sql_diag_flow)
-        diag_flows = cursor.fetchall()
-
-        # 添加 "确诊" 节点
         nodes.append({"name": "确诊/检查"})
-
-        for flow in diag_flows:
-            dept_node_name = f"科室: {flow['dept_name']}"
-            # 添加连线: 具体科室 -> 确诊
+        for flow in flows:
+            if flow['registered'] <= 0 or flow['diagnosed'] <= 0:
+                continue
             links.append({
-                "source": dept_node_name,
+                "source": f"科室: {flow['dept_name']}",
                 "target": "确诊/检查",
-                "value": flow['value']
+                "value": flow['diagnosed']
             })
 
         # Step 3: 确诊 -> 开药
-        logger.info("[DB STEP] 3/4 Calculating Medication Flow")
-        sql_med_flow = """
-            SELECT COUNT(DISTINCT r.id) AS value
-            FROM medical_records r
-            JOIN prescription_details pd ON r.id = pd.record_id
-        """
-        cursor.execute(sql_med_flow)
-        med_flow = cursor.fetchone()
-        med_count = med_flow['value'] if med_flow else 0
-
+        med_count = sum(max(flow['medicated'], 0) for flow in flows)
         nodes.append({"name": "开药/治疗"})
-
-        # 添加连线: 确诊 -> 开药
         links.append({
             "source": "确诊/检查",
             "target": "开药/治疗",
@@ -106,7 +119,6 @@ def get_patient_flow_sankey():
         })
 
         # Step 4: 离院
-        logger.info("[DB STEP] 4/4 Calculating Discharge Flow")
         nodes.append({"name": "离院/康复"})
         links.append({
             "source": "开药/治疗",
@@ -115,8 +127,7 @@ def get_patient_flow_sankey():
         })
 
         # 计算未开药直接离院的人数 (确诊总数 - 开药总数)
-        # 先算出确诊总数
-        total_diag = sum(item['value'] for item in diag_flows)
+        total_diag = sum(max(flow['diagnosed'], 0) for flow in flows)
         no_med_count = total_diag - med_count
 
         if no_med_count > 0:
@@ -131,7 +142,7 @@ def get_patient_flow_sankey():
         logger.info(f"[DB RESULT] Sankey calculation done. Nodes: {len(nodes)}, Links: {len(links)}")
 
         # --- 3. 写缓存 (1分钟) ---
-        redis_client.set(cache_key, json.dumps(result), ex=60)
+        redis_client.set(cache_key, dumps(result), ex=60)
 
         return jsonify(result)
 
@@ -144,6 +155,8 @@ def get_patient_flow_sankey():
 
 # 按月份统计患者档案数与就诊人次，并计算环比增长率
 @stats_bp.route('/api/statistics/monthly', methods=['GET'])
+@query_budget(4)
+@cache_control(max_age=30)
 def get_monthly_statistics():
     month_str = request.args.get('month')
     if not month_str:
@@ -174,7 +187,7 @@ def get_monthly_statistics():
         cached_data = redis_client.get(cache_key)
         if cached_data:
             logger.info(f"[CACHE HIT] Monthly stats: {year}-{month}")
-            return jsonify(json.loads(cached_data))
+            return jsonify(loads(cached_data))
 
         # --- 2. 查库 ---
         logger.info(f"[DB QUERY] Calculating monthly stats for {year}-{month}")
@@ -191,14 +204,14 @@ def get_monthly_statistics():
 
         # 本月患者档案数
         cursor.execute(
-            "SELECT COUNT(*) AS cnt FROM patients WHERE YEAR(create_time) = %s AND MONTH(create_time) = %s",
+            "SELECT COUNT(*) AS cnt FROM patients WHERE YEAR(create_time) = %s AND MONTH(create_time) = %s AND deleted_at IS NULL",
             (year, month)
         )
         patient_count = int(cursor.fetchone()['cnt'] or 0)
 
         # 上个月患者档案数
         cursor.execute(
-            "SELECT COUNT(*) AS cnt FROM patients WHERE YEAR(create_time) = %s AND MONTH(create_time) = %s",
+            "SELECT COUNT(*) AS cnt FROM patients WHERE YEAR(create_time) = %s AND MONTH(create_time) = %s AND deleted_at IS NULL",
             (prev_year, prev_month)
         )
         prev_patient_count = int(cursor.fetchone()['cnt'] or 0)
@@ -235,7 +248,7 @@ def get_monthly_statistics():
         logger.info(f"[DB RESULT] {res['month']} Stats: Patients={patient_count}, Visits={visit_count}")
 
         # --- 3. 写缓存 (10分钟) ---
-        redis_client.set(cache_key, json.dumps(res), ex=600)
+        redis_client.set(cache_key, dumps(res), ex=600)
 
         return jsonify(res)
 
@@ -247,4 +260,24 @@ def get_monthly_statistics():
         if cursor: cursor.close()
         if conn: conn.close()
 
+
+# 全量重建桑基图流转计数 (flask --app run stats rebuild-sankey-flow)
+@stats_bp.cli.command('rebuild-sankey-flow')
+def rebuild_sankey_flow():
+    """从业务表重新聚合 sankey_flow_counts，用于计数漂移后的修复"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        inserted = rebuild_flow_counts(conn)
+
+        for key in redis_client.scan_iter("stats:sankey:*"):
+            redis_client.delete(key)
+
+        click.echo(f"Sankey flow counts rebuilt. Rows: {inserted}")
+    except Exception as e:
+        logger.error(f"[ERROR] Rebuilding sankey flow counts failed: {str(e)}")
+        raise click.ClickException(str(e))
+    finally:
+        if conn: conn.close()
+
 # --- END OF FILE app/stats.py ---
@@ -1,15 +1,49 @@
 # --- START OF FILE app/utils/common.py ---
+import os
 import time
+import hmac
+import hashlib
 import logging
 import jwt
-from flask import Flask, request, jsonify
+from functools import wraps
+from flask import Flask, Response, request, jsonify, make_response
+from app.utils.token_cache import token_cache, token_digest
+from app.utils.redis_client import redis_client
+from app.utils.compression import strip_encoding_suffix
 
 SECRET_KEY = 'ARE_YOU_LJF_YES_I_AM_AND_I_LOVE_DATABASE_JWT_SECRET'  # 用于加密JWT的密钥
 logger = logging.getLogger(__name__)
 
-def format_date(d):
-    """辅助函数：将数据库的一行数据转换为符合驼峰命名的字典"""
-    return str(d) if d else None
+# 防重放模式：
+#   timestamp : 仅旧方式，每个请求必须带 ?_t= 毫秒时间戳 (URL 每次都不同，无法被缓存)
+#   header    : 仅新方式，时间戳与签名放在请求头中，GET 请求 URL 保持不变，可被浏览器/代理缓存
+#   auto      : 带 X-Request-Time 请求头时按新方式校验，否则按旧方式校验 (默认，兼容旧客户端)
+REPLAY_MODE = os.getenv("REPLAY_MODE", "auto")
+REPLAY_WINDOW_MS = 5 * 60 * 1000  # 最大允许时间差：5分钟
+# 非幂等请求的 nonce 在 Redis 中保留的时间，需覆盖整个时间窗口 (前后各 5 分钟)
+NONCE_TTL = 2 * REPLAY_WINDOW_MS // 1000
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+def parse_ids_param(name='ids', max_ids=200):
+    """解析 ?ids=a,b,c 形式的批量查询参数：去空白、去重并保持顺序，最多 max_ids 个"""
+    raw = request.args.get(name, '')
+    ids = dict.fromkeys(part.strip() for part in raw.split(',') if part.strip())
+    return list(ids)[:max_ids]
+
+def remove_data_file(file_path):
+    """删除多模态数据对应的本地文件 (相对路径相对于项目根目录)，文件不存在时忽略，返回是否删除"""
+    if not file_path:
+        return False
+    abs_path = file_path if os.path.isabs(file_path) else os.path.join(os.getcwd(), file_path)
+    if not os.path.exists(abs_path):
+        return False
+    try:
+        os.remove(abs_path)
+        logger.info(f"[FILE DELETE] Removed {abs_path}")
+        return True
+    except Exception as fe:
+        logger.warning(f"[FILE ERROR] Failed to delete file: {fe}")
+        return False
 
 # 时间戳校验函数
 def check_timestamp():
@@ -37,6 +71,128 @@ def check_timestamp():
     # 校验通过
     return None
 
+def request_signing_key(token):
+    """登录时下发给客户端的请求签名密钥：由服务端密钥与 Token 派生，服务端无需存储"""
+    return hmac.new(SECRET_KEY.encode(), b"req-sign:" + token.encode(), hashlib.sha256).hexdigest()
+
+
+def check_replay():
+    """按 REPLAY_MODE 选择防重放校验方式，校验失败返回 (错误信息, 400/401)，通过返回 None"""
+    request_time = request.headers.get('X-Request-Time')
+    if request_time is None or REPLAY_MODE == 'timestamp':
+        if REPLAY_MODE == 'header':
+            logger.warning("[SECURITY] Blocked request: Missing X-Request-Time header")
+            return "X-Request-Time header is required", 400
+        return check_timestamp()
+    return check_signed_request(request_time)
+
+
+def signature_message(request_time, nonce):
+    """
+    待签名串："时间\nnonce\n方法\n路径\n原始查询串\n请求体 SHA-256"。
+    multipart / 表单上传不读取请求体 (避免提前消费上传流)，摘要位为空串
+    """
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        body_digest = ''
+    else:
+        body_digest = hashlib.sha256(request.get_data(cache=True)).hexdigest()
+    query = request.query_string.decode('latin-1')
+    return f"{request_time}\n{nonce}\n{request.method}\n{request.path}\n{query}\n{body_digest}".encode()
+
+
+def check_signed_request(request_time):
+    """
+    请求头防重放校验：
+    1. X-Request-Time 在 ±5 分钟窗口内
+    2. 已登录请求校验 X-Request-Signature = HMAC-SHA256(签名密钥, signature_message())，
+       签名覆盖方法、路径、原始查询串与请求体摘要，截获的签名不能挪用到其它参数或请求体上
+    3. 非幂等请求 (POST/PUT/DELETE) 的 X-Request-Nonce 在窗口内只能使用一次 (Redis SET NX)
+    """
+    try:
+        request_time = int(request_time)
+    except ValueError:
+        logger.error(f"[SECURITY] Invalid X-Request-Time format: {request_time}")
+        return "Invalid request time", 400
+
+    time_diff = abs(int(time.time() * 1000) - request_time)
+    if time_diff > REPLAY_WINDOW_MS:
+        logger.warning(f"[SECURITY] Request time out of range. Diff: {time_diff}ms")
+        return "Request time is too old or too far in the future", 400
+
+    nonce = request.headers.get('X-Request-Nonce', '')
+    unsafe = request.method not in SAFE_METHODS
+    if unsafe and not 8 <= len(nonce) <= 64:
+        logger.warning("[SECURITY] Blocked request: Missing or invalid X-Request-Nonce")
+        return "X-Request-Nonce is required", 400
+
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) == 2:
+        signature = request.headers.get('X-Request-Signature', '')
+        message = signature_message(request_time, nonce)
+        expected = hmac.new(request_signing_key(parts[1]).encode(), message, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature, expected):
+            logger.warning("[SECURITY] Blocked request: Invalid request signature")
+            return "Invalid request signature", 401
+
+    if unsafe:
+        try:
+            if not redis_client.set(f"replay:nonce:{nonce}", 1, nx=True, ex=NONCE_TTL):
+                logger.warning(f"[SECURITY] Blocked replayed request: nonce {nonce}")
+                return "Replayed request", 400
+        except Exception as e:
+            # Redis 不可用时仅依赖时间窗口与签名，不阻断业务
+            logger.error(f"[ERROR] Nonce check skipped, Redis unavailable: {e}")
+
+    return None
+
+
+def json_body_response(body, etag):
+    """
+    返回已序列化的 JSON 字符串并附带 ETag；
+    请求的 If-None-Match 与之匹配时直接返回 304 (无响应体)。
+    按 RFC 9110 对 If-None-Match 使用弱比较：nginx gzip 会把强 ETag 改写为 W/"..."；
+    压缩中间件追加的编码后缀 ("...-gzip") 也先去掉再比较
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (
+        if_none_match.strip() == '*'
+        or etag in (strip_encoding_suffix(tag.strip().removeprefix('W/')) for tag in if_none_match.split(','))
+    ):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.headers['ETag'] = etag
+    return response
+
+
+def cache_control(max_age, public=False):
+    """
+    为 GET 接口的 200 响应添加 Cache-Control，使浏览器可以在 max_age 秒内直接复用响应。
+    默认 private：需要 JWT 的接口不得被共享缓存 (代理/CDN) 复用；public 仅用于无需登录的响应。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if request.method == 'GET' and response.status_code in (200, 304):
+                response.headers['Cache-Control'] = f"{'public' if public else 'private'}, max-age={max_age}"
+            return response
+        return wrapper
+    return decorator
+
+
+def admin_required(view):
+    """仅管理员可访问；用于需要 JWT 的接口 (before_request 已挂载 request.user_data)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user = getattr(request, 'user_data', None) or {}
+        if user.get('role') != 'admin':
+            logger.warning(f"[AUTH] Blocked: {request.endpoint} requires admin (User: {user.get('user_id')})")
+            return jsonify({'message': 'Admin privilege required!'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
 def verify_jwt():
     auth_header = request.headers.get('Authorization')
 
@@ -52,9 +208,21 @@ def verify_jwt():
             return jsonify({'message': 'Invalid header format!'}), 401
         
         token = parts[1]
+
+        # 命中校验缓存 (未过期、未吊销) 时跳过 HMAC 校验与解码
+        digest = token_digest(token)
+        payload = token_cache.get(digest)
+        if payload is not None:
+            return payload
+
+        if token_cache.is_revoked(digest):
+            logger.warning("[AUTH] Blocked: Token has been revoked")
+            return jsonify({'message': 'Token has been revoked!'}), 401
+
         payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        
-        # 认证成功，记录用户身份而非 Token 本身
+        token_cache.put(digest, payload)
+
+        # 认证成功，记录用户身份而非 Token 本身 (仅首次解码时记录)
         logger.info(f"[AUTH] Verified User: {payload.get('user_id')} (Role: {payload.get('role')})")
         return payload  # 返回解码后的 payload
 
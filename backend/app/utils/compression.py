@@ -0,0 +1,123 @@
+import os
+import gzip
+import logging
+from flask import request
+
+from app.utils.metrics import timed
+from app.utils.redis_client import redis_binary_client
+
+try:  # brotli 为可选依赖，未安装时只提供 gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 响应压缩配置，均可通过环境变量覆盖
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))         # 小于该字节数的响应不压缩
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+# 压缩结果缓存时间 (秒)：按 ETag 寻址，内容不变则永远有效，TTL 只用于回收
+COMPRESS_CACHE_TTL = int(os.getenv("COMPRESS_CACHE_TTL", 600))
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript')
+
+# 服务端偏好顺序：同等权重时优先 brotli (压缩率更高)
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+
+def compress_bytes(data, encoding):
+    with timed('compression'):
+        if encoding == 'br':
+            return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+        # mtime=0：相同内容得到相同的压缩结果
+        return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def negotiate_encoding():
+    """按 Accept-Encoding (含 q 值) 选择编码，客户端不接受任何支持的编码时返回 None"""
+    return request.accept_encodings.best_match(SUPPORTED_ENCODINGS)
+
+
+def encoded_etag(etag, encoding):
+    """
+    压缩后的表示与原文字节不同，强 ETag 也必须不同：在引号内追加 "-编码" 后缀，
+    例如 "abc" -> "abc-gzip"；比对 If-None-Match 时由 strip_encoding_suffix 还原
+    """
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_encoding_suffix(etag):
+    for encoding in SUPPORTED_ENCODINGS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def _compressed_cache_key(etag, encoding):
+    digest = etag.strip('"')
+    return f"compressed:{encoding}:{digest}"
+
+
+def get_compressed_body(data, etag, encoding):
+    """
+    返回压缩后的字节。带 ETag 的响应 (缓存的 JSON 列表) 按 ETag 在 Redis 中保存压缩结果，
+    同一份缓存体只压缩一次，后续请求 (包括其它 worker) 直接复用；Redis 不可用时退化为现场压缩
+    """
+    if not etag:
+        return compress_bytes(data, encoding)
+
+    cache_key = _compressed_cache_key(etag, encoding)
+    try:
+        cached = redis_binary_client.get(cache_key)
+        if cached:
+            return cached
+    except Exception as e:
+        logger.error(f"[ERROR] Compressed cache read failed: {e}")
+        return compress_bytes(data, encoding)
+
+    compressed = compress_bytes(data, encoding)
+    try:
+        redis_binary_client.set(cache_key, compressed, ex=COMPRESS_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"[ERROR] Compressed cache write failed: {e}")
+    return compressed
+
+
+def compress_response(response):
+    """
+    after_request 钩子：对足够大的 200 文本/JSON 响应按协商结果压缩。
+    文件下载 (direct_passthrough)、流式响应与已编码的响应原样返回。
+    """
+    if (
+        request.method == 'HEAD'
+        or response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    # 响应内容随 Accept-Encoding 变化，无论本次是否压缩都要告知缓存
+    response.vary.add('Accept-Encoding')
+
+    encoding = negotiate_encoding()
+    if not encoding:
+        return response
+
+    etag = response.headers.get('ETag')
+    if etag and etag.startswith('W/'):
+        etag = None
+    body = get_compressed_body(data, etag, encoding)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.headers['ETag'] = encoded_etag(etag, encoding)
+    return response
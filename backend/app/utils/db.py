@@ -1,6 +1,20 @@
 import os
+import time
+import random
+import logging
+import threading
+from collections import defaultdict
 import mysql.connector
-from mysql.connector import pooling
+from mysql.connector import pooling, errorcode
+from app.utils.metrics import timed
+from app.utils.slow_query import SLOW_QUERY_SECONDS, record_slow_query
+from app.utils.query_budget import QUERY_TRACKING, note_query
+
+logger = logging.getLogger(__name__)
+
+# 服务端预处理语句总开关 (见下方 "预处理语句" 一节)；单条语句可在注册时或通过 DB_PREPARED_DISABLED 关闭
+PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1") == "1"
+PREPARED_DISABLED = {name.strip() for name in os.getenv("DB_PREPARED_DISABLED", "").split(",") if name.strip()}
 
 # 配置数据库连接池
 # 优先从环境变量读取，如果没有读取到，则使用默认值（本地开发配置）
@@ -12,26 +26,395 @@ db_config = {
     "user": os.getenv("DB_USER", "root"),           # 用户名
     "password": os.getenv("DB_PASSWORD", "root"),   # 密码
     "database": os.getenv("DB_NAME", "meddata_hub"),# 数据库名
-    "autocommit": False          # 关闭自动提交，以便手动控制事务
+    "autocommit": False,         # 关闭自动提交，以便手动控制事务
+    # 归还连接时默认执行 COM_RESET_CONNECTION，会释放该连接上的全部预处理语句；
+    # 启用预处理语句时改为只回滚未结束的事务 (见 StatementKeepingPool)
+    "pool_reset_session": not PREPARED_STATEMENTS,
 }
 
+
+class StatementKeepingPool(pooling.MySQLConnectionPool):
+    """
+    不重置会话的连接池：连接归还时只执行 ROLLBACK，结束读路径遗留的隐式事务 (避免下个请求读到旧快照)，
+    服务端预处理语句随连接保留，跨请求复用。应用不设置会话变量，无需其它清理。
+    """
+
+    def add_connection(self, cnx=None):
+        if cnx is not None and not self.reset_session:
+            try:
+                cnx.rollback()
+            except mysql.connector.Error as err:
+                # 连接已断开：照常放回池中，下次取出时由连接池重连
+                logger.warning(f"[DB POOL] Rollback on release failed: {err}")
+        super().add_connection(cnx)
+
+
 # 初始化连接池
 # 加上 try-catch 防止配置错误导致整个应用启动瞬间崩溃看不到报错
 try:
-    pool = mysql.connector.pooling.MySQLConnectionPool(**db_config)
+    pool = StatementKeepingPool(**db_config)
     print(f"Database connection pool created. Host: {db_config['host']}, DB: {db_config['database']}")
 except Exception as e:
     print(f"Error creating connection pool: {e}")
     pool = None
 
+class InstrumentedCursor:
+    """
+    游标包装：执行与取结果的耗时计入当前请求的 db 阶段，其余属性 (rowcount、column_names 等) 直接透传。
+    同时按语句累计 execute 与后续 fetch 的耗时，在下一次 execute / 读完结果 / close 时结算，
+    超过 SLOW_QUERY_MS 的语句交给慢查询日志 (见 app/utils/slow_query.py)
+    """
+
+    __slots__ = ("_cursor", "_statement", "_elapsed")
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._statement = None
+        self._elapsed = 0.0
+
+    def _begin(self, operation, params):
+        if QUERY_TRACKING:
+            note_query(operation, params)
+        if self._statement is not None:
+            self._finish()
+        self._statement = (operation, params)
+        self._elapsed = 0.0
+
+    def _finish(self):
+        statement = self._statement
+        self._statement = None
+        if statement is not None and self._elapsed >= SLOW_QUERY_SECONDS:
+            record_slow_query(statement[0], statement[1], self._elapsed, self._cursor.rowcount)
+
+    def _call(self, method, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            with timed('db'):
+                return method(*args, **kwargs)
+        finally:
+            self._elapsed += time.perf_counter() - t0
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._begin(operation, params)
+        return self._call(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._begin(operation, seq_params)
+        return self._call(self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def fetchone(self):
+        return self._call(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._call(self._cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        try:
+            return self._call(self._cursor.fetchall)
+        finally:
+            self._finish()
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __iter__(self):
+        # for row in cursor：一次读完剩余结果，只计时一次
+        return iter(self.fetchall())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """连接包装：cursor() 返回 InstrumentedCursor，commit / rollback 计入 db 阶段，其余属性直接透传"""
+
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def commit(self):
+        with timed('db'):
+            self._conn.commit()
+
+    def rollback(self):
+        with timed('db'):
+            self._conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
 def get_db_connection():
-    """从连接池获取连接"""
+    """从连接池获取连接 (取连接的等待时间同样计入 db 阶段)"""
     if not pool:
         raise Exception("Database pool is not initialized.")
     
     try:
-        connection = pool.get_connection()
-        return connection
+        with timed('db'):
+            connection = pool.get_connection()
+        return InstrumentedConnection(connection)
     except mysql.connector.Error as err:
         print(f"Error getting connection: {err}")
-        raise err
\ No newline at end of file
+        raise err
+
+
+# ================= 事务重试 =================
+# 仅对可安全重放的事务体生效：死锁 (1213) 与锁等待超时 (1205) 属于瞬时错误，
+# 回滚后整体重新执行即可成功；其它错误一律直接抛出
+RETRYABLE_ERRNOS = {
+    errorcode.ER_LOCK_DEADLOCK,        # 1213
+    errorcode.ER_LOCK_WAIT_TIMEOUT,    # 1205
+}
+TXN_MAX_ATTEMPTS = int(os.getenv("DB_TXN_MAX_ATTEMPTS", 4))
+TXN_BACKOFF_BASE = float(os.getenv("DB_TXN_BACKOFF_BASE", 0.02))   # 秒
+TXN_BACKOFF_CAP = float(os.getenv("DB_TXN_BACKOFF_CAP", 0.5))      # 秒
+
+
+class RetryBudget:
+    """
+    进程级重试预算 (令牌桶)：每个成功提交的事务存入 ratio 个令牌，每次重试消耗 1 个。
+    在持续高冲突时限制重试占比，避免重试风暴进一步放大锁竞争。
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+retry_budget = RetryBudget(
+    ratio=float(os.getenv("DB_TXN_RETRY_RATIO", 0.2)),
+    max_tokens=float(os.getenv("DB_TXN_RETRY_MAX_TOKENS", 10))
+)
+
+# 重试指标：{事务名: {计数项: 值}}
+_retry_metrics = defaultdict(lambda: defaultdict(int))
+_metrics_lock = threading.Lock()
+
+
+def _incr_metric(name, key, value=1):
+    with _metrics_lock:
+        _retry_metrics[name][key] += value
+
+
+def get_retry_metrics():
+    """返回各事务的重试指标快照 (attempts / commits / retries / failures / exhausted / budget_denied / errno_*)"""
+    with _metrics_lock:
+        return {name: dict(counters) for name, counters in _retry_metrics.items()}
+
+
+def run_in_transaction(conn, body, name="transaction", idempotent=False, dictionary=False):
+    """
+    在 conn 上执行事务体 body(cursor) 并提交，返回 body 的返回值。
+
+    - 出错时回滚；若 idempotent=True 且错误码为死锁/锁等待超时，
+      则按带抖动的指数退避重新执行整个事务体，受最大次数与重试预算限制
+    - body 必须只包含数据库操作 (缓存清理、文件读写等副作用放在提交之后)
+    - body 内可自行 rollback 后提前返回 (例如 404)，随后的 commit 为空操作
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        _incr_metric(name, "attempts")
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            if not conn.in_transaction:
+                conn.start_transaction()
+            result = body(cursor)
+            conn.commit()
+            _incr_metric(name, "commits")
+            retry_budget.deposit()
+            return result
+
+        except mysql.connector.Error as err:
+            conn.rollback()
+            if not idempotent or err.errno not in RETRYABLE_ERRNOS:
+                _incr_metric(name, "failures")
+                raise
+
+            _incr_metric(name, f"errno_{err.errno}")
+            if attempt >= TXN_MAX_ATTEMPTS:
+                _incr_metric(name, "exhausted")
+                logger.error(f"[DB RETRY] {name} gave up after {attempt} attempts: {err}")
+                raise
+            if not retry_budget.withdraw():
+                _incr_metric(name, "budget_denied")
+                logger.error(f"[DB RETRY] {name} retry budget exhausted: {err}")
+                raise
+
+            # Full jitter：在 [0, min(cap, base * 2^n)] 内随机等待
+            delay = random.uniform(0, min(TXN_BACKOFF_CAP, TXN_BACKOFF_BASE * (2 ** (attempt - 1))))
+            _incr_metric(name, "retries")
+            logger.warning(f"[DB RETRY] {name} attempt {attempt} hit errno {err.errno}, retrying in {delay * 1000:.0f}ms")
+            time.sleep(delay)
+
+        except Exception:
+            conn.rollback()
+            _incr_metric(name, "failures")
+            raise
+
+        finally:
+            cursor.close()
+
+
+# ================= 预处理语句 =================
+# 热点参数化 SQL 在模块级注册一次，执行时在当前连接上使用服务端预处理语句 (二进制协议)：
+# - 每个连接每条语句一个 prepared 游标，首次执行时才 PREPARE (惰性)，之后只发送 EXECUTE
+# - 游标缓存挂在底层驱动连接上，随连接在池中保留；连接重连后 (connection_id 变化) 整体丢弃并重新准备
+# - 服务端报告语句句柄失效 (1243) 时丢弃缓存并重新准备一次
+# - 语句未启用预处理时退回普通游标 (文本协议)，调用方式不变
+ER_UNKNOWN_STMT_HANDLER = errorcode.ER_UNKNOWN_STMT_HANDLER    # 1243
+
+
+class Statement:
+    """已注册的 SQL 语句；prepared=False 时始终使用文本协议，dictionary=True 时结果行为字典"""
+
+    def __init__(self, name, sql, prepared=True, dictionary=False):
+        self.name = name
+        self.sql = sql
+        self.prepared = prepared
+        self.dictionary = dictionary
+
+    @property
+    def use_prepared(self):
+        return PREPARED_STATEMENTS and self.prepared and self.name not in PREPARED_DISABLED
+
+
+_statements = {}
+
+# 预处理语句指标：{语句名: {prepares / executions / text_executions / reprepares: 值}}
+_statement_metrics = defaultdict(lambda: defaultdict(int))
+
+
+def register_statement(name, sql, prepared=True, dictionary=False):
+    """注册一条语句并返回 Statement 对象，供模块级常量保存"""
+    statement = Statement(name, sql, prepared=prepared, dictionary=dictionary)
+    _statements[name] = statement
+    return statement
+
+
+def get_statements():
+    return dict(_statements)
+
+
+def _incr_statement_metric(name, key):
+    with _metrics_lock:
+        _statement_metrics[name][key] += 1
+
+
+def get_statement_metrics():
+    """返回各语句的执行指标快照"""
+    with _metrics_lock:
+        return {name: dict(counters) for name, counters in _statement_metrics.items()}
+
+
+def _driver_connection(conn):
+    """返回底层驱动连接：池化连接每次取出都是新的包装对象，游标缓存需挂在其内部连接上"""
+    if isinstance(conn, InstrumentedConnection):
+        conn = conn._conn
+    if isinstance(conn, pooling.PooledMySQLConnection):
+        return conn._cnx
+    return conn
+
+
+def _prepared_cursor(cnx, statement):
+    cache = getattr(cnx, "_prepared_cursors", None)
+    connection_id = cnx.connection_id
+    if cache is None or cache[0] != connection_id:
+        # 新连接或已重连：旧语句句柄在服务端已不存在，直接丢弃 (不发送 CLOSE)
+        cache = (connection_id, {})
+        cnx._prepared_cursors = cache
+
+    cursor = cache[1].get(statement.name)
+    if cursor is None:
+        cursor = cnx.cursor(prepared=True, dictionary=statement.dictionary)
+        cache[1][statement.name] = cursor
+        _incr_statement_metric(statement.name, "prepares")
+    return cursor
+
+
+def _discard_prepared(cnx, statement):
+    cache = getattr(cnx, "_prepared_cursors", None)
+    if cache:
+        cache[1].pop(statement.name, None)
+
+
+def _run_statement(conn, statement, params, fetch):
+    if QUERY_TRACKING:
+        note_query(statement.sql, params)
+    t0 = time.perf_counter()
+    with timed('db'):
+        result = _execute_registered(_driver_connection(conn), statement, params, fetch)
+    elapsed = time.perf_counter() - t0
+    if elapsed >= SLOW_QUERY_SECONDS:
+        record_slow_query(statement.sql, params, elapsed, len(result) if fetch else result)
+    return result
+
+
+def _execute_registered(cnx, statement, params, fetch):
+
+    if not statement.use_prepared:
+        _incr_statement_metric(statement.name, "text_executions")
+        cursor = cnx.cursor(dictionary=statement.dictionary)
+        try:
+            cursor.execute(statement.sql, params)
+            return cursor.fetchall() if fetch else cursor.rowcount
+        finally:
+            cursor.close()
+
+    for attempt in (1, 2):
+        cursor = _prepared_cursor(cnx, statement)
+        try:
+            # 传入注册时的同一个 SQL 字符串对象：驱动按对象身份判断是否需要重新 PREPARE
+            cursor.execute(statement.sql, params)
+            _incr_statement_metric(statement.name, "executions")
+            return cursor.fetchall() if fetch else cursor.rowcount
+        except mysql.connector.Error as err:
+            # 其它错误 (死锁、约束冲突等) 不影响已准备的语句，游标继续复用
+            if err.errno != ER_UNKNOWN_STMT_HANDLER or attempt == 2:
+                raise
+            _discard_prepared(cnx, statement)
+            _incr_statement_metric(statement.name, "reprepares")
+            logger.warning(f"[DB PREPARED] Statement handle for {statement.name} lost, re-preparing")
+
+
+def query_all(conn, statement, params=()):
+    """
+    在 conn 上执行已注册的查询语句，返回全部结果行 (结果总是读完，不影响同连接上的其它游标)。
+    事务体内传入事务所在的连接即可，与事务游标属于同一会话、同一事务。
+    """
+    return _run_statement(conn, statement, params, fetch=True)
+
+
+def query_one(conn, statement, params=()):
+    """执行已注册的查询语句，返回第一行或 None"""
+    rows = _run_statement(conn, statement, params, fetch=True)
+    return rows[0] if rows else None
+
+
+def execute_statement(conn, statement, params=()):
+    """执行已注册的写语句 (INSERT / UPDATE / DELETE)，返回受影响行数"""
+    return _run_statement(conn, statement, params, fetch=False)
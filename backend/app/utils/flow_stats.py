@@ -0,0 +1,144 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 桑基图流转计数表：按 (日期, 科室, 阶段) 维护增量计数
+# 写路径在各自事务内调用本模块更新计数，读路径只需汇总少量计数行，无需多表关联
+# "离院" 阶段等于 "确诊" 总数 (开药后离院 + 未开药直接离院)，由读取方推导，不单独存储
+STAGES = ('registered', 'diagnosed', 'medicated')
+
+# 从业务表聚合流转计数，{where} 为针对挂号表 a 的附加过滤条件
+# 口径与 /api/stats/sankey 一致：病历通过 appointment_id 关联挂号，按挂号的日期和科室归类
+FLOW_AGG_SQL = """
+    SELECT LEFT(a.create_time, 10) AS stat_date, a.department_id, 'registered' AS stage, COUNT(*) AS cnt
+    FROM appointments a
+    {where}
+    GROUP BY stat_date, a.department_id
+    UNION ALL
+    SELECT LEFT(a.create_time, 10) AS stat_date, a.department_id, 'diagnosed' AS stage, COUNT(*) AS cnt
+    FROM appointments a
+    JOIN medical_records r ON r.appointment_id = a.id
+    {where}
+    GROUP BY stat_date, a.department_id
+    UNION ALL
+    SELECT LEFT(a.create_time, 10) AS stat_date, a.department_id, 'medicated' AS stage, COUNT(*) AS cnt
+    FROM appointments a
+    JOIN medical_records r ON r.appointment_id = a.id
+    {where} {conj} EXISTS (SELECT 1 FROM prescription_details pd WHERE pd.record_id = r.id)
+    GROUP BY stat_date, a.department_id
+"""
+
+UPSERT_SQL = """
+    INSERT INTO sankey_flow_counts (stat_date, department_id, stage, count)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE count = count + VALUES(count)
+"""
+
+
+def _build_agg_sql(where=""):
+    where_clause = f"WHERE {where}" if where else ""
+    conj = "AND" if where else "WHERE"
+    return FLOW_AGG_SQL.format(where=where_clause, conj=conj)
+
+
+def bump_flow(cursor, stat_date, department_id, stages, delta=1):
+    """
+    在调用方事务内为某个 (日期, 科室) 的若干阶段加减计数。
+    stat_date 可为 date 或 'YYYY-MM-DD...' 字符串，只取日期部分。
+    """
+    if not stat_date or not department_id or not stages:
+        return
+    day = str(stat_date)[:10]
+    cursor.executemany(UPSERT_SQL, [(day, department_id, stage, delta) for stage in stages])
+
+
+def bump_flows(cursor, deltas):
+    """批量版本：deltas 为 {(stat_date, department_id, stage): delta}，一次 executemany 写入"""
+    rows = [
+        (str(day)[:10], dept, stage, delta)
+        for (day, dept, stage), delta in deltas.items()
+        if day and dept and delta
+    ]
+    if rows:
+        cursor.executemany(UPSERT_SQL, rows)
+
+
+def get_appointment_flow_key(cursor, appointment_id):
+    """返回挂号对应的 (日期, 科室)，用于病历增减时定位计数行；找不到返回 (None, None)"""
+    if not appointment_id:
+        return None, None
+    cursor.execute(
+        "SELECT LEFT(create_time, 10), department_id FROM appointments WHERE id = %s",
+        (appointment_id,)
+    )
+    res = cursor.fetchone()
+    return (res[0], res[1]) if res else (None, None)
+
+
+# 病历维度的流转聚合：只统计 "确诊" / "开药" 两个阶段，{ids} 为病历 ID 占位符
+RECORD_FLOW_AGG_SQL = """
+    SELECT LEFT(a.create_time, 10) AS stat_date, a.department_id, 'diagnosed' AS stage, COUNT(*) AS cnt
+    FROM medical_records r
+    JOIN appointments a ON r.appointment_id = a.id
+    WHERE r.id IN ({ids})
+    GROUP BY stat_date, a.department_id
+    UNION ALL
+    SELECT LEFT(a.create_time, 10) AS stat_date, a.department_id, 'medicated' AS stage, COUNT(*) AS cnt
+    FROM medical_records r
+    JOIN appointments a ON r.appointment_id = a.id
+    WHERE r.id IN ({ids}) AND EXISTS (SELECT 1 FROM prescription_details pd WHERE pd.record_id = r.id)
+    GROUP BY stat_date, a.department_id
+"""
+
+
+def _apply_aggregated(cursor, sql, params, sign):
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    if rows:
+        cursor.executemany(UPSERT_SQL, [(row[0], row[1], row[2], sign * int(row[3])) for row in rows])
+    return len(rows)
+
+
+def add_record_flows(cursor, record_ids):
+    """病历新关联到挂号后调用 (例如回填 appointment_id)：补加这些病历贡献的 "确诊" / "开药" 计数"""
+    if not record_ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(record_ids))
+    return _apply_aggregated(cursor, RECORD_FLOW_AGG_SQL.format(ids=placeholders), tuple(record_ids) * 2, 1)
+
+
+def subtract_record_flows(cursor, record_ids):
+    """删除一批病历前调用：扣除这些病历贡献的 "确诊" / "开药" 计数"""
+    if not record_ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(record_ids))
+    return _apply_aggregated(cursor, RECORD_FLOW_AGG_SQL.format(ids=placeholders), tuple(record_ids) * 2, -1)
+
+
+def subtract_appointment_flows(cursor, appointment_ids):
+    """删除一批挂号前调用：扣除这些挂号及仍关联病历贡献的全部流转计数"""
+    if not appointment_ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(appointment_ids))
+    return _apply_aggregated(cursor, _build_agg_sql(f"a.id IN ({placeholders})"), tuple(appointment_ids) * 3, -1)
+
+
+def rebuild_flow_counts(conn):
+    """全量重建计数表 (修复用)，在单个事务内完成，返回写入的计数行数"""
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        cursor.execute("DELETE FROM sankey_flow_counts")
+        cursor.execute(
+            "INSERT INTO sankey_flow_counts (stat_date, department_id, stage, count) "
+            "SELECT stat_date, department_id, stage, cnt FROM (" + _build_agg_sql() + ") agg"
+        )
+        inserted = cursor.rowcount
+        conn.commit()
+        logger.info(f"[FLOW REBUILD] Sankey flow counts rebuilt: {inserted} rows.")
+        return inserted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import queue
+import atexit
+import logging
+import itertools
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# 日志配置，均可通过环境变量覆盖
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")                      # json / text
+LOG_FILE = os.getenv("LOG_FILE", "app.log")                       # 只记录 WARNING 以上级别
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", 10 * 1024 * 1024))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", 5))
+# 热点 INFO 日志按类别采样，格式 "类别=比例,..."，类别即消息开头方括号中的标签
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "CACHE HIT=0.1,DB QUERY=0.1,DB RESULT=0.1")
+
+CATEGORY_PATTERN = re.compile(r"^\[([A-Z][A-Z0-9 _]*)\]")
+
+
+def log_category(record):
+    """提取消息开头的标签，例如 "[CACHE HIT] ..." -> "CACHE HIT"；没有标签返回 None"""
+    msg = record.msg
+    if not isinstance(msg, str) or not msg.startswith("["):
+        return None
+    match = CATEGORY_PATTERN.match(msg)
+    return match.group(1) if match else None
+
+
+def parse_sample_rates(spec):
+    rates = {}
+    for part in (spec or "").split(","):
+        name, sep, rate = part.rpartition("=")
+        if sep and name.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """结构化 JSON 日志：每条一行，包含时间、级别、模块、类别、消息及异常堆栈"""
+
+    default_msec_format = '%s.%03d'
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "category": log_category(record),
+            "msg": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    按类别对 INFO 及以下级别的日志做 1/N 采样 (计数取模，无随机数开销)；
+    WARNING 以上级别和未配置的类别始终保留。
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.every = {name: (0 if rate <= 0 else round(1 / rate)) for name, rate in rates.items() if rate < 1}
+        self.counters = {name: itertools.count() for name in self.every}
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not self.every:
+            return True
+        category = log_category(record)
+        every = self.every.get(category)
+        if every is None:
+            return True
+        if every == 0:
+            return False
+        return next(self.counters[category]) % every == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    请求线程只负责入队：消息参数在此合并 (防止之后被修改)，格式化与 I/O 全部交给监听线程
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class ManagedQueueListener(QueueListener):
+    """自行记录启动状态的 QueueListener：stop() 可重复调用 (手动停止后 atexit 再调用时直接跳过)"""
+
+    started = False
+
+    def start(self):
+        super().start()
+        self.started = True
+
+    def stop(self):
+        if not self.started:
+            return
+        self.started = False
+        super().stop()
+
+
+def build_formatter():
+    if LOG_FORMAT == "text":
+        return logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    return JsonFormatter()
+
+
+def setup_queue_logging(root, stream=None):
+    """
+    为 root logger 挂载 队列处理器 -> 后台监听线程 -> (控制台 + 按大小轮转的文件) 的日志管道，
+    返回启动后的 QueueListener；stream 默认为 stderr
+    """
+    formatter = build_formatter()
+
+    # 控制台处理器
+    console_handler = logging.StreamHandler(stream)
+    console_handler.setLevel(LOG_LEVEL)
+    console_handler.setFormatter(formatter)
+
+    # 文件处理器 (只记录 Warning 以上级别，按大小轮转，防止日志文件爆炸)
+    file_handler = RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8'
+    )
+    file_handler.setLevel(logging.WARNING)
+    file_handler.setFormatter(formatter)
+
+    # SimpleQueue 为 C 实现的无锁队列，入队开销远低于 queue.Queue
+    queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    root.addHandler(queue_handler)
+
+    listener = ManagedQueueListener(queue_handler.queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    # 进程退出前刷出队列中剩余的日志 (已手动停止的监听器跳过)
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import atexit
+import uuid
+import tempfile
+import threading
+from collections import defaultdict
+
+# 性能指标：每个 worker 进程在内存中累计，定期写入共享目录下的 worker-{boot}-{pid}.json，
+# /metrics 读取目录中本次启动所有 worker 的快照求和后输出 Prometheus 文本格式 (gunicorn 多进程聚合)。
+# 本次启动内已退出 worker 的快照保留 (计数器单调递增)；此前启动留下的快照不参与汇总，并在进程启动时删除
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "meddata_metrics"))
+# 启动标识：gunicorn master 在 fork worker 之前设置 (见 gunicorn.conf.py)，同一次启动的 worker 相同；
+# 未经 gunicorn 启动 (python run.py / flask run，单进程) 时每个进程自成一次启动
+METRICS_BOOT_ID = os.getenv("METRICS_BOOT_ID") or uuid.uuid4().hex[:12]
+SNAPSHOT_PREFIX = f"worker-{METRICS_BOOT_ID}-"
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))   # 秒
+METRIC_PREFIX = "meddata"
+
+# 请求耗时直方图的桶上界 (秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 请求内分阶段计时：auth / cache / db / serialization / compression，其余计入 other
+PHASES = ('auth', 'cache', 'db', 'serialization', 'compression')
+
+
+# ================= 请求级分阶段计时 =================
+# 线程局部存储：before_request 中开启，after_request 中取出；后台线程与 CLI 中未开启，计时为空操作。
+# 阶段可嵌套 (例如鉴权中的 Redis 调用)，内层耗时从外层扣除，各阶段互不重复计算
+_local = threading.local()
+
+
+def start_request_timers():
+    _local.phases = dict.fromkeys(PHASES, 0.0)
+    _local.stack = []
+
+
+def current_phases():
+    """当前请求到目前为止的分阶段耗时 (不结束计时)"""
+    phases = getattr(_local, "phases", None)
+    return dict(phases) if phases else {}
+
+
+def stop_request_timers():
+    phases = getattr(_local, "phases", None)
+    _local.phases = None
+    return phases or {}
+
+
+class timed:
+    """计时上下文：with timed('db'): ..."""
+
+    __slots__ = ("phase", "t0", "active")
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.active = getattr(_local, "phases", None) is not None
+        if self.active:
+            _local.stack.append(self.phase)
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.active:
+            elapsed = time.perf_counter() - self.t0
+            stack = _local.stack
+            stack.pop()
+            phases = _local.phases
+            if phases is not None:
+                phases[self.phase] = phases.get(self.phase, 0.0) + elapsed
+                if stack:
+                    phases[stack[-1]] -= elapsed
+        return False
+
+
+# ================= 进程内指标 =================
+class MetricsRegistry:
+    """单个 worker 的请求计数、耗时直方图与分阶段耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)                 # (endpoint, method, status) -> 次数
+        self.latency = {}                                # endpoint -> [各桶计数..., +Inf 桶, sum, count]
+        self.phase_seconds = defaultdict(float)          # (endpoint, phase) -> 秒
+        self._next_flush = 0.0
+
+    def observe(self, endpoint, method, status, duration, phases):
+        with self._lock:
+            self.requests[(endpoint, method, str(status))] += 1
+
+            hist = self.latency.get(endpoint)
+            if hist is None:
+                hist = self.latency[endpoint] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    hist[i] += 1
+                    break
+            else:
+                hist[len(LATENCY_BUCKETS)] += 1
+            hist[-2] += duration
+            hist[-1] += 1
+
+            accounted = 0.0
+            for phase, seconds in phases.items():
+                if seconds > 0:
+                    self.phase_seconds[(endpoint, phase)] += seconds
+                    accounted += seconds
+            self.phase_seconds[(endpoint, 'other')] += max(duration - accounted, 0.0)
+
+    def snapshot(self):
+        from app.utils.db import get_retry_metrics, get_statement_metrics  # 避免循环导入
+        from app.utils.slow_query import slow_query_log
+
+        with self._lock:
+            data = {
+                "pid": os.getpid(),
+                "requests": [[*key, count] for key, count in self.requests.items()],
+                "latency": {endpoint: list(hist) for endpoint, hist in self.latency.items()},
+                "phases": [[*key, seconds] for key, seconds in self.phase_seconds.items()],
+            }
+        data["db_transactions"] = get_retry_metrics()
+        data["db_statements"] = get_statement_metrics()
+        data["slow_queries"] = slow_query_log.snapshot()
+        return data
+
+    def flush(self):
+        """把当前快照原子地写入 worker-{boot}-{pid}.json"""
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{SNAPSHOT_PREFIX}{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def flush_if_due(self):
+        now = time.monotonic()
+        if now < self._next_flush:
+            return
+        self._next_flush = now + METRICS_FLUSH_INTERVAL
+        try:
+            self.flush()
+        except OSError:
+            pass  # 指标写入失败不影响请求
+
+
+registry = MetricsRegistry()
+
+
+def _final_flush():
+    """worker 退出时写入最后一次快照"""
+    try:
+        registry.flush()
+    except Exception:
+        pass
+
+
+if METRICS_ENABLED:
+    atexit.register(_final_flush)
+
+
+# ================= 多进程聚合与输出 =================
+def prune_stale_snapshots():
+    """删除此前启动留下的快照 (create_app 时调用)，本次启动的快照不动"""
+    if not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        if name.startswith("worker-") and not name.startswith(SNAPSHOT_PREFIX):
+            try:
+                os.remove(os.path.join(METRICS_DIR, name))
+            except OSError:
+                pass  # 已被其他 worker 删除
+
+
+def collect_snapshots():
+    """读取本次启动所有 worker 的快照 (先刷新当前进程)，返回快照列表"""
+    try:
+        registry.flush()
+    except OSError:
+        pass
+
+    snapshots = []
+    if not os.path.isdir(METRICS_DIR):
+        return [registry.snapshot()]
+    for name in os.listdir(METRICS_DIR):
+        if not (name.startswith(SNAPSHOT_PREFIX) and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name), encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # 正在被替换或已损坏的文件跳过
+    return snapshots
+
+
+def merge_snapshots(snapshots):
+    merged = {
+        "requests": defaultdict(int),
+        "latency": {},
+        "phases": defaultdict(float),
+        "db_transactions": defaultdict(int),
+        "db_statements": defaultdict(int),
+        "workers": len(snapshots),
+    }
+    for snap in snapshots:
+        for endpoint, method, status, count in snap.get("requests", []):
+            merged["requests"][(endpoint, method, status)] += count
+        for endpoint, hist in snap.get("latency", {}).items():
+            total = merged["latency"].get(endpoint)
+            merged["latency"][endpoint] = hist[:] if total is None else [a + b for a, b in zip(total, hist)]
+        for endpoint, phase, seconds in snap.get("phases", []):
+            merged["phases"][(endpoint, phase)] += seconds
+        for kind in ("db_transactions", "db_statements"):
+            for name, counters in snap.get(kind, {}).items():
+                for event, value in counters.items():
+                    merged[kind][(name, event)] += value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(merged):
+    """按 Prometheus 文本格式 (0.0.4) 输出聚合后的指标"""
+    p = METRIC_PREFIX
+    lines = [
+        f"# HELP {p}_metrics_workers Number of worker snapshots aggregated.",
+        f"# TYPE {p}_metrics_workers gauge",
+        f"{p}_metrics_workers {merged['workers']}",
+        f"# HELP {p}_http_requests_total HTTP requests by endpoint, method and status.",
+        f"# TYPE {p}_http_requests_total counter",
+    ]
+    for (endpoint, method, status), count in sorted(merged["requests"].items()):
+        lines.append(f"{p}_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+    lines += [
+        f"# HELP {p}_http_request_duration_seconds HTTP request latency by endpoint.",
+        f"# TYPE {p}_http_request_duration_seconds histogram",
+    ]
+    for endpoint, hist in sorted(merged["latency"].items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), hist[:len(LATENCY_BUCKETS) + 1]):
+            cumulative += count
+            lines.append(f"{p}_http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {cumulative}")
+        lines.append(f"{p}_http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {hist[-2]:.6f}")
+        lines.append(f"{p}_http_request_duration_seconds_count{_labels(endpoint=endpoint)} {hist[-1]}")
+
+    lines += [
+        f"# HELP {p}_http_request_phase_seconds_total Time spent per request phase (auth/cache/db/serialization/compression/other).",
+        f"# TYPE {p}_http_request_phase_seconds_total counter",
+    ]
+    for (endpoint, phase), seconds in sorted(merged["phases"].items()):
+        lines.append(f"{p}_http_request_phase_seconds_total{_labels(endpoint=endpoint, phase=phase)} {seconds:.6f}")
+
+    lines += [
+        f"# HELP {p}_db_transaction_events_total Transaction retry metrics from run_in_transaction.",
+        f"# TYPE {p}_db_transaction_events_total counter",
+    ]
+    for (name, event), value in sorted(merged["db_transactions"].items()):
+        lines.append(f"{p}_db_transaction_events_total{_labels(transaction=name, event=event)} {value}")
+
+    lines += [
+        f"# HELP {p}_db_statement_events_total Prepared statement registry metrics.",
+        f"# TYPE {p}_db_statement_events_total counter",
+    ]
+    for (name, event), value in sorted(merged["db_statements"].items()):
+        lines.append(f"{p}_db_statement_events_total{_labels(statement=name, event=event)} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,184 @@
+import os
+import time
+import uuid
+import pstats
+import marshal
+import cProfile
+import logging
+from flask import request
+
+from app.utils.metrics import current_phases
+from app.utils.redis_client import redis_client, redis_binary_client
+from app.utils.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# 按需请求剖析：管理员请求携带 X-Profile: 1 (或 ?_profile=1) 时，用 cProfile 对这一次请求做确定性剖析，
+# 剖析结果 (调用树、热点函数、DB / 缓存耗时) 存入 Redis，响应头 X-Profile-Id 返回编号。
+# PROFILING_ENABLED=0 时不注册钩子；开启时未携带标记的请求只多一次请求头判断
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "1") == "1"
+PROFILE_HEADER = "X-Profile"
+PROFILE_MIN_INTERVAL = int(os.getenv("PROFILE_MIN_INTERVAL", 10))   # 全局 (所有 worker) 两次剖析的最小间隔，秒
+PROFILE_TTL = int(os.getenv("PROFILE_TTL", 3600))                  # 剖析结果保留时间，秒
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))                  # 列表中保留的最近剖析数
+PROFILE_TOP = 40            # 热点函数数量
+TREE_MAX_DEPTH = 15         # 调用树最大深度
+TREE_MIN_FRACTION = 0.01    # 调用树中省略耗时占比低于 1% 的分支
+
+PROFILE_INDEX_KEY = "profile:index"
+PROFILE_LOCK_KEY = "profile:ratelimit"
+
+
+def profile_requested():
+    return request.headers.get(PROFILE_HEADER) == "1" or request.args.get("_profile") == "1"
+
+
+def _acquire_slot():
+    """全局限流：PROFILE_MIN_INTERVAL 秒内只允许一次剖析 (与防重放 nonce 相同的 SET NX EX)"""
+    try:
+        return bool(redis_client.set(PROFILE_LOCK_KEY, request.endpoint or "", nx=True, ex=PROFILE_MIN_INTERVAL))
+    except Exception as e:
+        logger.error(f"[PROFILE] Rate limit check failed: {e}")
+        return False
+
+
+def start_profiling():
+    """在鉴权之后调用：仅管理员、仅携带标记、且未被限流时开启剖析"""
+    if not profile_requested():
+        return
+    user = getattr(request, "user_data", None) or {}
+    if user.get("role") != "admin":
+        request.profile_skipped = "forbidden"
+        return
+    if not _acquire_slot():
+        request.profile_skipped = "rate-limited"
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 同一进程中已有其它剖析器在运行 (Python 3.12+ 同时只允许一个)
+        request.profile_skipped = "busy"
+        return
+    request.profiler = profiler
+    request.profile_start = time.perf_counter()
+
+
+def _func_label(func):
+    filename, line, name = func
+    if filename == "~":
+        return name  # 内置函数，例如 <built-in method time.sleep>
+    return f"{os.path.relpath(filename) if filename.startswith(os.getcwd()) else filename}:{line}({name})"
+
+
+def _call_tree(stats, total):
+    """由 pstats 的调用者关系反推出调用树 (按边上的累计耗时排序，裁剪小分支与环)"""
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, (_, nc, _, ct) in callers.items():
+            callees.setdefault(caller, []).append((func, nc, ct))
+    roots = [func for func, entry in stats.items() if not entry[4]]
+
+    def build(func, calls, cumtime, depth, path):
+        node = {"func": _func_label(func), "calls": calls, "cumMs": round(cumtime * 1000, 3)}
+        if depth < TREE_MAX_DEPTH:
+            children = sorted(callees.get(func, ()), key=lambda edge: edge[2], reverse=True)
+            node["children"] = [
+                build(child, nc, ct, depth + 1, path | {child})
+                for child, nc, ct in children
+                if child not in path and ct >= total * TREE_MIN_FRACTION
+            ]
+        return node
+
+    return [build(root, stats[root][1], stats[root][3], 0, {root})
+            for root in sorted(roots, key=lambda func: stats[func][3], reverse=True)
+            if stats[root][3] >= total * TREE_MIN_FRACTION]
+
+
+def build_report(profiler, profile_id, response, wall):
+    stats = pstats.Stats(profiler).stats
+    total = sum(tt for _, _, tt, _, _ in stats.values()) or wall
+
+    hot = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+    return {
+        "id": profile_id,
+        "endpoint": request.endpoint,
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "status": response.status_code,
+        "user": (getattr(request, "user_data", None) or {}).get("user_id"),
+        "createdAt": time.time(),
+        "wallMs": round(wall * 1000, 3),
+        "profiledMs": round(total * 1000, 3),
+        # 各阶段耗时来自请求指标计时 (见 app/utils/metrics.py)，剖析本身的开销会放大函数耗时，阶段耗时更接近真实值
+        "phasesMs": {phase: round(seconds * 1000, 3) for phase, seconds in current_phases().items()},
+        "functions": [
+            {
+                "func": _func_label(func),
+                "calls": nc,
+                "primitiveCalls": cc,
+                "tottimeMs": round(tt * 1000, 3),
+                "cumtimeMs": round(ct * 1000, 3),
+            }
+            for func, (cc, nc, tt, ct, _) in hot
+        ],
+        "tree": _call_tree(stats, total),
+    }, marshal.dumps(stats)
+
+
+def finish_profiling(response):
+    """结束剖析并保存结果，响应头返回 X-Profile-Id (未执行剖析时返回原因 X-Profile-Skipped)"""
+    profiler = getattr(request, "profiler", None)
+    if profiler is None:
+        skipped = getattr(request, "profile_skipped", None)
+        if skipped:
+            response.headers["X-Profile-Skipped"] = skipped
+        return response
+
+    profiler.disable()
+    request.profiler = None
+    wall = time.perf_counter() - request.profile_start
+    profile_id = uuid.uuid4().hex[:16]
+
+    try:
+        report, raw = build_report(profiler, profile_id, response, wall)
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(f"profile:{profile_id}", dumps(report), ex=PROFILE_TTL)
+        pipe.zadd(PROFILE_INDEX_KEY, {profile_id: report["createdAt"]})
+        pipe.zremrangebyrank(PROFILE_INDEX_KEY, 0, -PROFILE_KEEP - 1)
+        pipe.expire(PROFILE_INDEX_KEY, PROFILE_TTL)
+        pipe.execute()
+        redis_binary_client.set(f"profile:{profile_id}:pstats", raw, ex=PROFILE_TTL)
+    except Exception as e:
+        logger.error(f"[PROFILE] Failed to store profile for {request.endpoint}: {e}")
+        return response
+
+    logger.warning(f"[PROFILE] {request.method} {request.path} profiled in {wall * 1000:.0f}ms (ID: {profile_id})")
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+def list_profiles():
+    """最近的剖析记录摘要 (新的在前)；已过期的条目跳过"""
+    ids = redis_client.zrevrange(PROFILE_INDEX_KEY, 0, -1)
+    if not ids:
+        return []
+    summaries = []
+    for profile_id, raw in zip(ids, redis_client.mget([f"profile:{_id}" for _id in ids])):
+        if not raw:
+            continue
+        report = loads(raw)
+        summaries.append({key: report[key] for key in
+                          ("id", "endpoint", "method", "path", "status", "user", "createdAt", "wallMs", "phasesMs")})
+    return summaries
+
+
+def get_profile(profile_id):
+    """返回剖析报告的 JSON 字符串，不存在返回 None"""
+    return redis_client.get(f"profile:{profile_id}")
+
+
+def get_profile_pstats(profile_id):
+    """返回 pstats 原始数据 (marshal 格式，可用 pstats.Stats / snakeviz 打开)，不存在返回 None"""
+    return redis_binary_client.get(f"profile:{profile_id}:pstats")
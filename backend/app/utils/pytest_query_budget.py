@@ -0,0 +1,43 @@
+"""
+pytest 插件：查询预算检查
+
+    QUERY_BUDGET_MODE=fail pytest -p app.utils.pytest_query_budget
+
+- QUERY_BUDGET_MODE 在 app 包导入时读取，加载本插件本身就会导入 app，因此必须由环境变量事先设为 fail，
+  否则插件直接报用法错误 (而不是静默地不检查)；create_app() 会检查每个路由都声明了 @query_budget
+- 每个测试结束后，若期间有请求超出接口预算或出现 N+1 模式，该测试判定为失败
+- fixture assert_max_queries：在测试中直接限定一段代码的查询数
+
+      def test_timeline(client, assert_max_queries):
+          with assert_max_queries(4):
+              client.get("/api/patients/P001/timeline")
+"""
+import pytest
+from app.utils import query_budget
+
+
+def pytest_configure(config):
+    if query_budget.QUERY_BUDGET_MODE != "fail":
+        raise pytest.UsageError(
+            "pytest_query_budget requires QUERY_BUDGET_MODE=fail in the environment "
+            f"(got {query_budget.QUERY_BUDGET_MODE!r}); budgets would not be enforced"
+        )
+
+
+@pytest.fixture(autouse=True)
+def _query_budget_guard():
+    query_budget.pop_violations()
+    yield
+    violations = query_budget.pop_violations()
+    if violations:
+        pytest.fail("Query budget exceeded:\n  " + "\n  ".join(violations), pytrace=False)
+
+
+@pytest.fixture
+def assert_max_queries():
+    return query_budget.assert_max_queries
+
+
+@pytest.fixture
+def count_queries():
+    return query_budget.count_queries
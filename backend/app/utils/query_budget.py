@@ -0,0 +1,177 @@
+import os
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from flask import request, current_app
+
+from app.utils.slow_query import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+# 查询预算：统计单个请求内执行的 SQL 条数与同一语句形状 (归一化 SQL) 的重复次数，
+# 超出接口声明的预算或出现 N+1 模式时告警 (warn，预发环境) 或记为失败 (fail，测试环境)。
+# 生产环境默认 off：不注册钩子，游标包装中也不做任何统计
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off").lower()     # off / warn / fail
+QUERY_TRACKING = QUERY_BUDGET_MODE in ("warn", "fail")
+# 同一语句形状在一个请求内执行超过该次数视为 N+1 嫌疑 (接口可通过 max_repeats 单独放宽)
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", 5))
+
+# 不需要声明预算的端点 (Flask 内置静态文件)
+EXEMPT_ENDPOINTS = {'static'}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """超出查询预算 (assert_max_queries 抛出；pytest 插件据此判定测试失败)"""
+
+
+def query_budget(max_queries, max_repeats=None):
+    """
+    声明接口在最坏路径 (缓存未命中) 下允许执行的 SQL 条数，放在 @xxx_bp.route 之下：
+
+        @record_bp.route('/api/records', methods=['GET'])
+        @query_budget(1)
+        def get_records(): ...
+
+    只在视图函数上记录属性，不包装调用，对请求没有额外开销。
+    max_repeats：同一语句形状允许的重复次数，默认 QUERY_REPEAT_LIMIT (例如按药品逐条扣减库存)
+    """
+    def decorator(view):
+        view.query_budget = (max_queries, max_repeats)
+        return view
+    return decorator
+
+
+# ================= 计数 =================
+class QueryCounter:
+    def __init__(self, capture=False):
+        self.total = 0
+        self.shapes = Counter()
+        # capture=True 时同时保留每条语句及其参数 (执行计划检查等离线工具使用)
+        self.statements = [] if capture else None
+
+    def add(self, sql, params=None):
+        self.total += 1
+        if isinstance(sql, (bytes, bytearray)):
+            sql = sql.decode("utf-8", "replace")
+        self.shapes[normalize_sql(sql)] += 1
+        if self.statements is not None:
+            self.statements.append((sql, params))
+
+    def check(self, max_queries, max_repeats=None):
+        """返回违规说明列表，为空表示未超出预算"""
+        limit = QUERY_REPEAT_LIMIT if max_repeats is None else max_repeats
+        problems = []
+        if max_queries is not None and self.total > max_queries:
+            problems.append(f"executed {self.total} queries, budget is {max_queries}")
+        for shape, count in self.shapes.most_common():
+            if count <= limit:
+                break
+            problems.append(f"possible N+1: {count}x {shape[:300]}")
+        return problems
+
+
+# 线程局部的计数器栈：请求计数器与测试中的 assert_max_queries 可以嵌套，同时计数
+_local = threading.local()
+
+
+def _counters():
+    counters = getattr(_local, "counters", None)
+    if counters is None:
+        counters = _local.counters = []
+    return counters
+
+
+def note_query(sql, params=None):
+    """由 db.py 的游标包装在每次 execute / executemany 时调用 (仅 QUERY_TRACKING 开启时)"""
+    for counter in getattr(_local, "counters", ()):
+        counter.add(sql, params)
+
+
+@contextmanager
+def count_queries(capture=False):
+    """统计代码块内执行的 SQL：with count_queries() as counter: ...; counter.total"""
+    counter = QueryCounter(capture)
+    _counters().append(counter)
+    try:
+        yield counter
+    finally:
+        _counters().remove(counter)
+
+
+@contextmanager
+def assert_max_queries(max_queries, max_repeats=None):
+    """测试辅助：代码块内的 SQL 条数超过 max_queries 或出现 N+1 模式时抛出 QueryBudgetExceeded"""
+    with count_queries() as counter:
+        yield counter
+    problems = counter.check(max_queries, max_repeats)
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems))
+
+
+# ================= 违规记录 (供 pytest 插件读取) =================
+_violations = []
+_violations_lock = threading.Lock()
+
+
+def pop_violations():
+    with _violations_lock:
+        violations = list(_violations)
+        _violations.clear()
+    return violations
+
+
+# ================= 请求钩子 =================
+def missing_budgets(app):
+    """未声明查询预算的端点"""
+    return sorted(
+        endpoint for endpoint, view in app.view_functions.items()
+        if endpoint not in EXEMPT_ENDPOINTS and not hasattr(view, 'query_budget')
+    )
+
+
+def init_query_budget(app):
+    """在 create_app 末尾调用 (所有路由注册之后)；QUERY_BUDGET_MODE=off 时什么也不做"""
+    if not QUERY_TRACKING:
+        return
+
+    missing = missing_budgets(app)
+    if missing:
+        message = f"[QUERY BUDGET] Endpoints without a declared query budget: {', '.join(missing)}"
+        if QUERY_BUDGET_MODE == 'fail':
+            raise RuntimeError(message)
+        logger.warning(message)
+
+    @app.before_request
+    def start_query_counter():
+        counter = QueryCounter()
+        _counters().append(counter)
+        request.query_counter = counter
+
+    @app.after_request
+    def check_query_budget(response):
+        counter = getattr(request, 'query_counter', None)
+        if counter is None:
+            return response
+        response.headers['X-Query-Count'] = str(counter.total)
+
+        view = current_app.view_functions.get(request.endpoint)
+        max_queries, max_repeats = getattr(view, 'query_budget', (None, None))
+        problems = counter.check(max_queries, max_repeats)
+        if problems:
+            summary = f"{request.method} {request.path} ({request.endpoint}): " + "; ".join(problems)
+            response.headers['X-Query-Budget-Violation'] = str(len(problems))
+            if QUERY_BUDGET_MODE == 'fail':
+                logger.error(f"[QUERY BUDGET] {summary}")
+                with _violations_lock:
+                    _violations.append(summary)
+            else:
+                logger.warning(f"[QUERY BUDGET] {summary}")
+        return response
+
+    @app.teardown_request
+    def stop_query_counter(exc):
+        # teardown 总会执行 (包括未处理的异常)，保证计数器出栈
+        counter = getattr(request, 'query_counter', None)
+        if counter is not None and counter in _counters():
+            _counters().remove(counter)
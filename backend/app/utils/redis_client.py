@@ -1,13 +1,102 @@
 import redis
 import os
+from app.utils.serialization import dumps, loads
+from app.utils.metrics import timed
+import hashlib
 
 # 从环境变量获取 Redis 配置
 redis_host = os.getenv('REDIS_HOST', 'localhost')
 redis_port = int(os.getenv('REDIS_PORT', 6379)) 
 redis_db = int(os.getenv('REDIS_DB', 0))
 
+
+class TimedPipeline(redis.client.Pipeline):
+    """pipeline 的一次往返 (execute) 计入当前请求的 cache 阶段"""
+
+    def execute(self, *args, **kwargs):
+        with timed('cache'):
+            return super().execute(*args, **kwargs)
+
+
+class TimedRedis(redis.StrictRedis):
+    """每条 Redis 命令的耗时计入当前请求的 cache 阶段 (见 app/utils/metrics.py)"""
+
+    def execute_command(self, *args, **options):
+        with timed('cache'):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
 # 创建 Redis 连接对象
-redis_client = redis.StrictRedis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True)
+redis_client = TimedRedis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True)
+# 二进制连接 (不解码)：用于存取压缩后的响应体等非 UTF-8 数据
+redis_binary_client = TimedRedis(host=redis_host, port=redis_port, db=redis_db, decode_responses=False)
 
 def get_redis_client():
     return redis_client
+
+
+def fetch_many_cached(ids, key_func, loader, ex):
+    """
+    批量读取按 ID 缓存的条目：
+    1. 一次 MGET 读取所有 ID 的缓存
+    2. 未命中的 ID 交给 loader(miss_ids) 一次性查库，返回 {id: data}
+    3. 通过 pipeline 回填缓存
+    返回 (按 ids 顺序排列的数据列表, 缓存命中数)，数据库中不存在的 ID 直接跳过
+    """
+    if not ids:
+        return [], 0
+
+    cached = redis_client.mget([key_func(_id) for _id in ids])
+
+    result = {}
+    misses = []
+    for _id, raw in zip(ids, cached):
+        if raw:
+            try:
+                result[_id] = loads(raw)
+                continue
+            except ValueError:
+                pass
+        misses.append(_id)
+
+    if misses:
+        loaded = loader(misses)
+        if loaded:
+            pipe = redis_client.pipeline(transaction=False)
+            for _id, data in loaded.items():
+                pipe.set(key_func(_id), dumps(data), ex=ex)
+            pipe.execute()
+            result.update(loaded)
+
+    return [result[_id] for _id in ids if _id in result], len(ids) - len(misses)
+
+
+# --- 带 ETag 的 JSON 缓存 ---
+# 缓存体与其 ETag 分别存于 key 与 key:etag，两者 TTL 相同；
+# 命中时直接返回序列化好的字符串，比对 If-None-Match 无需反序列化；
+# 压缩后的变体按 ETag 另存 (见 app/utils/compression.py)，同一缓存体只压缩一次
+def make_etag(body):
+    """强 ETag：缓存体内容的摘要"""
+    return '"' + hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest() + '"'
+
+
+def get_cached_json(cache_key):
+    """一次 MGET 读取缓存体及其 ETag，未命中返回 None，命中返回 (body, etag)"""
+    body, etag = redis_client.mget(cache_key, f"{cache_key}:etag")
+    if not body:
+        return None
+    return body, etag or make_etag(body)
+
+
+def cache_json(cache_key, data, ex):
+    """序列化并写入缓存 (连同 ETag)，返回 (body, etag) 供响应直接使用"""
+    body = dumps(data)
+    etag = make_etag(body)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.set(cache_key, body, ex=ex)
+    pipe.set(f"{cache_key}:etag", etag, ex=ex)
+    pipe.execute()
+    return body, etag
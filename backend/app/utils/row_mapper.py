@@ -0,0 +1,71 @@
+import threading
+
+
+class RowMapper:
+    """
+    声明式行映射：查询结果列 -> 前端 JSON 字段 (驼峰命名)。
+
+    每个查询在模块级声明一次映射，游标使用默认的元组游标 (由驱动的 C 扩展构造行)，
+    不再先构造 dictionary=True 的行字典、再在循环里构造第二个驼峰字典。
+
+        RECORD_MAPPER = RowMapper(
+            id="id",
+            patientId="patient_id",
+            isVip=("is_vip", bool),                 # (列名, 转换函数)
+        )
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        data = RECORD_MAPPER.fetch_all(cursor)
+
+    同一列可以映射到多个字段。首次遇到某种列顺序时按列下标生成一个映射函数
+    (字典字面量 + 下标访问) 并缓存，之后每次查询直接复用。
+    """
+
+    def __init__(self, **fields):
+        self.fields = []
+        for key, spec in fields.items():
+            column, converter = (spec, None) if isinstance(spec, str) else spec
+            self.fields.append((key, column, converter))
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def compile(self, column_names):
+        """按结果集的列顺序生成映射函数 rows -> [dict, ...]"""
+        index = {name: i for i, name in enumerate(column_names)}
+        missing = list(dict.fromkeys(column for _, column, _ in self.fields if column not in index))
+        if missing:
+            raise KeyError(f"RowMapper: columns not in result set: {', '.join(missing)}")
+
+        namespace = {}
+        items = []
+        for n, (key, column, converter) in enumerate(self.fields):
+            access = f"row[{index[column]}]"
+            if converter:
+                namespace[f"_conv{n}"] = converter
+                access = f"_conv{n}({access})"
+            items.append(f"{key!r}: {access}")
+
+        source = "def map_rows(rows):\n    return [{" + ", ".join(items) + "} for row in rows]\n"
+        exec(compile(source, f"<RowMapper {', '.join(column_names)}>", "exec"), namespace)
+        return namespace["map_rows"]
+
+    def map_rows(self, column_names, rows):
+        func = self._compiled.get(column_names)
+        if func is None:
+            with self._lock:
+                func = self._compiled.get(column_names)
+                if func is None:
+                    func = self._compiled[column_names] = self.compile(column_names)
+        return func(rows)
+
+    def fetch_all(self, cursor):
+        """读取元组游标的全部结果并映射"""
+        rows = cursor.fetchall()
+        return self.map_rows(tuple(cursor.column_names), rows)
+
+    def fetch_one(self, cursor):
+        """读取一行并映射，没有结果返回 None"""
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return self.map_rows(tuple(cursor.column_names), [row])[0]
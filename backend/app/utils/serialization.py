@@ -0,0 +1,84 @@
+import json
+import datetime
+from decimal import Decimal
+from flask.json.provider import JSONProvider
+from app.utils.metrics import timed
+
+try:  # orjson 为首选序列化器，未安装时退回标准库 json (输出格式相同)
+    import orjson
+except ImportError:
+    orjson = None
+
+# 数据库返回值的统一编码规则，接口响应与 Redis 缓存共用：
+#   DECIMAL  -> float                      (例如价格 12.50 -> 12.5)
+#   DATETIME -> "YYYY-MM-DD HH:MM:SS"
+#   DATE     -> "YYYY-MM-DD"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def encode_default(obj):
+    """序列化器无法原生处理的类型，蓝图中不再需要逐行转换"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, datetime.datetime):
+        return obj.strftime(DATETIME_FORMAT)
+    if isinstance(obj, datetime.date):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def iso_datetime(value):
+    """保持 ISO-8601 ("YYYY-MM-DDTHH:MM:SS") 输出的字段使用，例如多模态数据的 createdAt (前端以 new Date() 解析)"""
+    return value.isoformat() if value is not None else None
+
+
+if orjson:
+    # 日期类型交给 encode_default 处理，保证两种实现输出一致；允许非字符串键 (与标准库行为一致)
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def _dumps_bytes(obj):
+        return orjson.dumps(obj, default=encode_default, option=ORJSON_OPTIONS)
+
+    _loads = orjson.loads
+else:
+    def _dumps_bytes(obj):
+        return json.dumps(obj, default=encode_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    _loads = json.loads
+
+
+# 对外接口：耗时计入当前请求的 serialization 阶段 (见 app/utils/metrics.py)
+def dumps_bytes(obj):
+    with timed('serialization'):
+        return _dumps_bytes(obj)
+
+
+def dumps(obj):
+    with timed('serialization'):
+        return _dumps_bytes(obj).decode("utf-8")
+
+
+def loads(s):
+    with timed('serialization'):
+        return _loads(s)
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    Flask JSON 提供者：jsonify / 返回 dict 时使用与缓存相同的编码规则，
+    响应体直接以 bytes 构造，省去一次 str 编解码
+    """
+
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
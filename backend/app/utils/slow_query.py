@@ -0,0 +1,220 @@
+import os
+import re
+import time
+import json
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from flask import has_app_context, has_request_context, current_app, request
+
+logger = logging.getLogger(__name__)
+
+# 慢查询日志：单条 SQL (execute + 读取结果) 超过阈值时记录归一化 SQL、参数指纹、行数与调用接口，
+# 并按归一化 SQL 在进程内聚合；管理员报表 (/api/admin/slow-queries) 合并所有 worker 的聚合结果
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+SLOW_QUERY_SECONDS = SLOW_QUERY_MS / 1000 if SLOW_QUERY_MS > 0 else float("inf")   # <= 0 表示关闭
+# 每个 worker 最多跟踪的不同语句数，超出时淘汰累计耗时最少的一条
+SLOW_QUERY_TOP = int(os.getenv("SLOW_QUERY_TOP", 200))
+# 捕获 EXPLAIN FORMAT=JSON：1 开启 / 0 关闭 / auto (默认) 仅在 Flask debug 模式下开启
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "auto").lower()
+
+EXPLAINABLE = ("select", "with", "update", "delete")
+
+
+# ================= 归一化与指纹 =================
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\1)*", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """字面量与占位符统一为 ?，IN / VALUES 列表折叠，空白压缩；同一条 SQL 的不同参数归为一类"""
+    text = _STRING_LITERAL.sub("?", sql)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _IN_LIST.sub("IN (?+)", text)
+    text = _VALUES_LIST.sub(r"VALUES \1+", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def sql_digest(normalized):
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def params_fingerprint(params):
+    """参数只记录摘要 (不落明文，避免患者信息进入日志)，相同参数得到相同指纹，便于复现"""
+    if not params:
+        return "-"
+    return hashlib.blake2b(repr(params).encode("utf-8"), digest_size=6).hexdigest()
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or "unmatched"
+    return "background"
+
+
+def _explain_enabled():
+    if SLOW_QUERY_EXPLAIN == "auto":
+        return has_app_context() and current_app.debug
+    return SLOW_QUERY_EXPLAIN == "1"
+
+
+# ================= EXPLAIN =================
+def summarize_plan(plan):
+    """
+    从 EXPLAIN FORMAT=JSON 的结果中提取需要关注的信号：
+    全表扫描 (access_type = ALL) 的表、filesort、临时表
+    """
+    flags = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            table = node.get("table_name")
+            if table and node.get("access_type") == "ALL":
+                flags.append(f"full_scan:{table}")
+            if node.get("using_filesort"):
+                flags.append("filesort")
+            if node.get("using_temporary_table"):
+                flags.append("temporary")
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return list(dict.fromkeys(flags))
+
+
+def capture_explain(sql, params):
+    """
+    在单独的池化连接上执行 EXPLAIN FORMAT=JSON (原连接上可能还有未读完的结果集)，
+    返回解析后的执行计划；连接池耗尽或语句不支持 EXPLAIN 时返回 None
+    """
+    if not sql.lstrip().lower().startswith(EXPLAINABLE):
+        return None
+
+    from app.utils.db import pool  # 避免循环导入
+    from app.utils.metrics import timed
+
+    if not pool:
+        return None
+    conn = None
+    cursor = None
+    try:
+        with timed('db'):
+            conn = pool.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"EXPLAIN FORMAT=JSON {sql}", params or ())
+            row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        logger.warning(f"[SLOW QUERY] EXPLAIN failed: {e}")
+        return None
+    finally:
+        if cursor: cursor.close()
+        if conn:
+            conn.rollback()
+            conn.close()
+
+
+# ================= 进程内聚合 =================
+class SlowQueryLog:
+    """按归一化 SQL 聚合的慢查询统计 (单个 worker)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql, params, elapsed, rowcount):
+        normalized = normalize_sql(sql)
+        digest = sql_digest(normalized)
+        endpoint = _endpoint()
+        fingerprint = params_fingerprint(params)
+        elapsed_ms = elapsed * 1000
+
+        with self._lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                if len(self.entries) >= self.max_entries:
+                    coldest = min(self.entries, key=lambda key: self.entries[key]["total_ms"])
+                    del self.entries[coldest]
+                entry = self.entries[digest] = {
+                    "digest": digest, "sql": normalized, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "max_rows": 0, "endpoints": {}, "last_params": None, "last_seen": None,
+                    "explain": None, "plan_flags": [],
+                }
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["max_rows"] = max(entry["max_rows"], rowcount)
+            entry["endpoints"][endpoint] = entry["endpoints"].get(endpoint, 0) + 1
+            entry["last_params"] = fingerprint
+            entry["last_seen"] = time.time()
+            need_explain = entry["explain"] is None
+
+        # 同一条语句每个 worker 只捕获一次执行计划
+        if need_explain and _explain_enabled():
+            plan = capture_explain(sql, params)
+            if plan is not None:
+                flags = summarize_plan(plan)
+                with self._lock:
+                    entry["explain"] = plan
+                    entry["plan_flags"] = flags
+
+        logger.warning(
+            f"[SLOW QUERY] {elapsed_ms:.0f}ms rows={rowcount} endpoint={endpoint} "
+            f"params=#{fingerprint} digest={digest} sql={normalized[:500]}"
+            + (f" plan={','.join(entry['plan_flags'])}" if entry["plan_flags"] else "")
+        )
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(entry, endpoints=dict(entry["endpoints"])) for entry in self.entries.values()]
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_TOP)
+
+
+def record_slow_query(sql, params, elapsed, rowcount):
+    """由 db.py 的游标包装在语句结束时调用 (仅当耗时超过阈值)"""
+    try:
+        if isinstance(sql, (bytes, bytearray)):
+            sql = sql.decode("utf-8", "replace")
+        slow_query_log.record(sql, params, elapsed, max(rowcount or 0, 0))
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to record slow query: {e}")
+
+
+def merge_slow_queries(snapshots):
+    """合并各 worker 快照中的慢查询统计"""
+    merged = {}
+    for snap in snapshots:
+        for entry in snap.get("slow_queries", []):
+            total = merged.get(entry["digest"])
+            if total is None:
+                merged[entry["digest"]] = dict(entry, endpoints=dict(entry["endpoints"]))
+                continue
+            total["count"] += entry["count"]
+            total["total_ms"] += entry["total_ms"]
+            total["max_ms"] = max(total["max_ms"], entry["max_ms"])
+            total["max_rows"] = max(total["max_rows"], entry["max_rows"])
+            for endpoint, count in entry["endpoints"].items():
+                total["endpoints"][endpoint] = total["endpoints"].get(endpoint, 0) + count
+            if (entry["last_seen"] or 0) > (total["last_seen"] or 0):
+                total["last_seen"] = entry["last_seen"]
+                total["last_params"] = entry["last_params"]
+            if total["explain"] is None and entry["explain"] is not None:
+                total["explain"] = entry["explain"]
+                total["plan_flags"] = entry["plan_flags"]
+
+    for entry in merged.values():
+        entry["avg_ms"] = entry["total_ms"] / entry["count"] if entry["count"] else 0.0
+    return list(merged.values())
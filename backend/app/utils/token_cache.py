@@ -0,0 +1,131 @@
+# --- START OF FILE app/utils/token_cache.py ---
+import os
+import time
+import hmac
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# JWT 校验缓存：同一页面短时间内会携带同一个 Token 发起十几次请求，
+# 解码结果按 Token 摘要缓存在当前 worker 进程内，直到 Token 的 exp 为止，命中时跳过 HMAC 校验与解码
+# JWT_CACHE_SIZE=0 表示关闭缓存
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", 1024))
+# 吊销列表同步间隔 (秒)：吊销在所有 worker 中最迟于该间隔后生效
+JWT_REVOCATION_POLL = float(os.getenv("JWT_REVOCATION_POLL", 5))
+
+# 吊销列表：Redis 有序集合，成员为 Token 摘要 (hex)，分数为 Token 的 exp，过期成员定期清理
+REVOKED_KEY = "auth:revoked"
+
+
+def token_digest(token):
+    """Token 的 SHA-256 摘要，缓存与吊销列表都只保存摘要，不保存 Token 原文"""
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class TokenCache:
+    """
+    进程内有界 LRU：digest[:16] -> (完整 digest, payload, exp)。
+    查找命中后再用 hmac.compare_digest 比对完整摘要，比对耗时与内容无关。
+    """
+
+    def __init__(self, max_size=JWT_CACHE_SIZE, poll_interval=JWT_REVOCATION_POLL):
+        self.max_size = max_size
+        self.poll_interval = poll_interval
+        self._entries = OrderedDict()
+        self._revoked = {}          # 完整 digest -> exp
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, digest):
+        """返回缓存的 payload；未命中、已过期或已吊销返回 None"""
+        if not self.enabled:
+            return None
+        self._sync_revocations()
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest[:16])
+            if entry is None:
+                return None
+            full_digest, payload, exp = entry
+            if not hmac.compare_digest(full_digest, digest) or exp <= now:
+                del self._entries[digest[:16]]
+                return None
+            self._entries.move_to_end(digest[:16])
+            return payload
+
+    def put(self, digest, payload):
+        """缓存新解码的 payload；没有 exp 的 Token 不缓存"""
+        exp = payload.get("exp")
+        if not self.enabled or not isinstance(exp, (int, float)):
+            return
+        with self._lock:
+            self._entries[digest[:16]] = (digest, payload, float(exp))
+            self._entries.move_to_end(digest[:16])
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, digest):
+        self._sync_revocations()
+        with self._lock:
+            return any(hmac.compare_digest(digest, revoked) for revoked in self._revoked)
+
+    def revoke(self, digest, exp):
+        """吊销 Token：写入 Redis 吊销列表 (其它 worker 在下次同步时生效)，并立即从本进程缓存中移除"""
+        with self._lock:
+            self._revoked[digest] = float(exp)
+            self._entries.pop(digest[:16], None)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.zadd(REVOKED_KEY, {digest.hex(): float(exp)})
+            pipe.zremrangebyscore(REVOKED_KEY, "-inf", time.time())
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to publish token revocation: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._revoked.clear()
+            self._next_poll = 0.0
+
+    def _sync_revocations(self):
+        """按固定间隔从 Redis 拉取未过期的吊销摘要，并清除对应缓存项"""
+        now = time.time()
+        if now < self._next_poll:
+            return
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.poll_interval
+
+        try:
+            members = redis_client.zrangebyscore(REVOKED_KEY, now, "+inf", withscores=True)
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to sync token revocations: {e}")
+            return
+
+        revoked = {bytes.fromhex(member): exp for member, exp in members}
+        with self._lock:
+            # 保留本进程刚吊销、尚未同步到 Redis 的条目
+            for digest, exp in self._revoked.items():
+                if exp > now:
+                    revoked.setdefault(digest, exp)
+            self._revoked = revoked
+            for digest in revoked:
+                self._entries.pop(digest[:16], None)
+
+
+# 每个 worker 进程一个实例
+token_cache = TokenCache()
+
+# --- END OF FILE app/utils/token_cache.py ---
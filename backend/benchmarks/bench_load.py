@@ -0,0 +1,262 @@
+"""
+混合流量负载基准测试 (离线，可在无容器环境运行)
+
+启动本地 mysqld / redis-server (或 fakeredis)，按规模系数造数后在进程内启动 Flask 应用，
+用 N 个并发线程按权重驱动四类真实场景：
+    login      : 医生 / 患者登录
+    hall       : 医生坐诊页轮询本科室挂号队列 (GET /api/appointments?doctor_id=)
+    consult    : 医生接诊提交病历 + 处方并完成挂号 (POST /api/records, PUT /api/appointments/<id>)
+    dashboard  : 管理员首页与统计页 (患者数、病历、医生、科室、药品、桑基图、月度统计、分时统计)
+输出 JSON 报告：总吞吐、各场景与各接口的 p50 / p95 / p99 延迟、状态码分布，
+以及每个接口每次请求执行的 SQL 条数 (来自 X-Query-Count，见 app/utils/query_budget.py)，用于回归对比。
+
+用法 (在 backend 目录下，需本机安装 mysqld 与 redis-server，或改用 --redis fake / --mysql external)：
+    python benchmarks/bench_load.py --scale 0.1 --concurrency 16 --duration 30 --output load.json
+    python benchmarks/bench_load.py --mysql external --reseed --redis fake --mix hall=80,consult=20
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import platform
+import threading
+from collections import deque
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# X-Query-Count 响应头需要开启查询计数 (须在导入 app 之前设置)
+os.environ.setdefault("QUERY_BUDGET_MODE", "warn")
+
+from harness import (  # noqa: E402
+    add_service_args, start_services, git_revision, write_report,
+    BenchClient, Recorder, latency_summary,
+)
+
+DEFAULT_MIX = "hall=60,dashboard=15,consult=15,login=10"
+PASSWORD = "123456"     # generate_data.py 为医生与患者生成的默认密码
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="混合流量负载基准测试")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发线程数")
+    parser.add_argument("--duration", type=float, default=30, help="计入统计的压测时长 (秒)")
+    parser.add_argument("--warmup", type=float, default=5, help="预热时长 (秒)，不计入统计")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"场景权重 (默认 {DEFAULT_MIX})")
+    parser.add_argument("--output", default=None, help="JSON 报告路径 (默认打印到标准输出)")
+    add_service_args(parser)
+    args = parser.parse_args()
+
+    mix = {}
+    for part in args.mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    args.mix = mix
+    return args
+
+
+# ================= 场景 =================
+class Context:
+    """压测线程共享的数据：医生 / 患者 ID，各科室待接诊的挂号队列"""
+
+    def __init__(self):
+        from app.utils.db import get_db_connection
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id, department_id FROM doctors ORDER BY id")
+            self.doctors = cursor.fetchall()
+            cursor.execute("SELECT id FROM patients ORDER BY id")
+            self.patients = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT id FROM medicines ORDER BY id")
+            self.medicines = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT id, patient_id, department_id FROM appointments "
+                           "WHERE status = 'pending' ORDER BY create_time")
+            pending = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+        if not (self.doctors and self.patients and self.medicines):
+            raise SystemExit("❌ 数据库中缺少医生/患者/药品数据")
+
+        self.pending = {}
+        for apt_id, patient_id, dept_id in pending:
+            self.pending.setdefault(dept_id, deque()).append((apt_id, patient_id))
+        self.lock = threading.Lock()
+        self.starved = 0    # 科室没有待接诊挂号、consult 退化为 hall 的次数
+
+    def next_pending(self, dept_id):
+        with self.lock:
+            queue = self.pending.get(dept_id)
+            if queue:
+                return queue.popleft()
+            self.starved += 1
+            return None
+
+
+class Session:
+    """一个压测线程：固定扮演一名医生，另持有一个管理员客户端与一个匿名客户端"""
+
+    def __init__(self, app, recorder, ctx, worker_id, seed):
+        self.ctx = ctx
+        self.rng = random.Random(seed * 1000 + worker_id)
+        self.worker_id = worker_id
+        self.counter = 0
+        self.doctor_id, self.dept_id = ctx.doctors[worker_id % len(ctx.doctors)]
+        self.doctor = BenchClient(app, recorder)
+        self.doctor.login(self.doctor_id, PASSWORD, "doctor")
+        self.admin = BenchClient(app, recorder)
+        self.admin.login("admin", "admin123", "admin")
+        self.anonymous = BenchClient(app, recorder)
+
+    def login(self):
+        if self.rng.random() < 0.5:
+            user_id, role = self.rng.choice(self.ctx.doctors)[0], "doctor"
+        else:
+            user_id, role = self.rng.choice(self.ctx.patients), "patient"
+        self.anonymous.post("/api/login", json={"id": user_id, "password": PASSWORD, "role": role})
+
+    def hall(self):
+        self.doctor.get(f"/api/appointments?doctor_id={self.doctor_id}", label="GET /api/appointments?doctor_id")
+
+    def consult(self):
+        pending = self.ctx.next_pending(self.dept_id)
+        if pending is None:
+            return self.hall()
+        apt_id, patient_id = pending
+        self.counter += 1
+        record_id = f"LOAD{self.worker_id:03d}{self.counter:06d}"
+        medicines = self.rng.sample(self.ctx.medicines, self.rng.randint(1, min(3, len(self.ctx.medicines))))
+        payload = {
+            "record": {
+                "id": record_id,
+                "patientId": patient_id,
+                "doctorId": self.doctor_id,
+                "diagnosis": "压测诊断",
+                "treatmentPlan": "压测治疗方案",
+                "visitDate": date.today().isoformat(),
+                "appointmentId": apt_id,
+            },
+            "details": [
+                {"id": f"{record_id}-{i}", "medicineId": medicine_id, "dosage": "遵医嘱", "usage": "口服", "days": 1}
+                for i, medicine_id in enumerate(medicines)
+            ],
+        }
+        self.doctor.post("/api/records", json=payload)
+        self.doctor.put(f"/api/appointments/{apt_id}", label="PUT /api/appointments/<id>", json={"status": "completed"})
+
+    def dashboard(self):
+        today = date.today()
+        for path in ("/api/patients/count", "/api/records", "/api/doctors", "/api/departments",
+                     "/api/medicines", "/api/stats/sankey"):
+            self.admin.get(path)
+        self.admin.get(f"/api/statistics/monthly?month={today:%Y-%m}", label="GET /api/statistics/monthly")
+        self.admin.get(f"/api/appointments/statistics?role=admin&date={today.isoformat()}",
+                       label="GET /api/appointments/statistics")
+
+
+SCENARIOS = {
+    "login": Session.login,
+    "hall": Session.hall,
+    "consult": Session.consult,
+    "dashboard": Session.dashboard,
+}
+
+
+# ================= 压测 =================
+def run_load(app, ctx, args):
+    requests = Recorder()
+    scenarios = Recorder()
+    requests.enabled = scenarios.enabled = False
+
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    sessions = [Session(app, requests, ctx, w, args.seed) for w in range(args.concurrency)]
+    stop = threading.Event()
+
+    def worker(session):
+        while not stop.is_set():
+            name = session.rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                SCENARIOS[name](session)
+                status = 200
+            except Exception as e:
+                print(f"⚠️ scenario {name} raised: {e}")
+                status = 599
+            scenarios.record(name, status, time.perf_counter() - t0, None, False)
+
+    threads = [threading.Thread(target=worker, args=(s,), daemon=True) for s in sessions]
+    for t in threads:
+        t.start()
+    print(f"🔥 Warming up for {args.warmup:.0f}s ...")
+    time.sleep(args.warmup)
+
+    requests.enabled = scenarios.enabled = True
+    t_start = time.perf_counter()
+    print(f"🚀 Measuring {args.concurrency} workers for {args.duration:.0f}s, mix {args.mix}")
+    time.sleep(args.duration)
+    requests.enabled = scenarios.enabled = False
+    elapsed = time.perf_counter() - t_start
+    stop.set()
+    for t in threads:
+        t.join()
+    return requests, scenarios, elapsed
+
+
+def main():
+    args = parse_args()
+    with start_services(args) as seeded:
+        from app import create_app
+        app = create_app()
+        ctx = Context()
+        requests, scenarios, elapsed = run_load(app, ctx, args)
+
+    endpoints = requests.report(elapsed)
+    all_latencies = [lat for entry in requests.endpoints.values() for lat in entry["latencies"]]
+    total = len(all_latencies)
+    report = {
+        "meta": {
+            "benchmark": "bench_load",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "mysql": args.mysql,
+            "redis": args.redis,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 2),
+            "warmup_s": args.warmup,
+            "mix": args.mix,
+        },
+        "seed": seeded,
+        "totals": {
+            "requests": total,
+            "errors": sum(entry["errors"] for entry in endpoints.values()),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": latency_summary(all_latencies),
+            "queries_per_request": round(
+                sum(entry["queries"]["total"] for entry in endpoints.values()) / total, 2) if total else None,
+            "budget_violations": sum(entry["budget_violations"] for entry in endpoints.values()),
+            "consult_starved": ctx.starved,
+        },
+        "scenarios": scenarios.report(elapsed),
+        "endpoints": endpoints,
+    }
+
+    totals = report["totals"]
+    print(f"   - 请求: {totals['requests']} (错误 {totals['errors']}), 吞吐 {totals['throughput_rps']} req/s")
+    print(f"   - 延迟: p50 {totals['latency_ms']['p50']}ms, p95 {totals['latency_ms']['p95']}ms, "
+          f"p99 {totals['latency_ms']['p99']}ms")
+    for label, entry in endpoints.items():
+        print(f"     {label:<45} n={entry['count']:<6} p95={entry['latency_ms']['p95']:>8}ms "
+              f"queries(avg/max)={entry['queries']['mean']}/{entry['queries']['max']}")
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
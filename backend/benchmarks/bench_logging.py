@@ -0,0 +1,125 @@
+"""
+日志管道吞吐基准测试
+
+多线程对一个空路由发起请求，路由内按真实接口的习惯输出几条 INFO 日志
+([CACHE HIT] / [DB QUERY] / [DB RESULT] / [ACTION])，比较三种配置下的 req/s：
+1. off   : 关闭日志
+2. sync  : 原先的同步 StreamHandler + FileHandler (文本格式)
+3. queue : QueueHandler -> QueueListener，JSON 格式 + 按类别采样 + 按大小轮转
+
+控制台输出写入临时文件，避免终端刷屏影响结果。不需要 MySQL / Redis。
+
+用法 (在 backend 目录下)：
+    python benchmarks/bench_logging.py --threads 8 --requests 2000
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.api.auth import generate_jwt  # noqa: E402
+from app.utils.logging_utils import setup_queue_logging  # noqa: E402
+
+bench_logger = logging.getLogger("bench")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="日志管道吞吐基准测试")
+    parser.add_argument("--threads", type=int, default=8, help="并发线程数")
+    parser.add_argument("--requests", type=int, default=2000, help="每个线程的请求数")
+    return parser.parse_args()
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    logging.disable(logging.NOTSET)
+    root.setLevel(logging.INFO)
+    return root
+
+
+def configure(mode, workdir):
+    """按模式重新配置 root logger，返回需要在测试结束后停止的 QueueListener (或 None)"""
+    root = reset_root()
+    console = open(os.path.join(workdir, f"console-{mode}.log"), "w", encoding="utf-8")
+
+    if mode == "off":
+        logging.disable(logging.CRITICAL)
+        return None, console
+
+    if mode == "sync":
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        console_handler = logging.StreamHandler(console)
+        file_handler = logging.FileHandler(os.path.join(workdir, "app-sync.log"), encoding='utf-8')
+        file_handler.setLevel(logging.WARNING)
+        for handler in (console_handler, file_handler):
+            handler.setFormatter(formatter)
+            root.addHandler(handler)
+        return None, console
+
+    listener = setup_queue_logging(root, stream=console)
+    return listener, console
+
+
+def run(app, headers, threads, requests):
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        client = app.test_client()
+        barrier.wait()
+        for _ in range(requests):
+            resp = client.get(f"/__bench/log?_t={int(time.time() * 1000)}", headers=headers)
+            assert resp.status_code == 200
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool: t.start()
+    for t in pool: t.join()
+    return threads * requests / (time.perf_counter() - t0)
+
+
+def main():
+    args = parse_args()
+    app = create_app()
+
+    @app.route('/__bench/log')
+    def bench_log():
+        bench_logger.info("[CACHE HIT] Doctor list: doctors:list:all")
+        bench_logger.info("[DB QUERY] Fetching doctors (Department: ALL)")
+        bench_logger.info("[DB RESULT] Fetched 42 doctors.")
+        bench_logger.info("[ACTION] Bench request handled")
+        return "ok"
+
+    headers = {"Authorization": f"Bearer {generate_jwt('D001', 'doctor')}"}
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # 轮转日志文件 app.log 写入临时目录
+        try:
+            results = {}
+            for mode in ("off", "sync", "queue"):
+                listener, console = configure(mode, workdir)
+                run(app, headers, args.threads, 50)  # 预热
+                results[mode] = run(app, headers, args.threads, args.requests)
+                if listener:
+                    listener.stop()
+                console.close()
+                print(f"   - {mode:<6} {results[mode]:10.1f} req/s")
+            reset_root()
+        finally:
+            os.chdir(cwd)
+
+    print(f"📊 相对关闭日志: sync {results['sync'] / results['off'] * 100:.1f}%, "
+          f"queue {results['queue'] / results['off'] * 100:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+服务端预处理语句基准测试
+
+对已注册的热点语句 (医生详情、登录查询、挂号前校验) 分别以
+文本协议 (prepared=False) 与服务端预处理语句 (prepared=True) 在同一个池化连接上各执行 N 次，比较：
+1. 客户端延迟：p50 / p95 / 平均 (微秒)
+2. 服务端耗时：performance_schema 中该连接线程的语句总耗时，MySQL 8.0.28+ 另有 CPU 时间
+   (需开启 performance_schema，测量由单独的监控连接读取，不计入被测线程)
+
+用法 (在 backend 目录下，需可用的 MySQL，连接配置同 app/utils/db.py)：
+    python benchmarks/bench_prepared_statements.py --iterations 5000
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mysql.connector  # noqa: E402
+from app.utils import db  # noqa: E402
+from app.api.auth import LOGIN_STATEMENTS  # noqa: E402
+from app.api.doctor import DOCTOR_DETAIL_STMT  # noqa: E402
+from app.api.appointment import PATIENT_ACTIVE_STMT, PENDING_APPOINTMENT_STMT  # noqa: E402
+
+# 服务端计时单位为皮秒
+PICO = 1e12
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="服务端预处理语句基准测试")
+    parser.add_argument("--iterations", type=int, default=5000, help="每条语句每种模式的执行次数")
+    return parser.parse_args()
+
+
+def sample_params(conn):
+    cursor = conn.cursor()
+    try:
+        def one(sql):
+            cursor.execute(sql)
+            return cursor.fetchone()
+
+        doctor = one("SELECT id, password, department_id FROM doctors ORDER BY id LIMIT 1")
+        patient = one("SELECT id, password FROM patients WHERE deleted_at IS NULL ORDER BY id LIMIT 1")
+    finally:
+        cursor.close()
+    conn.rollback()
+
+    if not (doctor and patient):
+        print("❌ 数据库中缺少患者/医生数据，请先运行 insert_data_python 中的脚本")
+        sys.exit(1)
+
+    return [
+        (DOCTOR_DETAIL_STMT, (doctor[0],)),
+        (LOGIN_STATEMENTS['doctor'], (doctor[0], doctor[1])),
+        (LOGIN_STATEMENTS['patient'], (patient[0], patient[1])),
+        (PATIENT_ACTIVE_STMT, (patient[0],)),
+        (PENDING_APPOINTMENT_STMT, (patient[0], doctor[2])),
+    ]
+
+
+class ServerTimer:
+    """通过独立的监控连接读取被测连接线程的语句累计耗时"""
+
+    def __init__(self, monitor, target_connection_id):
+        self.monitor = monitor
+        self.thread_id = None
+        self.has_cpu = True
+        cursor = monitor.cursor()
+        try:
+            cursor.execute(
+                "SELECT THREAD_ID FROM performance_schema.threads WHERE PROCESSLIST_ID = %s",
+                (target_connection_id,)
+            )
+            row = cursor.fetchone()
+            self.thread_id = row[0] if row else None
+        except mysql.connector.Error as err:
+            print(f"⚠️  performance_schema 不可用，只统计客户端延迟: {err}")
+        finally:
+            cursor.close()
+
+    def snapshot(self):
+        """返回 (总耗时秒, CPU 秒或 None)"""
+        if self.thread_id is None:
+            return None, None
+        cursor = self.monitor.cursor()
+        try:
+            columns = "SUM(SUM_TIMER_WAIT), SUM(SUM_CPU_TIME)" if self.has_cpu else "SUM(SUM_TIMER_WAIT), NULL"
+            try:
+                cursor.execute(
+                    f"SELECT {columns} FROM performance_schema.events_statements_summary_by_thread_by_event_name "
+                    "WHERE THREAD_ID = %s", (self.thread_id,)
+                )
+            except mysql.connector.Error:
+                # MySQL 8.0.28 之前没有 SUM_CPU_TIME 列
+                self.has_cpu = False
+                return self.snapshot()
+            wait, cpu = cursor.fetchone()
+            return (int(wait or 0) / PICO, None if cpu is None else int(cpu) / PICO)
+        finally:
+            cursor.close()
+            self.monitor.rollback()
+
+
+def run_mode(conn, timer, statement, params, iterations):
+    for _ in range(50):  # 预热 (预处理模式下同时完成 PREPARE)
+        db.query_all(conn, statement, params)
+
+    wait0, cpu0 = timer.snapshot()
+    latencies = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        db.query_all(conn, statement, params)
+        latencies.append(time.perf_counter() - t0)
+    wait1, cpu1 = timer.snapshot()
+    conn.rollback()
+
+    latencies.sort()
+    server_wait = None if wait0 is None else (wait1 - wait0) / iterations
+    server_cpu = None if cpu0 is None or cpu1 is None else (cpu1 - cpu0) / iterations
+    return {
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95)],
+        "mean": statistics.fmean(latencies),
+        "server": server_wait,
+        "cpu": server_cpu,
+    }
+
+
+def fmt_us(value):
+    return "      -" if value is None else f"{value * 1e6:7.1f}"
+
+
+def main():
+    args = parse_args()
+    if not db.PREPARED_STATEMENTS:
+        print("⚠️  DB_PREPARED_STATEMENTS=0，预处理模式将退回文本协议")
+
+    conn = db.get_db_connection()
+    monitor = db.get_db_connection()
+    try:
+        cases = sample_params(conn)
+        timer = ServerTimer(monitor, conn.connection_id)
+
+        print(f"🚀 预处理语句基准 ({args.iterations} 次/语句/模式，单位: 微秒/次)")
+        print(f"   {'statement':<26}{'mode':<10}{'p50':>8}{'p95':>8}{'mean':>8}{'server':>8}{'cpu':>8}")
+        for statement, params in cases:
+            original = statement.prepared
+            results = {}
+            try:
+                for mode, prepared in (("text", False), ("prepared", True)):
+                    statement.prepared = prepared
+                    results[mode] = run_mode(conn, timer, statement, params, args.iterations)
+                    r = results[mode]
+                    print(f"   {statement.name:<26}{mode:<10}{fmt_us(r['p50'])} {fmt_us(r['p95'])} "
+                          f"{fmt_us(r['mean'])} {fmt_us(r['server'])} {fmt_us(r['cpu'])}")
+            finally:
+                statement.prepared = original
+            saved = 1 - results["prepared"]["mean"] / results["text"]["mean"]
+            print(f"   {'':<26}{'delta':<10} 平均延迟降低 {saved * 100:.1f}%")
+
+        print(f"📊 语句指标: {db.get_statement_metrics()}")
+    finally:
+        conn.rollback()
+        conn.close()
+        monitor.close()
+
+
+if __name__ == '__main__':
+    main()
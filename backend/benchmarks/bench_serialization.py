@@ -0,0 +1,160 @@
+"""
+JSON 序列化基准测试
+
+用与大列表接口形状相同的合成数据 (/api/records、/api/appointments、/api/patients、/api/medicines)，
+比较一次 "缓存未命中" 响应中序列化部分的耗时：
+1. legacy : 逐行转换 (format_date / float / isoformat) + json.dumps 写缓存 + Flask 默认 JSON 提供者生成响应
+2. fast   : 直接使用数据库返回的 Decimal / date / datetime，serialization.dumps 写缓存，响应复用同一份缓存体
+
+不需要 MySQL / Redis。
+
+用法 (在 backend 目录下)：
+    python benchmarks/bench_serialization.py --rows 20000 --repeat 5
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from app.utils.serialization import dumps, orjson  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="JSON 序列化基准测试")
+    parser.add_argument("--rows", type=int, default=20000, help="每个列表的行数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数 (取最小值)")
+    return parser.parse_args()
+
+
+def fake_rows(n):
+    """模拟 mysql-connector (dictionary=True) 返回的行，字段类型与表结构一致"""
+    rnd = random.Random(42)
+    base_day = datetime.date(2024, 1, 1)
+    base_time = datetime.datetime(2024, 1, 1, 8, 0, 0)
+    records, appointments, patients, medicines = [], [], [], []
+    for i in range(n):
+        day = base_day + datetime.timedelta(days=i % 365)
+        records.append({
+            "id": f"R{i:07d}", "patient_id": f"P{i % 5000:06d}", "patient_name": "张三",
+            "doctor_id": f"D{i % 50:03d}", "doctor_name": "李医生",
+            "diagnosis": "上呼吸道感染", "treatment_plan": "多喝水，按时服药，三天后复诊",
+            "visit_date": day, "appointment_id": f"A{i:07d}",
+        })
+        appointments.append({
+            "appointment_id": f"A{i:07d}", "patient_id": f"P{i % 5000:06d}", "department_id": f"DEPT{i % 10:02d}",
+            "doctor_id": f"D{i % 50:03d}", "description": "发热咳嗽两天", "status": "pending",
+            "create_time": base_time + datetime.timedelta(minutes=i), "doctor_name": "李医生",
+            "department_name": "内科", "name": "张三", "phone": "13800000000", "age": 20 + i % 60,
+        })
+        patients.append({
+            "id": f"P{i:06d}", "name": "张三", "gender": "男" if i % 2 else "女", "age": 20 + i % 60,
+            "phone": "13800000000", "address": "北京市海淀区", "create_time": day, "is_vip": i % 7 == 0,
+        })
+        medicines.append({
+            "id": f"M{i:05d}", "name": "阿莫西林胶囊",
+            "price": Decimal(f"{rnd.randint(100, 99999) / 100:.2f}"),
+            "stock": rnd.randint(0, 1000), "specification": "0.25g*24粒",
+        })
+    return {"records": records, "appointments": appointments, "patients": patients, "medicines": medicines}
+
+
+def format_date(d):
+    return str(d) if d else None
+
+
+# --- 旧写法：蓝图内逐行转换 ---
+def legacy_map(name, rows):
+    if name == "records":
+        return [{
+            "id": r["id"], "patientId": r["patient_id"], "patientName": r["patient_name"],
+            "doctorId": r["doctor_id"], "doctorName": r["doctor_name"], "diagnosis": r["diagnosis"],
+            "treatmentPlan": r["treatment_plan"], "visitDate": format_date(r["visit_date"]),
+            "appointmentId": r["appointment_id"],
+        } for r in rows]
+    if name == "appointments":
+        return [{
+            "id": r["appointment_id"], "patientId": r["patient_id"], "patientName": r["name"],
+            "patientPhone": r["phone"], "age": r["age"], "departmentId": r["department_id"],
+            "departmentName": r["department_name"], "doctorId": r["doctor_id"], "doctorName": r["doctor_name"],
+            "status": r["status"], "createTime": str(r["create_time"]), "description": r["description"],
+        } for r in rows]
+    if name == "patients":
+        return [{
+            "id": r["id"], "name": r["name"], "gender": r["gender"], "age": r["age"], "phone": r["phone"],
+            "address": r["address"], "createTime": format_date(r["create_time"]), "isVip": bool(r["is_vip"]),
+        } for r in rows]
+    return [dict(r, price=float(r["price"])) for r in rows]
+
+
+# --- 新写法：直接使用数据库类型 ---
+def fast_map(name, rows):
+    if name == "records":
+        return [{
+            "id": r["id"], "patientId": r["patient_id"], "patientName": r["patient_name"],
+            "doctorId": r["doctor_id"], "doctorName": r["doctor_name"], "diagnosis": r["diagnosis"],
+            "treatmentPlan": r["treatment_plan"], "visitDate": r["visit_date"],
+            "appointmentId": r["appointment_id"],
+        } for r in rows]
+    if name == "appointments":
+        return [{
+            "id": r["appointment_id"], "patientId": r["patient_id"], "patientName": r["name"],
+            "patientPhone": r["phone"], "age": r["age"], "departmentId": r["department_id"],
+            "departmentName": r["department_name"], "doctorId": r["doctor_id"], "doctorName": r["doctor_name"],
+            "status": r["status"], "createTime": r["create_time"], "description": r["description"],
+        } for r in rows]
+    if name == "patients":
+        return [{
+            "id": r["id"], "name": r["name"], "gender": r["gender"], "age": r["age"], "phone": r["phone"],
+            "address": r["address"], "createTime": r["create_time"], "isVip": bool(r["is_vip"]),
+        } for r in rows]
+    return rows
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - t0)
+    return min(timings), result
+
+
+def main():
+    args = parse_args()
+    legacy_app = Flask("legacy")      # Flask 默认 JSON 提供者
+    datasets = fake_rows(args.rows)
+
+    print(f"🚀 序列化基准 ({args.rows} 行/列表, 取 {args.repeat} 次最小值, 序列化器: "
+          f"{'orjson ' + orjson.__version__ if orjson else 'json (未安装 orjson)'})")
+
+    for name, rows in datasets.items():
+        def legacy():
+            data = legacy_map(name, rows)
+            cached = json.dumps(data)                      # 写缓存
+            with legacy_app.app_context():
+                return cached, legacy_app.json.response(data).get_data()  # jsonify
+
+        def fast():
+            body = dumps(fast_map(name, rows))             # 写缓存，响应直接复用同一份字节
+            return body, body
+
+        legacy_time, (legacy_cache, legacy_body) = best_of(args.repeat, legacy)
+        fast_time, (fast_cache, _) = best_of(args.repeat, fast)
+
+        # 两种写法的缓存内容应语义一致
+        assert json.loads(legacy_cache) == json.loads(fast_cache), f"{name}: 输出不一致"
+
+        print(f"   - {name:<13} legacy {legacy_time * 1000:8.1f} ms   fast {fast_time * 1000:8.1f} ms   "
+              f"x{legacy_time / fast_time:5.1f}   body {len(legacy_body) / 1024:7.0f} KB -> "
+              f"{len(fast_cache.encode('utf-8')) / 1024:7.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
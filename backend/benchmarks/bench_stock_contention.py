@@ -0,0 +1,152 @@
+"""
+热点药品并发扣减库存基准测试
+
+对同一种药品并发提交病历 (POST /api/records)，统计吞吐与延迟，
+并在结束后校验：最终库存 = 初始库存 - 成功提交数 * 每单天数，且库存不为负。
+
+用法 (在 backend 目录下，需可用的 MySQL 与 Redis，连接配置同 app/utils/db.py)：
+    python benchmarks/bench_stock_contention.py --medicine M001 --workers 16 --requests 50
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.api.auth import generate_jwt  # noqa: E402
+from app.utils.db import get_db_connection  # noqa: E402
+from app.utils.flow_stats import rebuild_flow_counts  # noqa: E402
+
+RECORD_PREFIX = "BENCHSTK"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="热点药品并发扣库存基准测试")
+    parser.add_argument("--medicine", default="M001", help="热点药品 ID")
+    parser.add_argument("--workers", type=int, default=16, help="并发线程数")
+    parser.add_argument("--requests", type=int, default=50, help="每个线程提交的病历数")
+    parser.add_argument("--days", type=int, default=1, help="每张处方扣减的天数")
+    parser.add_argument("--stock", type=int, default=None, help="测试前重置的库存 (默认: 足够全部成功)")
+    return parser.parse_args()
+
+
+def fetch_one(sql, params=()):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def execute(sql, params=()):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def main():
+    args = parse_args()
+    app = create_app()
+
+    patient = fetch_one("SELECT id FROM patients ORDER BY id LIMIT 1")
+    doctor = fetch_one("SELECT id FROM doctors ORDER BY id LIMIT 1")
+    original = fetch_one("SELECT stock FROM medicines WHERE id = %s", (args.medicine,))
+    if not (patient and doctor and original):
+        print("❌ 数据库中缺少患者/医生/药品数据，请先运行 insert_data_python 中的脚本")
+        sys.exit(1)
+
+    total = args.workers * args.requests
+    initial_stock = args.stock if args.stock is not None else total * args.days
+    execute("UPDATE medicines SET stock = %s WHERE id = %s", (initial_stock, args.medicine))
+
+    token = generate_jwt(doctor[0], 'doctor')
+    headers = {"Authorization": f"Bearer {token}"}
+
+    latencies = []
+    results = {"ok": 0, "fail": 0}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(args.workers)
+
+    def worker(worker_id):
+        client = app.test_client()
+        local_lat = []
+        ok = fail = 0
+        start_barrier.wait()
+        for i in range(args.requests):
+            rec_id = f"{RECORD_PREFIX}{worker_id:03d}{i:05d}"
+            payload = {
+                "record": {
+                    "id": rec_id,
+                    "patientId": patient[0],
+                    "doctorId": doctor[0],
+                    "diagnosis": "压测",
+                    "treatmentPlan": "压测",
+                    "visitDate": time.strftime("%Y-%m-%d")
+                },
+                "details": [{
+                    "id": f"{rec_id}-0",
+                    "medicineId": args.medicine,
+                    "dosage": "遵医嘱",
+                    "usage": "口服",
+                    "days": args.days
+                }]
+            }
+            t0 = time.perf_counter()
+            resp = client.post(f"/api/records?_t={int(time.time() * 1000)}", json=payload, headers=headers)
+            local_lat.append(time.perf_counter() - t0)
+            if resp.status_code == 200:
+                ok += 1
+            else:
+                fail += 1
+        with lock:
+            latencies.extend(local_lat)
+            results["ok"] += ok
+            results["fail"] += fail
+
+    print(f"🚀 并发扣库存测试: 药品 {args.medicine}, {args.workers} 线程 x {args.requests} 单, 初始库存 {initial_stock}")
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(args.workers)]
+    t_start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - t_start
+
+    final_stock = fetch_one("SELECT stock FROM medicines WHERE id = %s", (args.medicine,))[0]
+    expected_stock = initial_stock - results["ok"] * args.days
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(f"   - 成功: {results['ok']}, 失败: {results['fail']}")
+    print(f"   - 吞吐: {total / elapsed:.1f} req/s (耗时 {elapsed:.2f}s)")
+    print(f"   - 延迟: p50 {statistics.median(latencies) * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms")
+    print(f"   - 库存: 最终 {final_stock}, 期望 {expected_stock}")
+
+    # 清理测试数据并恢复原库存 (测试病历可能关联了当日挂号，顺带重建桑基图计数)
+    execute("DELETE FROM medical_records WHERE id LIKE %s", (RECORD_PREFIX + "%",))
+    execute("UPDATE medicines SET stock = %s WHERE id = %s", (original[0], args.medicine))
+    conn = get_db_connection()
+    try:
+        rebuild_flow_counts(conn)
+    finally:
+        conn.close()
+
+    if final_stock != expected_stock or final_stock < 0:
+        print("❌ 库存不一致：存在丢失更新或超卖")
+        sys.exit(1)
+    print("✅ 库存一致，无丢失更新")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+写路径并发正确性压测
+
+在逐级增加的并发度下，对三个 "先检查后写入" 的接口同时发起写请求，结束后校验不变量：
+    stock       : 并发提交病历扣减同一热点药品库存 (库存设为需求量的一半，必然有一部分失败)
+                  -> 库存不为负；最终库存 = 初始库存 - 成功数 * 天数 (无丢失更新)；库存被用尽 (无误判失败)
+    appointment : 所有线程为同一批 (患者, 科室) 组合重复挂号
+                  -> 每个组合恰好一个待就诊挂号；其余请求返回 400 而非 500；桑基图 "挂号" 计数增量 = 成功数
+    patient     : 所有线程用同一批客户端指定的 ID 注册患者
+                  -> 每个 ID 恰好注册成功一次，其余返回 400；患者行数 = ID 数
+同时记录每个并发度下各场景的吞吐与 p50 / p95 / p99 延迟，性能改动可据此确认正确性不受影响。
+任一不变量被破坏时退出码为 1。
+
+用法 (在 backend 目录下，本地服务与造数参数同 bench_load.py)：
+    python benchmarks/bench_write_concurrency.py --levels 1,4,16,32 --output write.json
+    python benchmarks/bench_write_concurrency.py --mysql external --redis external --scenarios stock
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import platform
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import (  # noqa: E402
+    add_service_args, start_services, git_revision, write_report, fetch_all, execute,
+    BenchClient, Recorder, latency_summary,
+)
+
+PREFIX = "STR"   # 压测写入的数据 ID 前缀，结束后按前缀清理
+SCENARIOS = ("stock", "appointment", "patient")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="写路径并发正确性压测")
+    parser.add_argument("--levels", default="1,4,16,32", help="逐级测试的并发线程数")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="要运行的场景")
+    parser.add_argument("--requests", type=int, default=20, help="stock：每个线程提交的病历数")
+    parser.add_argument("--days", type=int, default=1, help="stock：每张处方扣减的天数")
+    parser.add_argument("--patients", type=int, default=5, help="appointment：参与挂号的患者数")
+    parser.add_argument("--departments", type=int, default=4, help="appointment：参与挂号的科室数")
+    parser.add_argument("--ids", type=int, default=20, help="patient：每级争抢注册的患者 ID 数")
+    parser.add_argument("--output", default=None, help="JSON 报告路径 (默认打印到标准输出)")
+    add_service_args(parser)
+    parser.set_defaults(scale=0.02)
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.levels.split(",")]
+    args.scenarios = [name.strip() for name in args.scenarios.split(",")]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def run_writers(app, token, jobs_per_worker):
+    """
+    每个线程按顺序执行自己的请求列表 (job(client) -> (key, response))，所有线程在栅栏处同时开始。
+    返回 (按 key 汇总的状态码列表, Recorder, 耗时)
+    """
+    recorder = Recorder()
+    outcomes = defaultdict(list)
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(jobs_per_worker))
+
+    def worker(jobs):
+        client = BenchClient(app, recorder)
+        client.token = token
+        local = []
+        barrier.wait()
+        for job in jobs:
+            key, resp = job(client)
+            local.append((key, resp.status_code))
+        with lock:
+            for key, status in local:
+                outcomes[key].append(status)
+
+    threads = [threading.Thread(target=worker, args=(jobs,)) for jobs in jobs_per_worker]
+    t_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes, recorder, time.perf_counter() - t_start
+
+
+def summarize(recorder, elapsed, invariants, **details):
+    latencies = [lat for entry in recorder.endpoints.values() for lat in entry["latencies"]]
+    statuses = defaultdict(int)
+    for entry in recorder.endpoints.values():
+        for status, count in entry["statuses"].items():
+            statuses[status] += count
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "statuses": dict(statuses),
+        "invariants": invariants,
+        "passed": all(invariants.values()),
+        **details,
+    }
+
+
+# ================= 场景 =================
+def run_stock(app, token, ctx, n, args):
+    medicine = ctx["medicine"]
+    total = n * args.requests
+    initial = max(args.days, total * args.days // 2)
+    execute("UPDATE medicines SET stock = %s WHERE id = %s", (initial, medicine))
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    def make_job(record_id):
+        def job(client):
+            payload = {
+                "record": {"id": record_id, "patientId": ctx["patient"], "doctorId": ctx["doctor"],
+                           "diagnosis": "并发压测", "treatmentPlan": "并发压测", "visitDate": today},
+                "details": [{"id": f"{record_id}-0", "medicineId": medicine, "dosage": "遵医嘱",
+                             "usage": "口服", "days": args.days}],
+            }
+            return record_id, client.post("/api/records", json=payload)
+        return job
+
+    jobs = [[make_job(f"{PREFIX}REC{n:03d}{w:03d}{i:05d}") for i in range(args.requests)] for w in range(n)]
+    outcomes, recorder, elapsed = run_writers(app, token, jobs)
+
+    ok = sum(1 for statuses in outcomes.values() if statuses == [200])
+    final = fetch_all("SELECT stock FROM medicines WHERE id = %s", (medicine,))[0][0]
+    (stored,) = fetch_all("SELECT COUNT(*) FROM medical_records WHERE id LIKE %s", (f"{PREFIX}REC{n:03d}%",))[0]
+    invariants = {
+        "stock_not_negative": final >= 0,
+        "no_lost_update": final == initial - ok * args.days,
+        "stock_fully_used": ok == min(total, initial // args.days),
+        "records_match_successes": stored == ok,
+    }
+    return summarize(recorder, elapsed, invariants, initial_stock=initial, final_stock=final, succeeded=ok)
+
+
+def run_appointment(app, token, ctx, n, args):
+    # 清掉上一级留下的待就诊挂号，每一级都从 "无挂号" 开始争抢
+    execute("DELETE FROM appointments WHERE id LIKE %s", (f"{PREFIX}APT%",))
+    pairs = [(patient, dept) for patient in ctx["patients"] for dept in ctx["departments"]]
+    create_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    flow_sql = ("SELECT COALESCE(SUM(count), 0) FROM sankey_flow_counts "
+                "WHERE stat_date = %s AND stage = 'registered'")
+    flow_before = int(fetch_all(flow_sql, (create_time[:10],))[0][0])
+
+    def make_job(apt_id, patient, dept):
+        def job(client):
+            payload = {"id": apt_id, "patientId": patient, "departmentId": dept,
+                       "description": "并发压测", "createTime": create_time}
+            return (patient, dept), client.post("/api/appointments", json=payload)
+        return job
+
+    jobs = []
+    for w in range(n):
+        order = list(enumerate(pairs))
+        random.Random(args.seed * 1000 + w).shuffle(order)
+        jobs.append([make_job(f"{PREFIX}APT{n:03d}{w:03d}{k:04d}", *pair) for k, pair in order])
+    outcomes, recorder, elapsed = run_writers(app, token, jobs)
+
+    pending = dict(((row[0], row[1]), row[2]) for row in fetch_all(
+        "SELECT patient_id, department_id, COUNT(*) FROM appointments "
+        "WHERE id LIKE %s AND status = 'pending' GROUP BY patient_id, department_id",
+        (f"{PREFIX}APT{n:03d}%",)))
+    ok = sum(statuses.count(200) for statuses in outcomes.values())
+    flow_after = int(fetch_all(flow_sql, (create_time[:10],))[0][0])
+    invariants = {
+        "one_pending_per_pair": all(pending.get(pair) == 1 for pair in pairs),
+        "one_success_per_pair": all(outcomes[pair].count(200) == 1 for pair in pairs),
+        "duplicates_rejected_400": all(status in (200, 400) for statuses in outcomes.values() for status in statuses),
+        "flow_count_matches": flow_after - flow_before == ok,
+    }
+    duplicated = {f"{patient}/{dept}": count for (patient, dept), count in pending.items() if count > 1}
+    return summarize(recorder, elapsed, invariants, pairs=len(pairs), succeeded=ok, duplicated_pairs=duplicated)
+
+
+def run_patient(app, token, ctx, n, args):
+    ids = [f"{PREFIX}NEW{n:03d}{k:04d}" for k in range(args.ids)]
+
+    def make_job(patient_id):
+        def job(client):
+            payload = {"id": patient_id, "name": "并发压测", "gender": "男", "age": 30,
+                       "phone": "13800000000", "address": "压测", "createTime": datetime.now().strftime("%Y-%m-%d")}
+            return patient_id, client.post("/api/patients", json=payload)
+        return job
+
+    jobs = []
+    for w in range(n):
+        order = ids[:]
+        random.Random(args.seed * 1000 + w).shuffle(order)
+        jobs.append([make_job(patient_id) for patient_id in order])
+    outcomes, recorder, elapsed = run_writers(app, token, jobs)
+
+    (stored,) = fetch_all("SELECT COUNT(*) FROM patients WHERE id LIKE %s", (f"{PREFIX}NEW{n:03d}%",))[0]
+    invariants = {
+        "one_success_per_id": all(outcomes[patient_id].count(200) == 1 for patient_id in ids),
+        "duplicates_rejected_400": all(status in (200, 400) for statuses in outcomes.values() for status in statuses),
+        "rows_match_ids": stored == len(ids),
+    }
+    return summarize(recorder, elapsed, invariants, ids=len(ids), stored=stored)
+
+
+RUNNERS = {"stock": run_stock, "appointment": run_appointment, "patient": run_patient}
+
+
+# ================= 准备与清理 =================
+def prepare(args):
+    medicine, stock = fetch_all("SELECT id, stock FROM medicines ORDER BY id LIMIT 1")[0]
+    doctor = fetch_all("SELECT id FROM doctors ORDER BY id LIMIT 1")[0][0]
+    patient = fetch_all("SELECT id FROM patients WHERE deleted_at IS NULL ORDER BY id LIMIT 1")[0][0]
+    departments = [row[0] for row in fetch_all(
+        "SELECT DISTINCT department_id FROM doctors ORDER BY department_id LIMIT %s", (args.departments,))]
+
+    # 挂号场景使用单独的患者，避免与已有待就诊挂号冲突
+    patients = [f"{PREFIX}PAT{i:04d}" for i in range(args.patients)]
+    for patient_id in patients:
+        execute("INSERT INTO patients (id, name, password, gender, age, phone, address, create_time) "
+                "VALUES (%s, '并发压测', '123456', '女', 30, '13800000000', '压测', CURDATE())", (patient_id,))
+    return {"medicine": medicine, "original_stock": stock, "doctor": doctor, "patient": patient,
+            "departments": departments, "patients": patients}
+
+
+def cleanup(ctx):
+    from app.utils.db import get_db_connection
+    from app.utils.flow_stats import rebuild_flow_counts
+
+    like = f"{PREFIX}%"
+    execute("DELETE FROM medical_records WHERE id LIKE %s", (like,))
+    execute("DELETE FROM appointments WHERE id LIKE %s", (like,))
+    execute("DELETE FROM patients WHERE id LIKE %s", (like,))
+    if ctx:
+        execute("UPDATE medicines SET stock = %s WHERE id = %s", (ctx["original_stock"], ctx["medicine"]))
+    conn = get_db_connection()
+    try:
+        rebuild_flow_counts(conn)
+    finally:
+        conn.close()
+
+
+def main():
+    args = parse_args()
+    with start_services(args) as seeded:
+        from app import create_app
+        from app.api.auth import generate_jwt
+
+        app = create_app()
+        token = generate_jwt("admin", "admin")
+        cleanup(None)   # 上次中断遗留的压测数据
+        ctx = prepare(args)
+
+        levels = []
+        try:
+            for n in args.levels:
+                level = {"concurrency": n}
+                for name in args.scenarios:
+                    result = RUNNERS[name](app, token, ctx, n, args)
+                    level[name] = result
+                    mark = "✅" if result["passed"] else "❌"
+                    failed = [key for key, ok in result["invariants"].items() if not ok]
+                    print(f"{mark} {name:<12} x{n:<3} {result['throughput_rps']:>8} req/s  "
+                          f"p95 {result['latency_ms']['p95']:>8}ms  {result['statuses']}"
+                          + (f"  violated: {', '.join(failed)}" if failed else ""))
+                levels.append(level)
+        finally:
+            cleanup(ctx)
+
+    passed = all(level[name]["passed"] for level in levels for name in args.scenarios)
+    report = {
+        "meta": {
+            "benchmark": "bench_write_concurrency",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "mysql": args.mysql,
+            "redis": args.redis,
+            "scenarios": args.scenarios,
+        },
+        "seed": seeded,
+        "passed": passed,
+        "levels": levels,
+    }
+    write_report(report, args.output)
+    if not passed:
+        print("❌ 存在被破坏的不变量：并发写入下出现超卖 / 丢失更新 / 重复挂号或重复注册")
+        sys.exit(1)
+    print("✅ 所有不变量在各并发度下均成立")
+
+
+if __name__ == '__main__':
+    main()
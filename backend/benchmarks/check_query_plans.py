@@ -0,0 +1,383 @@
+"""
+执行计划回归检查
+
+在造好数的库上逐个调用所有接口 (缓存清空，走数据库路径)，借助查询计数钩子
+(app/utils/query_budget.py 的 count_queries(capture=True)) 收集每个接口实际执行的 SQL 与参数，
+对其中的 SELECT / UPDATE / DELETE 执行 EXPLAIN，按表记录 访问类型、所选索引、估算行数、filesort / temporary，
+并与已提交的基线 (benchmarks/baselines/query_plans.json) 比较：
+
+- 大表 (appointments / medical_records / prescription_details) 上出现基线中没有的全表扫描 (type=ALL) 或 filesort -> 失败
+- 访问类型变差 (例如 ref -> range -> index -> ALL)、原来走索引现在不走索引 -> 失败
+- 估算行数超过基线的 --rows-factor 倍 (且多出 --rows-slack 行以上) -> 失败
+- 新出现 / 不再执行的语句、所选索引变化但仍走索引 -> 只提示
+
+基线中已有的大表全表扫描 (例如管理员拉取全部病历) 视为已知代价，每次运行都会列出，不判失败。
+修改 SQL 或索引后确认计划符合预期，用 --update-baseline 重新生成并随代码一起提交。
+基线文件不存在时直接失败 (退出码 1)，只有 --update-baseline 才会写基线。
+
+写接口只操作本脚本新建的 EXPL* 数据 (科室 / 医生 / 药品夹具、患者、挂号、病历、多模态)，结束后删除，
+不修改造数得到的行；基线只能在造好数的库上生成，--mysql external 未加 --reseed 时拒绝写基线。
+
+用法 (在 backend 目录下，本地服务与造数参数同 bench_load.py；基线依赖造数规模与种子，需保持一致)：
+    python benchmarks/check_query_plans.py                     # 与基线比较，失败时退出码为 1
+    python benchmarks/check_query_plans.py --update-baseline   # 重新生成基线
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 查询计数钩子仅在 QUERY_BUDGET_MODE 不为 off 时生效 (须在导入 app 之前设置)
+os.environ.setdefault("QUERY_BUDGET_MODE", "warn")
+
+from harness import add_service_args, start_services, fetch_all, execute, git_revision, BenchClient, Recorder  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "query_plans.json")
+LARGE_TABLES = ("appointments", "medical_records", "prescription_details")
+
+# 访问类型从好到差 (MySQL EXPLAIN 的 type 列)
+ACCESS_RANK = {name: rank for rank, name in enumerate((
+    "system", "const", "eq_ref", "ref", "fulltext", "ref_or_null", "index_merge",
+    "unique_subquery", "index_subquery", "range", "index", "ALL",
+))}
+EXPLAIN_ID = "EXPL"   # 写接口创建的数据 ID 前缀
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="执行计划回归检查")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="基线文件路径")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线")
+    parser.add_argument("--rows-factor", type=float, default=3.0, help="估算行数允许增长的倍数")
+    parser.add_argument("--rows-slack", type=int, default=200, help="估算行数允许的绝对增量")
+    add_service_args(parser)
+    return parser.parse_args()
+
+
+# ================= 接口调用清单 =================
+def sample_ids():
+    """从造好的数据中取各接口需要的 ID"""
+    def first(sql):
+        rows = fetch_all(sql)
+        if not rows:
+            raise SystemExit(f"❌ 造数结果为空，无法取样: {sql}")
+        return rows[0]
+
+    doctor, dept = first("SELECT id, department_id FROM doctors ORDER BY id LIMIT 1")
+    patient = first("SELECT patient_id FROM medical_records ORDER BY id LIMIT 1")[0]
+    record = first("SELECT record_id FROM prescription_details ORDER BY id LIMIT 1")[0]
+    medicine = first("SELECT id FROM medicines ORDER BY id LIMIT 1")[0]
+    day = first("SELECT LEFT(create_time, 10) FROM appointments ORDER BY create_time DESC LIMIT 1")[0]
+    return {"doctor": doctor, "dept": dept, "patient": patient, "record": record,
+            "medicine": medicine, "day": day}
+
+
+def create_fixtures():
+    """写接口 (更新 / 删除科室、医生、药品) 使用的 EXPL* 夹具，避免改动造数得到的行"""
+    dept, doctor, medicine = f"{EXPLAIN_ID}D01", f"{EXPLAIN_ID}DOC01", f"{EXPLAIN_ID}MED01"
+    cleanup_fixtures()
+    execute("INSERT INTO departments (id, name, location) VALUES (%s, '计划检查科', '计划检查')", (dept,))
+    execute("INSERT INTO doctors (id, name, password, title, specialty, phone, department_id) "
+            "VALUES (%s, '计划检查', '123456', '主治医师', '计划检查', '13800000000', %s)", (doctor, dept))
+    execute("INSERT INTO medicines (id, name, price, stock, specification) "
+            "VALUES (%s, '计划检查', 1.00, 100000, '计划检查')", (medicine,))
+    return {"fx_dept": dept, "fx_doctor": doctor, "fx_medicine": medicine}
+
+
+def cleanup_fixtures():
+    like = f"{EXPLAIN_ID}%"
+    execute("DELETE FROM prescription_details WHERE record_id LIKE %s", (like,))
+    execute("DELETE FROM medical_records WHERE id LIKE %s", (like,))
+    execute("DELETE FROM appointments WHERE id LIKE %s", (like,))
+    execute("DELETE FROM multimodal_data WHERE id LIKE %s", (like,))
+    execute("DELETE FROM patients WHERE id LIKE %s", (like,))
+    execute("DELETE FROM sankey_flow_counts WHERE department_id LIKE %s", (like,))
+    execute("DELETE FROM doctors WHERE id LIKE %s", (like,))
+    execute("DELETE FROM medicines WHERE id LIKE %s", (like,))
+    execute("DELETE FROM departments WHERE id LIKE %s", (like,))
+
+
+def request_plan(ids):
+    """
+    (方法, 路径, JSON) 列表：先覆盖所有读接口的各个查询分支，再按依赖顺序调用写接口，删除类放在最后。
+    读接口使用造数中的 ID；写接口操作的都是 EXPL* 夹具与本脚本新建的数据
+    (删除夹具科室 / 药品 / 医生会因被引用而被拒绝，但校验查询照常执行)
+    """
+    p, d, doc, med, rec, day = ids["patient"], ids["dept"], ids["doctor"], ids["medicine"], ids["record"], ids["day"]
+    fx_dept, fx_doc, fx_med = ids["fx_dept"], ids["fx_doctor"], ids["fx_medicine"]
+    new_patient, apt1, apt2 = f"{EXPLAIN_ID}P001", f"{EXPLAIN_ID}A001", f"{EXPLAIN_ID}A002"
+    rec1, rec2, mm = f"{EXPLAIN_ID}R001", f"{EXPLAIN_ID}R002", f"{EXPLAIN_ID}M001"
+
+    def record_item(record_id, appointment_id=None):
+        return {
+            "record": {"id": record_id, "patientId": new_patient, "doctorId": fx_doc, "diagnosis": "计划检查",
+                       "treatmentPlan": "计划检查", "visitDate": date.today().isoformat(),
+                       "appointmentId": appointment_id},
+            "details": [{"id": f"{record_id}-0", "medicineId": fx_med, "dosage": "遵医嘱", "usage": "口服", "days": 1}],
+        }
+
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    return [
+        # --- 读接口 ---
+        ("GET", "/api/departments", None),
+        ("GET", f"/api/departments/{d}", None),
+        ("GET", "/api/medicines", None),
+        ("GET", f"/api/medicines/{med}", None),
+        ("GET", "/api/doctors", None),
+        ("GET", f"/api/doctors/{doc}", None),
+        ("GET", "/api/patients", None),
+        ("GET", "/api/patients?query=1", None),
+        ("GET", "/api/patients?limit=20&offset=20", None),
+        ("GET", f"/api/patients/{p}/timeline", None),
+        ("GET", f"/api/patients/{p}/deletion", None),
+        ("GET", "/api/patients/count", None),
+        ("GET", "/api/patients/gender_ratio", None),
+        ("GET", "/api/patients/age_ratio", None),
+        ("GET", "/api/records", None),
+        ("GET", f"/api/records?patient_id={p}", None),
+        ("GET", f"/api/prescription_details?record_id={rec}", None),
+        ("GET", "/api/appointments", None),
+        ("GET", f"/api/appointments?patient_id={p}", None),
+        ("GET", f"/api/appointments?role=admin&date={day}", None),
+        ("GET", f"/api/appointments?doctor_id={doc}", None),
+        ("GET", f"/api/appointments/statistics?role=admin&date={day}", None),
+        ("GET", "/api/multimodal", None),
+        ("GET", f"/api/multimodal?patientId={p}", None),
+        ("GET", "/api/stats/sankey", None),
+        ("GET", f"/api/stats/sankey?start_date={day[:8]}01&end_date={day}&department_id={d}", None),
+        ("GET", f"/api/statistics/monthly?month={day[:7]}", None),
+        # --- 写接口 ---
+        ("POST", "/api/login", {"id": fx_doc, "password": "123456", "role": "doctor"}),
+        ("POST", "/api/patients", {"id": new_patient, "name": "计划检查", "gender": "男", "age": 40,
+                                   "phone": "13800000000", "address": "检查", "createTime": day}),
+        ("PUT", f"/api/patients/{new_patient}", {"name": "计划检查", "phone": "13900000000",
+                                                 "address": "检查", "age": 41}),
+        ("POST", "/api/appointments", {"id": apt1, "patientId": new_patient, "departmentId": fx_dept,
+                                       "description": "计划检查", "createTime": now}),
+        ("POST", "/api/appointments", {"id": apt2, "patientId": new_patient, "departmentId": fx_dept, "doctorId": fx_doc,
+                                       "description": "计划检查", "createTime": now}),
+        ("POST", "/api/records", record_item(rec1, apt1)),
+        ("POST", "/api/records", record_item(rec2)),
+        ("POST", "/api/records/bulk", {"items": [record_item(f"{EXPLAIN_ID}R003"), record_item(f"{EXPLAIN_ID}R004")]}),
+        ("PUT", f"/api/appointments/{apt1}", {"status": "completed"}),
+        ("PUT", "/api/appointments/batch", {"updates": [{"id": apt2, "status": "cancelled"}]}),
+        ("PUT", f"/api/medicines/{fx_med}", {"specification": "计划检查"}),
+        ("PUT", f"/api/doctors/{fx_doc}", {"departmentId": fx_dept, "phone": "13700000000"}),
+        ("POST", "/api/multimodal", {"id": mm, "modality": "text", "patientId": new_patient,
+                                     "textContent": "计划检查", "description": "计划检查"}),
+        ("GET", f"/api/multimodal/file/{mm}", None),
+        # --- 删除类 ---
+        ("DELETE", f"/api/multimodal/{mm}", None),
+        ("DELETE", f"/api/records/{rec2}", None),
+        ("DELETE", f"/api/medicines/{fx_med}", None),
+        ("DELETE", f"/api/doctors/{fx_doc}", None),
+        ("DELETE", f"/api/departments/{fx_dept}", None),
+        ("DELETE", f"/api/patients/{new_patient}", None),
+    ]
+
+
+# ================= 收集与 EXPLAIN =================
+def capture_statements(app, args):
+    """逐个调用接口，返回 {endpoint: [(sql, params), ...]} 以及未覆盖的端点"""
+    from app.api.auth import generate_jwt
+    from app.utils.query_budget import count_queries
+    from app.utils.redis_client import redis_client
+
+    flush = args.redis != "external" or args.reseed
+    client = BenchClient(app, Recorder())
+    client.token = generate_jwt("admin", "admin")
+
+    captured = {}
+    ids = sample_ids()
+    try:
+        ids.update(create_fixtures())
+        for method, path, body in request_plan(ids):
+            if flush:
+                redis_client.flushdb()   # 接口缓存命中时不查库，清空后才能覆盖数据库路径
+            endpoint = app.url_map.bind("localhost").match(path.split("?")[0], method=method)[0]
+            with count_queries(capture=True) as counter:
+                resp = client.request(method, path, json=body)
+            if resp.status_code >= 500:
+                print(f"⚠️ {method} {path} -> {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+            captured.setdefault(endpoint, []).extend(counter.statements)
+    finally:
+        cleanup_fixtures()
+
+    uncovered = sorted(
+        endpoint for endpoint, view in app.view_functions.items()
+        if endpoint not in captured and (getattr(view, "query_budget", (None,))[0] or 0) > 0
+    )
+    return captured, uncovered
+
+
+def _first_params(params):
+    """executemany 传入的是参数序列，EXPLAIN 取第一组"""
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict)):
+        return params[0]
+    return params
+
+
+def explain(sql, params):
+    """返回 EXPLAIN 的逐表计划；语句不支持 EXPLAIN 时返回 None"""
+    from app.utils.db import get_db_connection
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(f"EXPLAIN {sql}", _first_params(params) or ())
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.rollback()
+        conn.close()
+
+    plan = []
+    for row in rows:
+        if not row.get("table"):
+            continue   # 无表的行 (例如 "No tables used"、UNION RESULT 之外的常量子查询)
+        extra = row.get("Extra") or ""
+        plan.append({
+            "table": row["table"],
+            "type": row.get("type"),
+            "key": row.get("key"),
+            "rows": int(row["rows"]) if row.get("rows") is not None else None,
+            "filesort": "Using filesort" in extra,
+            "temporary": "Using temporary" in extra,
+        })
+    return plan
+
+
+def collect_plans(captured):
+    """{"endpoint digest": {endpoint, sql, plan}}，同一接口中形状相同的语句只 EXPLAIN 一次"""
+    from app.utils.slow_query import EXPLAINABLE, normalize_sql, sql_digest
+
+    plans = {}
+    for endpoint, statements in sorted(captured.items()):
+        for sql, params in statements:
+            if isinstance(sql, (bytes, bytearray)):
+                sql = sql.decode("utf-8", "replace")
+            if not sql.lstrip().lower().startswith(EXPLAINABLE):
+                continue
+            normalized = normalize_sql(sql)
+            key = f"{endpoint} {sql_digest(normalized)}"
+            if key in plans:
+                continue
+            try:
+                plan = explain(sql, params)
+            except Exception as e:
+                print(f"⚠️ EXPLAIN failed for {endpoint}: {e}\n   {normalized[:200]}")
+                continue
+            plans[key] = {"endpoint": endpoint, "sql": normalized, "plan": plan}
+    return plans
+
+
+# ================= 与基线比较 =================
+def _large_table_issues(plan):
+    issues = set()
+    for step in plan:
+        if step["table"] in LARGE_TABLES:
+            if step["type"] == "ALL":
+                issues.add(f"full_scan:{step['table']}")
+            if step["filesort"]:
+                issues.add(f"filesort:{step['table']}")
+    return issues
+
+
+def compare(plans, baseline, args):
+    failures, notes, accepted = [], [], []
+    for key, entry in sorted(plans.items()):
+        label = f"{entry['endpoint']}: {entry['sql'][:160]}"
+        issues = _large_table_issues(entry["plan"])
+        old = baseline.get(key)
+        if old is None:
+            notes.append(f"new statement  {label}")
+            for issue in sorted(issues):
+                failures.append(f"{issue} (not in baseline)  {label}")
+            continue
+
+        old_issues = _large_table_issues(old["plan"])
+        for issue in sorted(issues - old_issues):
+            failures.append(f"{issue} (new)  {label}")
+        for issue in sorted(issues & old_issues):
+            accepted.append(f"{issue}  {label}")
+
+        old_steps = {step["table"]: step for step in old["plan"]}
+        for step in entry["plan"]:
+            before = old_steps.get(step["table"])
+            if before is None:
+                continue
+            table = step["table"]
+            if ACCESS_RANK.get(step["type"], 0) > ACCESS_RANK.get(before["type"], 0):
+                failures.append(f"access {table}: {before['type']} -> {step['type']}  {label}")
+            if before["key"] and not step["key"]:
+                failures.append(f"index {table}: {before['key']} -> none  {label}")
+            elif before["key"] != step["key"]:
+                notes.append(f"index {table}: {before['key']} -> {step['key']}  {label}")
+            if before["rows"] is not None and step["rows"] is not None \
+                    and step["rows"] > before["rows"] * args.rows_factor \
+                    and step["rows"] - before["rows"] > args.rows_slack:
+                failures.append(f"rows {table}: {before['rows']} -> {step['rows']}  {label}")
+
+    for key in sorted(set(baseline) - set(plans)):
+        notes.append(f"no longer executed  {baseline[key]['endpoint']}: {baseline[key]['sql'][:160]}")
+    return failures, notes, accepted
+
+
+def main():
+    args = parse_args()
+    record = args.update_baseline
+    if not record and not os.path.exists(args.baseline):
+        # 没有基线时无从比较，不能把本次结果当作基线放过 (CI 的每次全新检出都会如此)
+        print(f"❌ Baseline {args.baseline} not found; "
+              f"record it with --update-baseline on a seeded instance and commit it")
+        sys.exit(1)
+    if record and args.mysql == "external" and not args.reseed:
+        # 基线的估算行数依赖造数规模与种子，只能在按 --scale/--seed 造好数的库上记录
+        sys.exit("❌ Baseline must be recorded on seeded data; use --mysql local or add --reseed")
+
+    with start_services(args) as seeded:
+        from app import create_app
+        app = create_app()
+        captured, uncovered = capture_statements(app, args)
+        plans = collect_plans(captured)
+
+    print(f"🔎 {len(plans)} statements from {len(captured)} endpoints")
+    for endpoint in uncovered:
+        print(f"⚠️ endpoint not exercised: {endpoint}")
+
+    if record:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {"git": git_revision(), "scale": args.scale, "seed": args.seed,
+                         "rows": seeded["rows"] if seeded else None},
+                "statements": plans,
+            }, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"📄 Baseline written to {args.baseline}")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    meta = baseline.get("meta", {})
+    if (meta.get("scale"), meta.get("seed")) != (args.scale, args.seed):
+        print(f"⚠️ Baseline was recorded with scale={meta.get('scale')} seed={meta.get('seed')}; "
+              f"row estimates may not be comparable")
+
+    failures, notes, accepted = compare(plans, baseline.get("statements", {}), args)
+    for line in accepted:
+        print(f"   known  {line}")
+    for line in notes:
+        print(f"   note   {line}")
+    for line in failures:
+        print(f"❌ {line}")
+    if failures or uncovered:
+        sys.exit(1)
+    print("✅ No query plan regressions")
+
+
+if __name__ == '__main__':
+    main()
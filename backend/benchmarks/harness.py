@@ -0,0 +1,447 @@
+"""
+基准测试公共部分：本地服务替身、造数与进程内 HTTP 客户端
+
+- LocalMySQL：在临时目录中初始化并启动一个独立的 mysqld (无需容器)，导入 meddata_hub.sql
+- LocalRedis：启动一个不落盘的 redis-server；或 --redis fake 使用进程内的 fakeredis
+- seed_database：调用 insert_data_python/generate_data.py 并行生成 CSV 分块并 LOAD DATA 导入，按规模系数造数
+- BenchClient：Flask test client 封装，自动附带时间戳与 JWT，记录每次请求的延迟与 X-Query-Count
+
+服务配置通过环境变量 (DB_* / REDIS_*) 传给应用，因此 app 必须在 start_services() 之后才能导入
+"""
+import os
+import re
+import sys
+import math
+import time
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_FILE = os.path.join(BACKEND_DIR, "meddata_hub.sql")
+GENERATOR_DIR = os.path.join(BACKEND_DIR, "insert_data_python")
+DB_NAME = "meddata_hub"     # meddata_hub.sql 中的表名都带库名前缀
+DB_USER = "meddata"
+DB_PASSWORD = "meddata"
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until(check, timeout, proc, what, log_file=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    tail = ""
+    if log_file and os.path.exists(log_file):
+        with open(log_file, encoding="utf-8", errors="replace") as f:
+            tail = "".join(f.readlines()[-20:])
+    raise RuntimeError(f"{what} failed to start (exit code {proc.poll()})\n{tail}")
+
+
+# ================= 本地服务替身 =================
+class LocalMySQL:
+    """临时目录中的独立 mysqld：--initialize-insecure 初始化，只监听 127.0.0.1 的随机端口"""
+
+    def __init__(self, workdir, mysqld="mysqld", extra_args=()):
+        self.mysqld = shutil.which(mysqld) or mysqld
+        self.datadir = os.path.join(workdir, "mysql-data")
+        self.socket = os.path.join(workdir, "mysql.sock")
+        self.log_file = os.path.join(workdir, "mysqld.log")
+        self.port = free_port()
+        self.extra_args = list(extra_args)
+        self.proc = None
+
+    def _user_args(self):
+        # mysqld 拒绝以 root 身份运行，除非显式指定 --user=root
+        return ["--user=root"] if hasattr(os, "geteuid") and os.geteuid() == 0 else []
+
+    def start(self):
+        if not shutil.which(self.mysqld):
+            raise RuntimeError(f"mysqld not found ({self.mysqld}); install MySQL 8 server or use --mysql external")
+        if not os.path.isdir(os.path.join(self.datadir, "mysql")):
+            subprocess.run(
+                [self.mysqld, "--no-defaults", "--initialize-insecure", f"--datadir={self.datadir}",
+                 f"--log-error={self.log_file}", *self._user_args()],
+                check=True,
+            )
+        self.proc = subprocess.Popen([
+            self.mysqld, "--no-defaults", f"--datadir={self.datadir}", f"--socket={self.socket}",
+            f"--port={self.port}", "--bind-address=127.0.0.1", "--mysqlx=OFF", "--skip-log-bin",
+            "--local-infile=1", f"--log-error={self.log_file}", f"--pid-file={self.datadir}/mysqld.pid",
+            *self._user_args(), *self.extra_args,
+        ])
+        _wait_until(lambda: self._admin_connection().close() or True, 60, self.proc, "mysqld", self.log_file)
+
+        conn = self._admin_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"CREATE USER IF NOT EXISTS '{DB_USER}'@'%' IDENTIFIED BY '{DB_PASSWORD}'")
+            cursor.execute(f"GRANT ALL ON *.* TO '{DB_USER}'@'%'")
+        finally:
+            cursor.close()
+            conn.close()
+        return self
+
+    def _admin_connection(self):
+        import mysql.connector
+        return mysql.connector.connect(unix_socket=self.socket, user="root", password="", autocommit=True)
+
+    def env(self):
+        return {"DB_HOST": "127.0.0.1", "DB_PORT": str(self.port), "DB_USER": DB_USER,
+                "DB_PASSWORD": DB_PASSWORD, "DB_NAME": DB_NAME}
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+class LocalRedis:
+    """不落盘的 redis-server，只监听 127.0.0.1 的随机端口"""
+
+    def __init__(self, redis_server="redis-server"):
+        self.redis_server = shutil.which(redis_server) or redis_server
+        self.port = free_port()
+        self.proc = None
+
+    def start(self):
+        if not shutil.which(self.redis_server):
+            raise RuntimeError("redis-server not found; install Redis or use --redis fake / external")
+        self.proc = subprocess.Popen(
+            [self.redis_server, "--port", str(self.port), "--bind", "127.0.0.1",
+             "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL,
+        )
+
+        def ping():
+            import redis
+            return redis.Redis(host="127.0.0.1", port=self.port).ping()
+
+        _wait_until(ping, 15, self.proc, "redis-server")
+        return self
+
+    def env(self):
+        return {"REDIS_HOST": "127.0.0.1", "REDIS_PORT": str(self.port), "REDIS_DB": "0"}
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            self.proc.wait(timeout=15)
+
+
+def use_fakeredis():
+    """把应用的两个 Redis 客户端切换到同一个进程内 fakeredis 服务 (仍经过 TimedRedis 计时)"""
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("--redis fake requires fakeredis: pip install fakeredis")
+    import redis
+    from app.utils import redis_client as module
+
+    server = fakeredis.FakeServer()
+    for client, decode in ((module.redis_client, True), (module.redis_binary_client, False)):
+        client.connection_pool = redis.ConnectionPool(
+            connection_class=fakeredis.FakeConnection, server=server, decode_responses=decode)
+
+
+def add_service_args(parser):
+    group = parser.add_argument_group("services")
+    group.add_argument("--mysql", choices=("local", "external"), default="local",
+                       help="local: 临时启动 mysqld；external: 使用 DB_* 环境变量指向的数据库")
+    group.add_argument("--redis", choices=("local", "fake", "external"), default="local",
+                       help="local: 临时启动 redis-server；fake: 进程内 fakeredis；external: 使用 REDIS_* 环境变量")
+    group.add_argument("--mysqld", default="mysqld", help="mysqld 可执行文件")
+    group.add_argument("--redis-server", default="redis-server", help="redis-server 可执行文件")
+    group.add_argument("--workdir", default=None, help="本地服务数据目录 (默认临时目录，结束后删除)")
+    group.add_argument("--scale", type=float, default=0.1, help="造数规模系数 (1.0 = generate_data.py 默认数据量)")
+    group.add_argument("--seed", type=int, default=42, help="造数随机种子")
+    group.add_argument("--reseed", action="store_true",
+                       help="--mysql external 时清空并重新造数 (local 模式总是造数)")
+    return parser
+
+
+@contextmanager
+def start_services(args):
+    """
+    启动 (或连接) MySQL 与 Redis，写入环境变量并按需造数；yield 造数统计 (未造数时为 None)。
+    退出时停止本地服务，未指定 --workdir 时删除临时数据目录
+    """
+    workdir = args.workdir or tempfile.mkdtemp(prefix="meddata-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    services = []
+    try:
+        if args.mysql == "local":
+            print(f"🐬 Starting local mysqld in {workdir} ...")
+            services.append(LocalMySQL(workdir, args.mysqld).start())
+            os.environ.update(services[-1].env())
+        if args.redis == "local":
+            services.append(LocalRedis(args.redis_server).start())
+            os.environ.update(services[-1].env())
+
+        seeded = None
+        if args.mysql == "local" or args.reseed:
+            seeded = seed_database(args.scale, args.seed)
+
+        if args.redis == "fake":
+            use_fakeredis()
+        else:
+            from app.utils.redis_client import redis_client
+            if args.redis == "local" or args.reseed:
+                redis_client.flushdb()
+        yield seeded
+    finally:
+        for service in reversed(services):
+            service.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ================= 造数 =================
+def _connect(database=None):
+    import mysql.connector
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST", "localhost"), port=int(os.getenv("DB_PORT", 3306)),
+        user=os.getenv("DB_USER", "root"), password=os.getenv("DB_PASSWORD", "root"),
+        database=database, allow_local_infile=True,
+    )
+
+
+def load_schema(conn):
+    """执行 meddata_hub.sql (去掉注释与 USE 行后按分号切分)"""
+    with open(SCHEMA_FILE, encoding="utf-8") as f:
+        script = f.read()
+    script = re.sub(r"--[^\n]*", "", script)
+    script = re.sub(r"^\s*USE\s+\w+\s*$", "", script, flags=re.MULTILINE)
+    cursor = conn.cursor()
+    try:
+        for statement in script.split(";"):
+            if statement.strip():
+                cursor.execute(statement)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def seed_database(scale, seed):
+    """
+    重建库表并用 insert_data_python/generate_data.py (full 形态) 造数：患者数与每日挂号量按 scale 缩放，
+    固定种子，同一参数生成的数据相同。返回各表行数、耗时与导入速率
+    """
+    conn = _connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP DATABASE IF EXISTS {DB_NAME}")
+        load_schema(conn)
+    finally:
+        cursor.close()
+        conn.close()
+
+    sys.path.insert(0, GENERATOR_DIR)
+    import generate_data
+
+    print(f"🌱 Seeding: scale={scale}, seed={seed}")
+    generated = generate_data.generate("full", scale, seed, clean=False)
+
+    # 桑基图流转计数由写路径增量维护，造数脚本直接插表，需整体重建一次
+    from app.utils.db import get_db_connection
+    from app.utils.flow_stats import rebuild_flow_counts
+    app_conn = get_db_connection()
+    try:
+        rebuild_flow_counts(app_conn)
+    finally:
+        app_conn.close()
+
+    rows = table_counts()
+    print(f"✅ Seeded {sum(rows.values())} rows in {generated['seconds']:.1f}s")
+    return {"scale": scale, "seed": seed, "seconds": generated["seconds"], "rows": rows,
+            "rows_per_second": generated["rows_per_second"], "method": generated["method"],
+            "workers": generated["workers"]}
+
+
+SEED_TABLES = ("departments", "doctors", "patients", "medicines", "appointments",
+               "medical_records", "prescription_details", "sankey_flow_counts")
+
+
+def table_counts():
+    conn = _connect(DB_NAME)
+    cursor = conn.cursor()
+    try:
+        rows = {}
+        for table in SEED_TABLES:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            rows[table] = cursor.fetchone()[0]
+        return rows
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def fetch_all(sql, params=()):
+    """在应用连接池上执行查询 (须在 start_services 之后调用)"""
+    from app.utils.db import get_db_connection
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def execute(sql, params=()):
+    """在应用连接池上执行写语句并提交，返回影响行数"""
+    from app.utils.db import get_db_connection
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ================= 请求记录与统计 =================
+def percentile(sorted_values, q):
+    """最近秩百分位 (sorted_values 已升序)"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)  # noqa: E731
+    return {
+        "p50": ms(percentile(values, 0.50)),
+        "p95": ms(percentile(values, 0.95)),
+        "p99": ms(percentile(values, 0.99)),
+        "mean": ms(sum(values) / len(values)) if values else 0.0,
+        "max": ms(values[-1]) if values else 0.0,
+    }
+
+
+class Recorder:
+    """按 "方法 路由" 汇总请求：次数、状态码分布、延迟、每请求 SQL 条数与预算违规数 (线程安全)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = True
+        self.endpoints = defaultdict(lambda: {"latencies": [], "statuses": defaultdict(int),
+                                              "queries": [], "violations": 0})
+
+    def record(self, label, status, elapsed, queries, violation):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self.endpoints[label]
+            entry["latencies"].append(elapsed)
+            entry["statuses"][str(status)] += 1
+            if queries is not None:
+                entry["queries"].append(queries)
+            if violation:
+                entry["violations"] += 1
+
+    def report(self, elapsed):
+        result = {}
+        for label, entry in sorted(self.endpoints.items()):
+            count = len(entry["latencies"])
+            queries = entry["queries"]
+            result[label] = {
+                "count": count,
+                "errors": sum(n for status, n in entry["statuses"].items() if not status.startswith(("2", "3"))),
+                "statuses": dict(entry["statuses"]),
+                "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+                "latency_ms": latency_summary(entry["latencies"]),
+                "queries": {
+                    "mean": round(sum(queries) / len(queries), 2) if queries else None,
+                    "max": max(queries) if queries else None,
+                    "total": sum(queries),
+                },
+                "budget_violations": entry["violations"],
+            }
+        return result
+
+
+class BenchClient:
+    """
+    进程内客户端：每个压测线程一个 (Flask test client 不是线程安全的)。
+    URL 自动附带 ?_t= 时间戳 (防重放校验)，登录后自动带 Bearer Token
+    """
+
+    def __init__(self, app, recorder):
+        self.client = app.test_client()
+        self.recorder = recorder
+        self.token = None
+
+    def request(self, method, path, label=None, **kwargs):
+        sep = "&" if "?" in path else "?"
+        headers = kwargs.pop("headers", {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        t0 = time.perf_counter()
+        resp = self.client.open(f"{path}{sep}_t={int(time.time() * 1000)}", method=method,
+                                headers=headers, **kwargs)
+        elapsed = time.perf_counter() - t0
+        queries = resp.headers.get("X-Query-Count")
+        self.recorder.record(label or f"{method} {path.split('?')[0]}", resp.status_code, elapsed,
+                             int(queries) if queries is not None else None,
+                             "X-Query-Budget-Violation" in resp.headers)
+        return resp
+
+    def get(self, path, label=None, **kwargs):
+        return self.request("GET", path, label, **kwargs)
+
+    def post(self, path, label=None, **kwargs):
+        return self.request("POST", path, label, **kwargs)
+
+    def put(self, path, label=None, **kwargs):
+        return self.request("PUT", path, label, **kwargs)
+
+    def login(self, user_id, password, role):
+        resp = self.post("/api/login", json={"id": user_id, "password": password, "role": role})
+        if resp.status_code != 200:
+            raise RuntimeError(f"login failed for {role} {user_id}: {resp.status_code} {resp.get_data(as_text=True)}")
+        self.token = resp.get_json()["token"]
+        return self.token
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_report(report, output):
+    body = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(body + "\n")
+        print(f"📄 Report written to {output}")
+    else:
+        print(body)
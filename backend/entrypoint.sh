@@ -156,11 +156,11 @@ fi
 if [ $STATUS -eq 100 ]; then
     log_step "Initializing Data..."
     
-    echo ">> Running insert_data.py..."
-    if python insert_data_python/insert_data.py; then
+    echo ">> Running generate_data.py (batch INSERT, no global variable changes)..."
+    if python insert_data_python/generate_data.py --method insert; then
         log_info "Basic data inserted successfully."
     else
-        log_err "Failed to run insert_data.py"
+        log_err "Failed to run generate_data.py"
         exit 1
     fi
     
@@ -170,13 +170,25 @@ if [ $STATUS -eq 100 ]; then
     else
         log_warn "Failed to run insert_multimodal.py (Non-critical, continuing...)"
     fi
-    
+
+    echo ">> Rebuilding sankey flow counts..."
+    if flask --app run stats rebuild-sankey-flow; then
+        log_info "Sankey flow counts rebuilt."
+    else
+        log_warn "Failed to rebuild sankey flow counts (Non-critical, continuing...)"
+    fi
+
     log_info "Data initialization sequence completed."
 else
     log_info "Skipping data initialization."
 fi
 
-# 5. 启动 Gunicorn
+# 5. 清空上次运行遗留的 worker 指标快照 (/metrics 按目录聚合所有 worker)
+METRICS_DIR="${METRICS_DIR:-/tmp/meddata_metrics}"
+rm -rf "$METRICS_DIR"
+mkdir -p "$METRICS_DIR"
+
+# 6. 启动 Gunicorn
 log_step "Starting Gunicorn Server..."
 # 打印最终执行的命令
 echo "Command: $@"
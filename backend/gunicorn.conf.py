@@ -0,0 +1,8 @@
+# gunicorn 配置：gunicorn 启动时自动读取当前目录下的 gunicorn.conf.py (命令行参数优先)
+# 只在 master 中执行，不导入 app (否则数据库连接池会在 fork 前创建并被所有 worker 共享)
+import os
+import uuid
+
+# 本次启动的标识：worker 从 master 继承，指标快照按它命名，/metrics 只汇总本次启动的 worker
+# (见 app/utils/metrics.py)；master 重新加载配置 (HUP) 时随新 worker 一起更换
+os.environ["METRICS_BOOT_ID"] = uuid.uuid4().hex[:12]
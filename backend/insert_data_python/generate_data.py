@@ -0,0 +1,654 @@
+"""
+演示 / 压测数据生成器 (统一入口，取代原 insert_data.py / insert_sankey.py / insert_small_data.py)
+
+- --profile 选择数据形态：full (默认，近 4 年门诊数据)、sankey (当年高流量 + 取消/未开药分支)、small (少量联调数据)
+- --scale 按系数缩放患者数与每日挂号量，--seed 固定随机种子：同一参数生成的数据完全相同，与 --workers、--chunk-rows 无关
+- 患者按 ID 区间、业务数据按日期区间切块，由多个工作进程并行生成并写成 CSV 分块，
+  主进程边收边用 LOAD DATA LOCAL INFILE 导入 (导入期间关闭外键与唯一性检查)，结束后输出各表行数与 rows/s
+- 服务端 local_infile 关闭时默认退回批量 INSERT，不修改全局变量 (--set-global-infile 才会临时开启)
+
+用法 (在 backend 目录下)：
+    python insert_data_python/generate_data.py
+    python insert_data_python/generate_data.py --profile sankey
+    python insert_data_python/generate_data.py --scale 200 --seed 42 --workers 8
+    python insert_data_python/generate_data.py --scale 10 --csv-only --csv-dir /tmp/meddata-csv
+"""
+import os
+import csv
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from datetime import date, timedelta
+
+import mysql.connector
+from mysql.connector import errorcode
+
+# ================= 数据库配置 =================
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": int(os.getenv("DB_PORT", 3306)),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", "root"), # 如果你在 docker-compose 里设了 rootpassword，这里默认值无所谓，因为会读环境变量
+    "database": os.getenv("DB_NAME", "meddata_hub")
+}
+
+# ================= 生成配置 =================
+# years 为相对当前年份的起止年；daily_visits / patients 会再乘以 --scale
+# statuses 为挂号状态及其概率；rx_rate 为已完成诊疗中开具处方的比例
+PROFILES = {
+    "full": {
+        "years": (-2, 1),
+        "daily_visits": (10, 30),
+        "patients": 800,
+        "departments": 12,
+        "medicines": 30,
+        "stock": (500, 3000),
+        "doctors_per_dept": (2, 5),
+        "statuses": (("completed", 0.9), ("pending", 0.1)),
+        "rx_rate": 1.0,
+        "descriptions": ["不舒服", "复诊", "检查", "开药"],
+        "pain_description": "剧烈疼痛",
+    },
+    "sankey": {
+        "years": (0, 0),
+        "daily_visits": (35, 75),
+        "patients": 1500,
+        "departments": 12,
+        "medicines": 30,
+        "stock": (1000, 5000),
+        "doctors_per_dept": (3, 6),
+        "statuses": (("completed", 0.75), ("cancelled", 0.15), ("pending", 0.10)),
+        "rx_rate": 0.6,
+        "descriptions": ["不舒服", "复诊", "检查"],
+        "pain_description": "疼痛",
+    },
+    "small": {
+        "years": (0, 0),
+        "daily_visits": (1, 3),
+        "patients": 5,
+        "departments": 5,
+        "medicines": 10,
+        "stock": (500, 3000),
+        "doctors_per_dept": (1, 2),
+        "statuses": (("completed", 0.9), ("pending", 0.1)),
+        "rx_rate": 1.0,
+        "descriptions": ["不舒服", "复诊", "检查", "开药"],
+        "pain_description": "剧烈疼痛",
+    },
+}
+
+DEFAULT_PASSWORD = '123456'
+CHUNK_ROWS = 100000     # 每个 CSV 分块的目标挂号 / 患者行数
+
+# 1. 科室数据
+DEPARTMENTS = [
+    ('D001', '心血管内科', '门诊楼2F-A区'),
+    ('D002', '呼吸内科', '门诊楼2F-B区'),
+    ('D003', '消化内科', '门诊楼2F-C区'),
+    ('D004', '神经内科', '门诊楼3F-A区'),
+    ('D005', '骨科', '外科楼1F'),
+    ('D006', '普外科', '外科楼2F'),
+    ('D007', '皮肤科', '门诊楼4F'),
+    ('D008', '儿科', '急诊楼1F'),
+    ('D009', '眼科', '五官楼2F'),
+    ('D010', '耳鼻喉科', '五官楼3F'),
+    ('D011', '中医科', '康复楼1F'),
+    ('D012', '急诊科', '急诊楼1F')
+]
+
+# 2. 药品数据
+MEDICINES_DATA = [
+    ('M001', '阿莫西林胶囊', 25.50, '0.25g*24粒'),
+    ('M002', '头孢克肟分散片', 35.00, '6片/盒'),
+    ('M003', '阿奇霉素片', 28.00, '0.25g*6片'),
+    ('M004', '罗红霉素胶囊', 16.50, '150mg*10粒'),
+    ('M005', '布洛芬缓释胶囊', 18.00, '0.3g*20粒'),
+    ('M006', '连花清瘟胶囊', 22.00, '24粒/盒'),
+    ('M007', '复方氨酚烷胺片', 12.50, '10片/盒'),
+    ('M008', '急支糖浆', 25.00, '200ml/瓶'),
+    ('M009', '川贝枇杷糖浆', 19.80, '150ml/瓶'),
+    ('M010', '奥美拉唑肠溶胶囊', 15.00, '20mg*14粒'),
+    ('M011', '多潘立酮片(吗丁啉)', 21.00, '10mg*30片'),
+    ('M012', '蒙脱石散', 18.50, '3g*10袋'),
+    ('M013', '硝苯地平控释片', 32.00, '30mg*7片'),
+    ('M014', '阿司匹林肠溶片', 14.00, '100mg*30片'),
+    ('M015', '二甲双胍片', 8.50, '0.5g*20片'),
+    ('M016', '瑞舒伐他汀钙片', 45.00, '10mg*7片'),
+    ('M017', '速效救心丸', 38.00, '60粒*2瓶'),
+    ('M018', '云南白药喷雾剂', 45.00, '85g/瓶'),
+    ('M019', '红花油', 12.00, '20ml/瓶'),
+    ('M020', '双氯芬酸钠缓释片', 22.50, '0.1g*10片'),
+    ('M021', '钙尔奇D片', 55.00, '60片/瓶'),
+    ('M022', '皮炎平软膏', 15.00, '20g/支'),
+    ('M023', '红霉素软膏', 5.00, '10g/支'),
+    ('M024', '阿昔洛韦乳膏', 8.00, '10g/支'),
+    ('M025', '左氧氟沙星滴眼液', 18.00, '5ml/支'),
+    ('M026', '玻璃酸钠滴眼液', 35.00, '5ml/支'),
+    ('M027', '复方薄荷脑滴鼻液', 12.00, '10ml/支'),
+    ('M028', '六味地黄丸', 18.00, '200丸/瓶'),
+    ('M029', '逍遥丸', 16.00, '200丸/瓶'),
+    ('M030', '板蓝根颗粒', 10.00, '20袋/包')
+]
+
+# 3. 诊断逻辑映射
+DEPT_DIAGNOSIS_MAP = {
+    '心血管内科': [('原发性高血压', '低盐低脂饮食，口服降压药。'), ('冠心病', '抗血小板药物，避免劳累。')],
+    '呼吸内科': [('上呼吸道感染', '多饮水，对症治疗。'), ('支气管炎', '止咳化痰，抗感染。')],
+    '消化内科': [('慢性胃炎', '抑酸护胃，规律饮食。'), ('肠胃炎', '补液，纠正电解质。')],
+    '神经内科': [('偏头痛', '休息，止痛治疗。'), ('脑供血不足', '改善微循环。')],
+    '骨科': [('腰肌劳损', '理疗，卧床休息。'), ('骨折术后', '功能锻炼，定期复查。')],
+    '普外科': [('体表肿物', '手术切除，病理检查。'), ('腹痛待查', '完善CT检查。')],
+    '皮肤科': [('湿疹', '外用激素软膏，保湿。'), ('荨麻疹', '抗过敏治疗。')],
+    '儿科': [('小儿发热', '物理降温，退烧药。'), ('消化不良', '益生菌调理。')],
+    '眼科': [('结膜炎', '抗生素滴眼液。'), ('干眼症', '人工泪液。')],
+    '耳鼻喉科': [('鼻炎', '鼻喷激素。'), ('咽炎', '清咽利喉。')],
+    '中医科': [('气虚', '补中益气汤。'), ('失眠', '酸枣仁汤。')],
+    '急诊科': [('急性酒精中毒', '纳洛酮促醒。'), ('外伤', '清创缝合。')]
+}
+
+# 24小时权重 (平滑曲线)，换算成累积权重后一次抽样一整天
+HOUR_WEIGHTS = [
+    0.5, 0.5, 0.5, 0.5, 0.5, 1,  # 0-5点 (极少)
+    3, 8,  # 6-7点 (早起)
+    25, 35, 30, 20,  # 8-11点 (早高峰)
+    10, 15,  # 12-13点 (午休)
+    25, 30, 25, 15,  # 14-17点 (下午高峰)
+    8, 5, 3, 2, 1, 1  # 18-23点 (回落)
+]
+HOURS = list(range(24))
+HOUR_CUM_WEIGHTS = [sum(HOUR_WEIGHTS[:i + 1]) for i in range(24)]
+
+# 各表 CSV 的列顺序
+TABLE_COLUMNS = {
+    "departments": ("id", "name", "location"),
+    "medicines": ("id", "name", "price", "stock", "specification"),
+    "doctors": ("id", "name", "password", "title", "specialty", "phone", "department_id"),
+    "patients": ("id", "name", "password", "gender", "age", "phone", "address", "create_time"),
+    "appointments": ("id", "patient_id", "department_id", "doctor_id", "description", "status", "create_time"),
+    "medical_records": ("id", "patient_id", "doctor_id", "diagnosis", "treatment_plan", "visit_date", "appointment_id"),
+    "prescription_details": ("id", "record_id", "medicine_id", "dosage", "usage_info", "days"),
+}
+CLEAN_TABLES = ['prescription_details', 'medical_records', 'appointments', 'doctors', 'patients', 'medicines',
+                'departments', 'sankey_flow_counts']
+
+# LOAD DATA LOCAL 被客户端或服务端禁用时的错误码，遇到后退回批量 INSERT
+LOCAL_INFILE_DISABLED = {
+    errorcode.ER_NOT_ALLOWED_COMMAND,               # 1148
+    getattr(errorcode, "ER_CLIENT_LOCAL_FILES_DISABLED", 3948),
+    2068,                                           # CR_LOAD_DATA_LOCAL_INFILE_REJECTED
+}
+
+
+def connect_db():
+    return mysql.connector.connect(**DB_CONFIG, allow_local_infile=True)
+
+
+def clean_tables(cursor):
+    print("🧹 正在清空旧数据...")
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for t in CLEAN_TABLES: cursor.execute(f"TRUNCATE TABLE {t}")
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    print("✅ 清空完成")
+
+
+# ================= 生成计划 =================
+def build_plan(profile, scale, seed, csv_dir):
+    """把 profile 与 scale 换算成工作进程需要的全部参数 (可 pickle，传给进程池 initializer)"""
+    cfg = PROFILES[profile]
+    current_year = date.today().year
+    start = date(current_year + cfg["years"][0], 1, 1)
+    end = date(current_year + cfg["years"][1], 12, 31)
+    daily_min = max(1, round(cfg["daily_visits"][0] * scale))
+    daily_max = max(daily_min, round(cfg["daily_visits"][1] * scale))
+
+    statuses, cum_weights, total = [], [], 0.0
+    for status, weight in cfg["statuses"]:
+        total += weight
+        statuses.append(status)
+        cum_weights.append(total)
+
+    return {
+        "profile": profile,
+        "scale": scale,
+        "seed": seed,
+        "csv_dir": csv_dir,
+        "start": start,
+        "days": (end - start).days + 1,
+        "daily_min": daily_min,
+        "daily_max": daily_max,
+        "patients": max(5, round(cfg["patients"] * scale)),
+        "departments": DEPARTMENTS[:cfg["departments"]],
+        "medicines": MEDICINES_DATA[:cfg["medicines"]],
+        "stock": cfg["stock"],
+        "doctors_per_dept": cfg["doctors_per_dept"],
+        "statuses": statuses,
+        "status_cum_weights": cum_weights,
+        "rx_rate": cfg["rx_rate"],
+        "descriptions": cfg["descriptions"],
+        "pain_description": cfg["pain_description"],
+    }
+
+
+def split_tasks(plan, chunk_rows):
+    """患者按 ID 区间、业务数据按日期区间切块；块大小只影响并行粒度，不影响生成结果"""
+    tasks = []
+    for first in range(1, plan["patients"] + 1, chunk_rows):
+        tasks.append(("patients", first, min(first + chunk_rows, plan["patients"] + 1)))
+
+    avg_daily = (plan["daily_min"] + plan["daily_max"]) / 2 * 1.06    # 周末 1.2 倍
+    days_per_chunk = max(1, int(chunk_rows // avg_daily))
+    for first in range(0, plan["days"], days_per_chunk):
+        tasks.append(("business", first, min(first + days_per_chunk, plan["days"])))
+    return tasks
+
+
+def _rng(seed, *parts):
+    # 每个患者 / 每一天独立取种，结果与切块方式和进程数无关
+    return random.Random(":".join(str(p) for p in (seed,) + parts))
+
+
+class ChunkWriter:
+    """一个任务输出的一组 CSV 分块文件 (每张表一个)"""
+
+    def __init__(self, csv_dir, name):
+        self.csv_dir = csv_dir
+        self.name = name
+        self.files = {}
+
+    def writer(self, table):
+        if table not in self.files:
+            path = os.path.join(self.csv_dir, f"{table}.{self.name}.csv")
+            f = open(path, "w", encoding="utf-8", newline="")
+            self.files[table] = [path, f, csv.writer(f, lineterminator="\n"), 0]
+        return self.files[table]
+
+    def write(self, table, rows):
+        entry = self.writer(table)
+        entry[2].writerows(rows)
+        entry[3] += len(rows)
+
+    def close(self):
+        chunks = []
+        for table, (path, f, _, count) in self.files.items():
+            f.close()
+            chunks.append((table, path, count))
+        return chunks
+
+
+def generate_reference(plan):
+    """科室、药品、医生：数据量小，由主进程生成；返回各表行与医生列表"""
+    from faker import Faker
+
+    rng = _rng(plan["seed"], "reference")
+    fake = Faker('zh_CN')
+    fake.seed_instance(plan["seed"])
+
+    medicines = [(m[0], m[1], m[2], rng.randint(*plan["stock"]), m[3]) for m in plan["medicines"]]
+    doctors = []
+    for dept_id, dept_name, _ in plan["departments"]:
+        for _ in range(rng.randint(*plan["doctors_per_dept"])):
+            d_id = f"DOC{len(doctors) + 1:03d}"
+            title = rng.choices(['主任医师', '副主任医师', '主治医师'], weights=[2, 3, 5])[0]
+            doctors.append((d_id, fake.name(), DEFAULT_PASSWORD, title, f"{dept_name}专家", fake.phone_number(), dept_id))
+    return {"departments": plan["departments"], "medicines": medicines, "doctors": doctors}
+
+
+# ================= 工作进程 =================
+_WORKER = {}
+
+
+def _init_worker(plan, doctors):
+    """进程池 initializer：准备按医生预先算好的科室 / 诊断 / 主诉候选，避免在逐行循环里重复查找"""
+    dept_names = {d[0]: d[1] for d in plan["departments"]}
+    candidates = []
+    for doctor in doctors:
+        dept_id = doctor[6]
+        diagnoses = DEPT_DIAGNOSIS_MAP.get(dept_names[dept_id], [('常规检查', '观察')])
+        descriptions = list(plan["descriptions"])
+        if "痛" in str(diagnoses): descriptions.append(plan["pain_description"])
+        candidates.append((doctor[0], dept_id, diagnoses, descriptions))
+
+    _WORKER.clear()
+    _WORKER.update(
+        plan=plan,
+        doctors=candidates,
+        medicine_ids=[m[0] for m in plan["medicines"]],
+        patient_ids=[f"P{i:04d}" for i in range(1, plan["patients"] + 1)],
+    )
+
+
+def _run_task(task):
+    kind, first, last = task
+    t0 = time.perf_counter()
+    if kind == "patients":
+        chunks, counts = _generate_patients(first, last), {}
+    else:
+        chunks, counts = _generate_business(first, last)
+    return chunks, counts, time.perf_counter() - t0
+
+
+def _generate_patients(first, last):
+    from faker import Faker
+
+    plan = _WORKER["plan"]
+    fake = Faker('zh_CN')
+    today = date.today()
+
+    rows = []
+    for i in range(first, last):
+        # 按患者编号取种：同一患者的数据与它落在哪个分块 (--chunk-rows) 无关
+        rng = _rng(plan["seed"], "patient", i)
+        fake.seed_instance(f"{plan['seed']}:patient:{i}")
+        rows.append((f"P{i:04d}", fake.name(), DEFAULT_PASSWORD, rng.choice(['男', '女']), rng.randint(1, 90),
+                     fake.phone_number(), fake.address(), today - timedelta(days=rng.randint(0, 4 * 365))))
+
+    out = ChunkWriter(plan["csv_dir"], f"{first:09d}")
+    out.write("patients", rows)
+    return out.close()
+
+
+def _generate_business(first_day, last_day):
+    plan = _WORKER["plan"]
+    doctors = _WORKER["doctors"]
+    medicine_ids = _WORKER["medicine_ids"]
+    patient_ids = _WORKER["patient_ids"]
+    statuses, status_cum = plan["statuses"], plan["status_cum_weights"]
+    rx_rate = plan["rx_rate"]
+    max_meds = min(3, len(medicine_ids))
+
+    out = ChunkWriter(plan["csv_dir"], f"{first_day:05d}")
+    counts = {"appointments": 0, "records": 0, "prescriptions": 0}
+
+    for offset in range(first_day, last_day):
+        day = plan["start"] + timedelta(days=offset)
+        rng = _rng(plan["seed"], "day", day.isoformat())
+        base_visits = rng.randint(plan["daily_min"], plan["daily_max"])
+        # 周末人稍微多一点
+        daily_visits = int(base_visits * 1.2) if day.weekday() >= 5 else base_visits
+
+        # 整天一次性抽样：挂号时刻按时间排序，使挂号 ID 顺序与时间顺序一致 (主键顺序写入)
+        seconds = sorted(h * 3600 + rng.randrange(3600)
+                         for h in rng.choices(HOURS, cum_weights=HOUR_CUM_WEIGHTS, k=daily_visits))
+        visit_doctors = rng.choices(doctors, k=daily_visits)
+        visit_patients = rng.choices(patient_ids, k=daily_visits)
+        day_str = day.isoformat()
+        day_key = day.strftime("%Y%m%d")
+
+        appointments, records, details = [], [], []
+        for n in range(daily_visits):
+            a_id = f"APT{day_key}{n + 1:06d}"
+            doc_id, dept_id, diagnoses, descriptions = visit_doctors[n]
+            p_id = visit_patients[n]
+            sec = seconds[n]
+            appt_time = f"{day_str} {sec // 3600:02d}:{sec // 60 % 60:02d}:{sec % 60:02d}"
+            status = rng.choices(statuses, cum_weights=status_cum)[0]
+            appointments.append((a_id, p_id, dept_id, doc_id, rng.choice(descriptions), status, appt_time))
+
+            # 生成病历 (仅当状态为 completed)
+            if status != 'completed':
+                continue
+            r_id = f"REC{day_key}{len(records) + 1:06d}"
+            diag_result, treat_plan = rng.choice(diagnoses)
+            records.append((r_id, p_id, doc_id, diag_result, treat_plan, day_str, a_id))
+
+            # 生成处方
+            if rx_rate < 1.0 and rng.random() >= rx_rate:
+                continue
+            counts["prescriptions"] += 1
+            for m_id in rng.sample(medicine_ids, rng.randint(1, max_meds)):
+                details.append((f"DTL{day_key}{len(details) + 1:07d}", r_id, m_id, '遵医嘱', '口服', rng.randint(3, 7)))
+
+        out.write("appointments", appointments)
+        out.write("medical_records", records)
+        out.write("prescription_details", details)
+        counts["appointments"] += len(appointments)
+        counts["records"] += len(records)
+
+    return out.close(), counts
+
+
+def _run_tasks(plan, doctors, tasks, workers):
+    """按完成顺序产出各分块结果；工作进程持续生成，调用方边收边导入，生成与导入重叠进行"""
+    if workers == 1:
+        _init_worker(plan, doctors)
+        for task in tasks:
+            yield _run_task(task)
+        return
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(plan, doctors)) as pool:
+        yield from pool.imap_unordered(_run_task, tasks)
+
+
+# ================= 导入 =================
+class Loader:
+    """主进程中的导入连接：导入期间放宽会话级检查，LOAD DATA 不可用时退回批量 INSERT"""
+
+    def __init__(self, method="load", no_binlog=False, set_global_infile=False):
+        self.conn = connect_db()
+        self.cursor = self.conn.cursor()
+        self.method = method
+        self.restore_local_infile = False
+        self.stats = {}
+
+        if no_binlog:
+            try:
+                self.cursor.execute("SET SESSION sql_log_bin = 0")
+            except mysql.connector.Error as e:
+                print(f"⚠️ 无法关闭 binlog (需要 SYSTEM_VARIABLES_ADMIN 权限)，继续: {e.msg}")
+        if self.method == "load":
+            self._enable_local_infile(set_global_infile)
+
+    def relax_checks(self):
+        # 数据由生成器保证引用完整、主键唯一；逐行校验外键与二级唯一索引是导入的主要开销
+        self.cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+
+    def _enable_local_infile(self, set_global):
+        self.cursor.execute("SELECT @@GLOBAL.local_infile")
+        if self.cursor.fetchone()[0]:
+            return
+        if not set_global:
+            # SET GLOBAL 会影响同一实例上的所有连接，默认不动，需显式 --set-global-infile
+            print("⚠️ 服务端未开启 local_infile，改用批量 INSERT (可加 --set-global-infile 临时开启)")
+            self.method = "insert"
+            return
+        try:
+            self.cursor.execute("SET GLOBAL local_infile = 1")
+            self.restore_local_infile = True
+        except mysql.connector.Error as e:
+            print(f"⚠️ 服务端未开启 local_infile 且无权开启，改用批量 INSERT: {e.msg}")
+            self.method = "insert"
+
+    def load(self, table, path, expected):
+        t0 = time.perf_counter()
+        if self.method == "load":
+            try:
+                self._load_data(table, path, expected)
+            except mysql.connector.Error as e:
+                if e.errno not in LOCAL_INFILE_DISABLED:
+                    raise
+                print(f"⚠️ LOAD DATA LOCAL 被拒绝，改用批量 INSERT: {e.msg}")
+                self.conn.rollback()
+                self.method = "insert"
+        if self.method == "insert":
+            self._insert_rows(table, path)
+        self.conn.commit()
+
+        entry = self.stats.setdefault(table, {"rows": 0, "seconds": 0.0, "bytes": 0})
+        entry["rows"] += expected
+        entry["seconds"] += time.perf_counter() - t0
+        entry["bytes"] += os.path.getsize(path)
+
+    def _load_data(self, table, path, expected):
+        columns = ", ".join(TABLE_COLUMNS[table])
+        self.cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+            f"LINES TERMINATED BY '\\n' ({columns})",
+            (os.path.abspath(path),))
+        if self.cursor.rowcount != expected:
+            raise RuntimeError(f"{table}: {os.path.basename(path)} 导入 {self.cursor.rowcount} 行，期望 {expected} 行")
+
+    def _insert_rows(self, table, path, batch=5000):
+        columns = TABLE_COLUMNS[table]
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) "
+               f"VALUES ({', '.join(['%s'] * len(columns))})")
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = []
+            for row in csv.reader(f):
+                rows.append(row)
+                if len(rows) >= batch:
+                    self.cursor.executemany(sql, rows)
+                    rows = []
+            if rows:
+                self.cursor.executemany(sql, rows)
+
+    def close(self):
+        try:
+            self.cursor.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1")
+            if self.restore_local_infile:
+                self.cursor.execute("SET GLOBAL local_infile = 0")
+        finally:
+            self.cursor.close()
+            self.conn.close()
+
+
+# ================= 主流程 =================
+def generate(profile="full", scale=1.0, seed=None, workers=None, chunk_rows=CHUNK_ROWS,
+             csv_dir=None, csv_only=False, method="load", no_binlog=False, clean=True,
+             set_global_infile=False):
+    """
+    生成并导入一套数据，返回统计 (供 benchmarks/harness.py 复用)。
+    csv_only 时只写 CSV 分块、不连接数据库；否则导入后删除临时 CSV (指定 csv_dir 时保留)
+    """
+    if seed is None:
+        seed = random.randrange(1 << 31)
+    workers = workers or os.cpu_count() or 1
+    keep_csv = csv_only or csv_dir is not None
+    csv_dir = csv_dir or tempfile.mkdtemp(prefix="meddata-csv-")
+    os.makedirs(csv_dir, exist_ok=True)
+
+    plan = build_plan(profile, scale, seed, csv_dir)
+    tasks = split_tasks(plan, chunk_rows)
+    print(f"🚀 数据生成: profile={profile}, scale={scale}, seed={seed}, workers={workers}, "
+          f"{plan['start']} 起 {plan['days']} 天, 每日挂号 {plan['daily_min']}-{plan['daily_max']}, "
+          f"患者 {plan['patients']}, 共 {len(tasks)} 个分块")
+
+    t_start = time.perf_counter()
+    loader = None
+    totals = {"appointments": 0, "records": 0, "prescriptions": 0}
+    rows = {}
+    gen_seconds = 0.0
+    try:
+        if not csv_only:
+            loader = Loader(method, no_binlog, set_global_infile)
+            if clean:
+                clean_tables(loader.cursor)
+            loader.relax_checks()
+
+        reference = generate_reference(plan)
+        out = ChunkWriter(csv_dir, "reference")
+        for table in ("departments", "medicines", "doctors"):
+            out.write(table, reference[table])
+
+        def consume(chunks, counts, seconds):
+            nonlocal gen_seconds
+            gen_seconds += seconds
+            for key, value in counts.items():
+                totals[key] += value
+            for table, path, count in chunks:
+                rows[table] = rows.get(table, 0) + count
+                if loader:
+                    loader.load(table, path, count)
+                if not keep_csv:
+                    os.remove(path)
+
+        consume(out.close(), {}, 0.0)
+        for done, result in enumerate(_run_tasks(plan, reference["doctors"], tasks, workers), 1):
+            consume(*result)
+            if done % max(1, len(tasks) // 10) == 0:
+                print(f"  ...已完成 {done}/{len(tasks)} 个分块 ({sum(rows.values())} 行)")
+    finally:
+        if loader:
+            loader.close()
+        if not keep_csv:
+            shutil.rmtree(csv_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - t_start
+    total_rows = sum(rows.values())
+    report = {
+        "profile": profile,
+        "scale": scale,
+        "seed": seed,
+        "workers": workers,
+        "method": loader.method if loader else "csv",
+        "seconds": round(elapsed, 2),
+        "generate_cpu_seconds": round(gen_seconds, 2),
+        "rows": rows,
+        "rows_per_second": round(total_rows / elapsed) if elapsed else None,
+        "tables": {},
+        "csv_dir": csv_dir if keep_csv else None,
+    }
+    if loader:
+        for table, entry in loader.stats.items():
+            report["tables"][table] = {
+                "rows": entry["rows"],
+                "load_seconds": round(entry["seconds"], 2),
+                "rows_per_second": round(entry["rows"] / entry["seconds"]) if entry["seconds"] else None,
+                "mb": round(entry["bytes"] / 1e6, 1),
+            }
+
+    print(f"✅ 生成完毕！总计挂号: {totals['appointments']} 条, 病历: {totals['records']} 份, "
+          f"处方: {totals['prescriptions']} 张")
+    if totals["appointments"]:
+        print(f"   - 诊疗转化率: {totals['records'] / totals['appointments']:.1%}, "
+              f"处方转化率: {totals['prescriptions'] / totals['appointments']:.1%}")
+    print(f"📊 共 {total_rows} 行, 耗时 {elapsed:.1f}s, {report['rows_per_second']} rows/s "
+          f"(导入方式: {report['method']}, 生成累计 CPU {gen_seconds:.1f}s)")
+    for table, entry in report["tables"].items():
+        print(f"     {table:<22} {entry['rows']:>10} 行  {entry['mb']:>8} MB  "
+              f"导入 {entry['load_seconds']:>7}s  {entry['rows_per_second']} rows/s")
+    if keep_csv:
+        print(f"   CSV 分块保留在: {csv_dir}")
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MedData Hub 演示 / 压测数据生成器")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="full",
+                        help="full: 近 4 年门诊数据 (默认)；sankey: 当年高流量桑基图数据；small: 少量联调数据")
+    parser.add_argument("--scale", type=float, default=1.0, help="规模系数：缩放患者数与每日挂号量")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子 (默认随机，会打印出来便于复现)")
+    parser.add_argument("--workers", type=int, default=None, help="生成进程数 (默认 CPU 核数)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="每个 CSV 分块的目标行数")
+    parser.add_argument("--csv-dir", default=None, help="CSV 分块目录 (指定时导入后保留)")
+    parser.add_argument("--csv-only", action="store_true", help="只生成 CSV 分块，不连接数据库")
+    parser.add_argument("--method", choices=("load", "insert"), default="load",
+                        help="load: LOAD DATA LOCAL INFILE (默认，不可用时自动退回)；insert: 批量 INSERT")
+    parser.add_argument("--set-global-infile", action="store_true",
+                        help="服务端 local_infile 关闭时临时 SET GLOBAL 开启 (结束后还原；影响整个实例，勿用于共享库)")
+    parser.add_argument("--no-binlog", action="store_true", help="导入会话关闭 binlog (需要相应权限，勿用于有从库的实例)")
+    args = parser.parse_args(argv)
+    if args.scale <= 0 or args.chunk_rows <= 0 or (args.workers is not None and args.workers <= 0):
+        parser.error("--scale, --chunk-rows and --workers must be positive")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        generate(args.profile, args.scale, args.seed, args.workers, args.chunk_rows,
+                 args.csv_dir, args.csv_only, args.method, args.no_binlog,
+                 set_global_infile=args.set_global_infile)
+    except Exception as e:
+        print(f"❌ 错误: {e}")
+        sys.exit(1)
+    if not args.csv_only:
+        print("\n🎉🎉🎉 数据库构建完成！")
+        print("   桑基图流转计数需重建: flask --app run stats rebuild-sankey-flow")
+
+
+if __name__ == '__main__':
+    main()
@@ -38,6 +38,7 @@ CREATE TABLE `meddata_hub`.`patients` (
   `phone` VARCHAR(20) NULL,
   `address` VARCHAR(255) NULL,
   `create_time` DATE NOT NULL,
+  `deleted_at` DATETIME NULL DEFAULT NULL,  -- 删除标记：非空表示正在后台分块删除，所有查询均需过滤
   PRIMARY KEY (`id`),
   UNIQUE INDEX `id_UNIQUE` (`id` ASC) VISIBLE);
 
@@ -48,7 +49,10 @@ CREATE TABLE `meddata_hub`.`medical_records` (
   `diagnosis` TEXT(1024) NOT NULL,
   `treatment_plan` TEXT(1024) NOT NULL,
   `visit_date` DATE NOT NULL,
-  PRIMARY KEY (`id`));
+  `appointment_id` VARCHAR(50) NULL,     -- 关联挂号 ID，用于桑基图等流转统计
+  PRIMARY KEY (`id`),
+  INDEX `idx_record_appointment` (`appointment_id` ASC) VISIBLE,
+  INDEX `idx_record_patient_visit` (`patient_id` ASC, `visit_date` DESC, `id` DESC) VISIBLE);  -- 患者时间线游标分页
 
 CREATE TABLE `meddata_hub`.`prescription_details` (
   `id` VARCHAR(50) NOT NULL,
@@ -69,7 +73,8 @@ CREATE TABLE `meddata_hub`.`prescription_details` (
   `status` VARCHAR(20) NOT NULL,
   `create_time` VARCHAR(50) NOT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC) VISIBLE);
+  UNIQUE INDEX `id_UNIQUE` (`id` ASC) VISIBLE,
+  INDEX `idx_appt_dept_time` (`department_id` ASC, `create_time` ASC) VISIBLE);
 
   CREATE TABLE `meddata_hub`.`multimodal_data` (
     `id` VARCHAR(50) PRIMARY KEY,          -- 多模态记录的 ID，如 'img_1'
@@ -87,6 +92,14 @@ CREATE TABLE `meddata_hub`.`prescription_details` (
     INDEX `idx_modality` (`modality`)     -- 索引：文件类型
     );
 
+  CREATE TABLE `meddata_hub`.`sankey_flow_counts` (
+    `stat_date` DATE NOT NULL,             -- 挂号日期
+    `department_id` VARCHAR(50) NOT NULL,  -- 挂号科室
+    `stage` VARCHAR(20) NOT NULL,          -- 流转阶段：registered / diagnosed / medicated
+    `count` INT NOT NULL DEFAULT 0,        -- 计数，由写路径在同一事务内增量维护
+    PRIMARY KEY (`stat_date`, `department_id`, `stage`)
+    );
+
 
 -- 医生表关联科室
 ALTER TABLE `meddata_hub`.`doctors` 
@@ -114,7 +127,11 @@ ADD CONSTRAINT `fk_record_patient`
   REFERENCES `meddata_hub`.`patients` (`id`),
 ADD CONSTRAINT `fk_record_doctor`
   FOREIGN KEY (`doctor_id`)
-  REFERENCES `meddata_hub`.`doctors` (`id`);
+  REFERENCES `meddata_hub`.`doctors` (`id`),
+ADD CONSTRAINT `fk_record_appointment`
+  FOREIGN KEY (`appointment_id`)
+  REFERENCES `meddata_hub`.`appointments` (`id`)
+  ON DELETE SET NULL; -- 删除挂号时，病历保留但解除关联
 
 -- 处方明细关联
 ALTER TABLE `meddata_hub`.`prescription_details` 
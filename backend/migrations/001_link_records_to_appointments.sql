@@ -0,0 +1,32 @@
+-- 已有数据库升级：病历关联挂号 (medical_records.appointment_id)、桑基图按科室 + 时间查询的索引，
+-- 以及回填时维护的流转计数表 sankey_flow_counts
+-- 新建的库直接执行 meddata_hub.sql 即已包含以下结构，无需执行本脚本；本脚本只能执行一次
+--
+-- 用法 (在 backend 目录下)：
+--     mysql -u root -p < migrations/001_link_records_to_appointments.sql
+--     flask --app run record backfill-appointment-links   # 为历史病历回填关联，同时补加桑基图流转计数
+--     flask --app run stats rebuild-sankey-flow           # 计数表为本脚本新建时，全量初始化一次
+
+-- 病历关联挂号 ID，用于桑基图等流转统计
+ALTER TABLE `meddata_hub`.`medical_records`
+  ADD COLUMN `appointment_id` VARCHAR(50) NULL AFTER `visit_date`,
+  ADD INDEX `idx_record_appointment` (`appointment_id` ASC) VISIBLE;
+
+ALTER TABLE `meddata_hub`.`medical_records`
+ADD CONSTRAINT `fk_record_appointment`
+  FOREIGN KEY (`appointment_id`)
+  REFERENCES `meddata_hub`.`appointments` (`id`)
+  ON DELETE SET NULL; -- 删除挂号时，病历保留但解除关联
+
+-- 挂号按科室 + 时间范围过滤 (桑基图 / 统计)
+ALTER TABLE `meddata_hub`.`appointments`
+  ADD INDEX `idx_appt_dept_time` (`department_id` ASC, `create_time` ASC) VISIBLE;
+
+-- 桑基图流转计数 (由写路径在同一事务内增量维护)
+CREATE TABLE IF NOT EXISTS `meddata_hub`.`sankey_flow_counts` (
+    `stat_date` DATE NOT NULL,             -- 挂号日期
+    `department_id` VARCHAR(50) NOT NULL,  -- 挂号科室
+    `stage` VARCHAR(20) NOT NULL,          -- 流转阶段：registered / diagnosed / medicated
+    `count` INT NOT NULL DEFAULT 0,        -- 计数，由写路径在同一事务内增量维护
+    PRIMARY KEY (`stat_date`, `department_id`, `stage`)
+    );
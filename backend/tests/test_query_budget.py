@@ -0,0 +1,105 @@
+"""
+查询预算 pytest 插件 (app/utils/pytest_query_budget.py) 的自检
+
+在子进程中以 `pytest -p app.utils.pytest_query_budget` 运行一组内层测试：
+内层测试用 Flask 测试客户端请求声明了 @query_budget 的路由，由 note_query 模拟游标执行的 SQL
+(与 db.py 的游标包装调用方式相同)，不依赖 MySQL / Redis。
+
+    cd backend && python -m pytest tests
+"""
+import os
+import sys
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INNER_TESTS = '''
+import pytest
+from flask import Flask
+from app.utils.query_budget import query_budget, init_query_budget, note_query, QueryBudgetExceeded
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route("/within")
+    @query_budget(2)
+    def within():
+        note_query("SELECT * FROM patients WHERE id = %s", ("P001",))
+        note_query("SELECT * FROM medical_records WHERE patient_id = %s", ("P001",))
+        return "ok"
+
+    @app.route("/over")
+    @query_budget(1)
+    def over():
+        note_query("SELECT * FROM patients WHERE id = %s", ("P001",))
+        note_query("SELECT * FROM medical_records WHERE patient_id = %s", ("P001",))
+        return "ok"
+
+    @app.route("/n_plus_one")
+    @query_budget(20, max_repeats=3)
+    def n_plus_one():
+        for i in range(5):
+            note_query("SELECT * FROM medicines WHERE id = %s", (f"M{i}",))
+        return "ok"
+
+    init_query_budget(app)
+    return app.test_client()
+
+
+def test_within_budget(client):
+    resp = client.get("/within")
+    assert resp.headers["X-Query-Count"] == "2"
+
+
+def test_over_budget(client):
+    assert client.get("/over").status_code == 200
+
+
+def test_n_plus_one(client):
+    assert client.get("/n_plus_one").status_code == 200
+
+
+def test_assert_max_queries(assert_max_queries):
+    with pytest.raises(QueryBudgetExceeded):
+        with assert_max_queries(1):
+            note_query("SELECT 1")
+            note_query("SELECT 2")
+'''
+
+
+def run_inner(tmp_path, mode):
+    test_file = tmp_path / "test_inner.py"
+    test_file.write_text(INNER_TESTS, encoding="utf-8")
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    env.pop("QUERY_BUDGET_MODE", None)
+    if mode:
+        env["QUERY_BUDGET_MODE"] = mode
+    return subprocess.run(
+        [sys.executable, "-m", "pytest", "-p", "app.utils.pytest_query_budget", "-p", "no:cacheprovider",
+         "-rA", "-q", str(test_file)],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120,
+    )
+
+
+def test_budget_violation_fails_test(tmp_path):
+    result = run_inner(tmp_path, "fail")
+    output = result.stdout + result.stderr
+    assert result.returncode == 1, output
+
+    # 超出预算 / N+1 的请求本身返回 200，由插件在测试结束时判定失败
+    assert "PASSED test_inner.py::test_within_budget" in output
+    assert "PASSED test_inner.py::test_assert_max_queries" in output
+    assert "ERROR at teardown of test_over_budget" in output
+    assert "ERROR at teardown of test_n_plus_one" in output
+    assert "executed 2 queries, budget is 1" in output
+    assert "possible N+1: 5x" in output
+
+
+def test_plugin_requires_fail_mode(tmp_path):
+    # 模式在导入 app 时读取，插件无法事后开启；未设置时应报错而不是静默放过
+    result = run_inner(tmp_path, None)
+    output = result.stdout + result.stderr
+    assert result.returncode == 4, output   # pytest 的用法错误退出码
+    assert "requires QUERY_BUDGET_MODE=fail" in output
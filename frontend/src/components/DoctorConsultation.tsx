@@ -185,7 +185,8 @@ export const DoctorConsultation: React.FC = () => {
         doctorName: doctorName,
         diagnosis,
         treatmentPlan,
-        visitDate: getTodayStr() // Use local date
+        visitDate: getTodayStr(), // Use local date
+        appointmentId: currentAppointment.id
     };
 
     const newDetails: PrescriptionDetail[] = prescriptionBuffer.map((p, idx) => ({
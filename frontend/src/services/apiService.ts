@@ -40,10 +40,42 @@ const getAuthHeaders = (): Record<string, string> => {
   }
 };
 
+// 签名防重放请求头：X-Request-Time + X-Request-Nonce + HMAC-SHA256 签名，URL 保持不变，可被浏览器缓存。
+// 签名覆盖 方法 + 路径 + 原始查询串 + 请求体 SHA-256，与后端 signature_message() 一致。
+// 需要安全上下文中的 Web Crypto；不可用或未登录时返回 null，调用方退回 ?_t= 时间戳方式
+const toHex = (buffer: ArrayBuffer) => Array.from(new Uint8Array(buffer), b => b.toString(16).padStart(2, '0')).join('');
+
+const getReplayHeaders = async (method: string, url: string, body: string = ''): Promise<Record<string, string> | null> => {
+  try {
+    const session = JSON.parse(localStorage.getItem(SESSION_KEY) || 'null');
+    if (!session?.signingKey || !window.crypto?.subtle) return null;
+
+    const time = String(Date.now());
+    const nonce = Array.from(window.crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+    const encoder = new TextEncoder();
+    // 按浏览器实际发送的编码取路径与查询串 (中文等字符会被百分号编码)
+    const target = new URL(url, window.location.origin);
+    const bodyDigest = toHex(await window.crypto.subtle.digest('SHA-256', encoder.encode(body)));
+    const key = await window.crypto.subtle.importKey(
+      'raw', encoder.encode(session.signingKey), { name: 'HMAC', hash: 'SHA-256' }, false, ['sign']
+    );
+    const message = `${time}\n${nonce}\n${method}\n${target.pathname}\n${target.search.slice(1)}\n${bodyDigest}`;
+    const signature = await window.crypto.subtle.sign('HMAC', key, encoder.encode(message));
+    return {
+      'X-Request-Time': time,
+      'X-Request-Nonce': nonce,
+      'X-Request-Signature': toHex(signature)
+    };
+  } catch (e) {
+    return null;
+  }
+};
+
 async function fetchFromApi<T>(endpoint: string): Promise<T> {
-  // Use timestamp to prevent browser 304 caching
+  // 优先使用签名请求头 (URL 不变，可命中 HTTP 缓存)；不可用时追加 _t 时间戳
+  const replayHeaders = await getReplayHeaders('GET', `${API_BASE_URL}${endpoint}`);
   const separator = endpoint.includes('?') ? '&' : '?';
-  const url = `${API_BASE_URL}${endpoint}${separator}_t=${Date.now()}`; 
+  const url = replayHeaders ? `${API_BASE_URL}${endpoint}` : `${API_BASE_URL}${endpoint}${separator}_t=${Date.now()}`;
   
   addLog('INFO', 'API_REQUEST', 'GET 请求发起', `Target: ${endpoint}`, {
     method: 'GET',
@@ -59,6 +91,7 @@ async function fetchFromApi<T>(endpoint: string): Promise<T> {
       signal: controller.signal,
       headers: {
         ...getAuthHeaders(), // 注入 JWT
+        ...(replayHeaders || {}),
         'Content-Type': 'application/json'
       }
     });
@@ -127,6 +160,18 @@ export const loginUser = async (role: UserRole, id: string, password: string): P
   }
 };
 
+// Logout API Call：通知后端吊销当前 Token (失败不影响本地登出)
+export const revokeToken = async (token: string): Promise<void> => {
+  try {
+    await fetch(`${API_BASE_URL}/logout?_t=${Date.now()}`, {
+      method: 'POST',
+      headers: { 'Authorization': `Bearer ${token}` }
+    });
+  } catch {
+    // ignore
+  }
+};
+
 export const checkBackendHealth = async (): Promise<boolean> => {
   const targetUrl = `${API_BASE_URL}/doctors?_t=${Date.now()}`;
   try {
@@ -536,7 +581,8 @@ export const saveMedicalRecord = async (record: MedicalRecord, details: Prescrip
           doctorId: record.doctorId,
           diagnosis: record.diagnosis,
           treatmentPlan: record.treatmentPlan,
-          visitDate: record.visitDate 
+          visitDate: record.visitDate,
+          appointmentId: record.appointmentId
       },
       details: details.map(d => ({
           id: d.id,
@@ -703,27 +749,23 @@ export const getExistingPatient = async (appointment: Appointment): Promise<Pati
     throw new Error(`未找到患者档案！请确认该患者是否已注册。 (姓名: ${appointment.patientName}, 电话: ${appointment.patientPhone})`);
 };
 
+// 患者完整病历：通过 /patients/<id>/timeline 一次取回病历、处方明细(含药品信息)及多模态数据，
+// 按就诊日期倒序分页拉取，每页只需一次请求
 export const getFullPatientDetails = async (patientId: string) => {
-  const records = await getRecords(patientId);
-  const medicines = await getMedicines();
-
-  records.sort((a, b) => new Date(b.visitDate).getTime() - new Date(a.visitDate).getTime());
-
-  const enrichedRecords = await Promise.all(records.map(async (record) => {
-      const details = await getPrescriptionDetails(record.id);
-      const recordDetails = details.map(d => {
-        const med = medicines.find(m => m.id === d.medicineId);
-        return { 
-          ...d, 
-          medicineName: med?.name, 
-          medicinePrice: med?.price, 
-          medicineSpec: med?.specification
-        };
-      });
-      return { ...record, details: recordDetails };
-  }));
-
-  return enrichedRecords;
+  const records: any[] = [];
+  let cursor: { beforeDate: string; beforeId: string } | null = null;
+
+  do {
+    let endpoint = `/patients/${patientId}/timeline?limit=100`;
+    if (cursor) {
+      endpoint += `&before_date=${cursor.beforeDate}&before_id=${encodeURIComponent(cursor.beforeId)}`;
+    }
+    const page: any = await fetchFromApi<any>(endpoint);
+    records.push(...page.records);
+    cursor = page.hasMore ? page.nextCursor : null;
+  } while (cursor);
+
+  return records;
 };
 
 // 注意：此函数现在完全依赖 API 返回的数据进行客户端聚合
@@ -1,6 +1,6 @@
 
 import { UserRole, UserSession, Patient } from '../types';
-import { createPatient, loginUser } from './apiService';
+import { createPatient, loginUser, revokeToken } from './apiService';
 import { addLog } from './logger';
 
 const SESSION_KEY = process.env.REACT_APP_SESSION_KEY;
@@ -17,7 +17,8 @@ export const login = async (role: UserRole, id: string, password?: string): Prom
           name: apiResponse.user.name,
           role: apiResponse.user.role,
           // 确保存储 Token
-          token: apiResponse.token 
+          token: apiResponse.token,
+          signingKey: apiResponse.signingKey
       };
       
       // 持久化会话
@@ -72,6 +73,9 @@ export const logout = () => {
   const session = getCurrentUser();
   if (session) {
       addLog('INFO', 'AUTH', '用户登出', `User: ${session.name}`);
+      if (session.token) {
+        revokeToken(session.token);
+      }
   }
   localStorage.removeItem(SESSION_KEY);
 };
@@ -46,6 +46,7 @@ export interface MedicalRecord {
   diagnosis: string; // 诊断结果
   treatmentPlan: string; // 治疗方案
   visitDate: string; // 就诊时间
+  appointmentId?: string; // 关联挂号ID (FK)
 }
 
 export interface PrescriptionDetail {
@@ -156,4 +157,5 @@ export interface UserSession {
   name: string;
   role: UserRole;
   token?: string; // For future real backend use
+  signingKey?: string; // 请求签名密钥 (X-Request-Signature)
 }